@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Overload test for admission control in front of the Broker.
+
+This script offers open-loop traffic (Poisson arrivals) at increasing
+multiples of the agents' capacity, once with a thread per request calling
+Broker.process_message directly and once through an AdmissionController,
+and prints the goodput: responses delivered within the latency objective
+per second. Without admission control, queues grow without bound past
+saturation and goodput collapses; with it, excess requests are rejected
+early and goodput stays near capacity.
+"""
+
+import sys
+import os
+import argparse
+import random
+import threading
+import time
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.registry import Registry
+from gpi.core.broker import Broker
+from gpi.core.admission import AdmissionController, Overloaded
+
+class SimulatedAgent(Agent):
+    """
+    Agent that serves a limited number of requests at a time, each taking an
+    exponentially distributed service time.
+    """
+
+    __slots__ = ('service_time', 'capacity')
+
+    def invoke(self, context, message):
+        with self.capacity:
+            time.sleep(random.expovariate(1.0 / self.service_time))
+        return {'response': f"{self.agent_id} handled {message}"}
+
+def run(admission, rate, args):
+    """
+    Offer traffic at a fixed rate for the configured duration.
+
+    Args:
+        admission (bool): Whether requests go through an AdmissionController
+        rate (float): Arrivals per second
+        args: Parsed command-line arguments
+
+    Returns:
+        tuple: (latencies of completed requests in seconds, number of rejected requests)
+    """
+    registry = Registry()
+    broker = Broker(registry)
+    for i in range(args.agents):
+        agent = SimulatedAgent(f"Agent {i}", f"agent-{i}", ["talk"])
+        agent.service_time = args.service_time
+        agent.capacity = threading.Semaphore(args.capacity)
+        registry.register_agent(agent)
+
+    controller = None
+    if admission:
+        controller = AdmissionController(workers=args.agents * args.capacity, max_queue=args.max_queue,
+                                         queue_budget=args.budget)
+
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+
+    def send(i):
+        start = time.perf_counter()
+        user_id = f"user-{i % args.users}"
+        try:
+            if controller:
+                controller.submit(broker.process_message, f"message {i}", user_id,
+                                  user_id=user_id).result()
+            else:
+                broker.process_message(f"message {i}", user_id)
+        except Overloaded:
+            with lock:
+                rejected[0] += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    threads = []
+    start = time.perf_counter()
+    next_arrival = start
+    i = 0
+    while next_arrival - start < args.duration:
+        time.sleep(max(0.0, next_arrival - time.perf_counter()))
+        thread = threading.Thread(target=send, args=(i,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        next_arrival += random.expovariate(rate)
+        i += 1
+
+    for thread in threads:
+        thread.join()
+    if controller:
+        controller.stop()
+    return latencies, rejected[0]
+
+def main():
+    """
+    Run the test at every load level, with and without admission control, and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Measure goodput under overload with and without admission control")
+    parser.add_argument("--agents", type=int, default=4, help="Number of agents")
+    parser.add_argument("--capacity", type=int, default=2, help="Concurrent requests each agent can serve")
+    parser.add_argument("--service-time", type=float, default=0.05, help="Mean service time in seconds")
+    parser.add_argument("--loads", type=float, nargs="+", default=[0.5, 0.9, 1.5, 2.0, 3.0],
+                        help="Offered load as multiples of capacity")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of traffic per run")
+    parser.add_argument("--users", type=int, default=20, help="Number of distinct users")
+    parser.add_argument("--slo", type=float, default=0.5, help="Latency objective in seconds")
+    parser.add_argument("--budget", type=float, default=0.25, help="Queue wait budget in seconds")
+    parser.add_argument("--max-queue", type=int, default=256, help="Maximum queued requests")
+    args = parser.parse_args()
+
+    capacity = args.agents * args.capacity / args.service_time
+    print(f"Admission control overload test (capacity ~{capacity:.0f} req/s, SLO {args.slo * 1000:.0f} ms)")
+    print("=================================")
+    print(f"{'load':>5} {'mode':>10} {'offered/s':>10} {'goodput/s':>10} {'rejected':>9} {'p99 ms':>9}")
+
+    for load in args.loads:
+        for admission in (False, True):
+            latencies, rejected = run(admission, load * capacity, args)
+            good = sum(1 for latency in latencies if latency <= args.slo)
+            offered = (len(latencies) + rejected) / args.duration
+            p99 = sorted(latencies)[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0
+            print(f"{load:5.1f} {'admission' if admission else 'direct':>10} {offered:10.1f} "
+                  f"{good / args.duration:10.1f} {rejected:9d} {p99 * 1000:9.1f}")
+
+if __name__ == "__main__":
+    main()
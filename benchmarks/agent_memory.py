@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for Agent storage.
+
+This script uses tracemalloc to measure the memory needed to hold a large
+registry of agents, comparing the slotted Agent with interned ability sets
+against an equivalent dict-based agent that stores its abilities as a list.
+"""
+
+import sys
+import os
+import argparse
+import tracemalloc
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+
+ABILITY_PROFILES = [
+    ["talk"],
+    ["talk", "think"],
+    ["talk", "think", "learn"],
+    ["weather", "weather.forecast", "weather.alerts"],
+    ["finance.pricing", "finance.quotes", "talk"],
+]
+
+# Agent with default settings, whose attribute values DictAgent copies
+TEMPLATE = Agent("Template", "template", [])
+
+class DictAgent:
+    """
+    Agent layout before slots: the same attributes as Agent, kept in a
+    per-instance __dict__, with the abilities as a list.
+    """
+
+    def __init__(self, name, agent_id, abilities):
+        for field in Agent.__slots__:
+            setattr(self, field, getattr(TEMPLATE, field))
+        self.name = name
+        self.agent_id = agent_id
+        self._abilities = abilities
+
+def measure(agent_class, count):
+    """
+    Measure the memory used by a registry of agents.
+
+    Args:
+        agent_class: Class used to build the agents
+        count (int): Number of agents to create
+
+    Returns:
+        int: Bytes allocated for the agents and the registry dictionary
+    """
+    # Build the names up front so only agent storage is measured
+    ids = [f"agent-{i}" for i in range(count)]
+    names = [f"Agent {i}" for i in range(count)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    agents = {}
+    for i in range(count):
+        abilities = list(ABILITY_PROFILES[i % len(ABILITY_PROFILES)])
+        agents[ids[i]] = agent_class(names[i], ids[i], abilities)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return after - before
+
+def main():
+    """
+    Run the benchmark and print bytes per agent for each layout.
+    """
+    parser = argparse.ArgumentParser(description="Measure Agent memory usage")
+    parser.add_argument("--agents", type=int, default=200000, help="Number of agents to create")
+    args = parser.parse_args()
+
+    print(f"Agent memory benchmark ({args.agents} agents)")
+    print("=================================")
+
+    results = {}
+    for label, agent_class in (("dict + list", DictAgent), ("slots + interned set", Agent)):
+        total = measure(agent_class, args.agents)
+        results[label] = total
+        print(f"{label:>22}: {total / 1024 / 1024:8.1f} MiB  ({total / args.agents:6.1f} bytes/agent)")
+
+    baseline, slotted = results["dict + list"], results["slots + interned set"]
+    print(f"\nSaved {100.0 * (baseline - slotted) / baseline:.1f}% of agent storage")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bulk agent registration over HTTP.
+
+This script starts a local registration endpoint in a separate process that
+takes `--latency` seconds per request, standing in for a remote GPI server,
+and registers the same agents four ways: one requests.post per agent (a new
+connection each, as HttpClient used to), one at a time over pooled sessions,
+with HttpClient.register_agents and with register_agents_async. It prints
+registrations per second for each.
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.utils.http import HttpClient, SessionPool
+
+def serve(ports, latency):
+    """
+    Run the registration endpoint, reporting its port.
+
+    Args:
+        ports (multiprocessing.Queue): Receives the port the server listens on
+        latency (float): Seconds to spend on each registration
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            time.sleep(latency)
+            data = json.dumps({"status": "success", "id": payload.get("id")}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+def main():
+    """
+    Register agents sequentially and in bulk and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark bulk agent registration over HTTP")
+    parser.add_argument("--agents", type=int, default=500, help="Number of agents to register")
+    parser.add_argument("--concurrency", type=int, default=32, help="Registrations in flight at once")
+    parser.add_argument("--latency", type=float, default=0.005, help="Server seconds per registration")
+    args = parser.parse_args()
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports, args.latency), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get()}/api/agents"
+    payloads = [{"name": f"Agent{i}", "id": f"agent{i:06d}", "abilities": ["talk"]} for i in range(args.agents)]
+    client = HttpClient(pool=SessionPool(pool_size=args.concurrency))
+
+    def unpooled():
+        for payload in payloads:
+            requests.post(url, data=json.dumps(payload), headers={"Content-Type": "application/json"},
+                          timeout=30).raise_for_status()
+        return len(payloads)
+
+    def sequential():
+        return sum('error' not in client.register_agent(url, payload) for payload in payloads)
+
+    def bulk():
+        return client.register_agents(url, payloads, args.concurrency)['succeeded']
+
+    def bulk_async():
+        return asyncio.run(client.register_agents_async(url, payloads, args.concurrency))['succeeded']
+
+    print(f"Bulk registration ({args.agents} agents, {args.latency * 1000:.0f} ms server latency, "
+          f"concurrency {args.concurrency})")
+    print("=================================")
+    print(f"{'mode':>22} {'registered':>11} {'seconds':>8} {'agents/s':>9}")
+    for name, register in (("requests.post/agent", unpooled), ("pooled, one at a time", sequential),
+                           ("register_agents", bulk), ("register_agents_async", bulk_async)):
+        start = time.perf_counter()
+        registered = register()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>22} {registered:11d} {elapsed:8.2f} {args.agents / elapsed:9.1f}")
+
+    server.terminate()
+
+if __name__ == "__main__":
+    main()
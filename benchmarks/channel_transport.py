@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the multiplexed channel transport.
+
+This script starts a local echo agent in a separate process that serves both
+HTTP/1.1 and the gpi+tcp:// channel protocol, then calls it from several
+client threads through pooled keep-alive HTTP and through one shared
+channel. It prints calls per second, connections used and latency
+percentiles for each.
+"""
+
+import sys
+import os
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from external_calls import EchoHandler, percentile
+from gpi.core.agent import Agent
+from gpi.utils.channel import ChannelServer, get_channel
+from gpi.utils.http import configure_session_pool
+
+def serve(ports, workers):
+    """
+    Run the echo agent over HTTP and over a channel, reporting both ports.
+
+    Args:
+        ports (multiprocessing.Queue): Receives the HTTP port, then the channel endpoint
+        workers (int): Threads handling channel requests
+    """
+    channel = ChannelServer(lambda request: {"response": request.get("message")}, workers=workers).start()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.daemon_threads = True
+    ports.put(server.server_address[1])
+    ports.put(channel.endpoint)
+    server.serve_forever()
+
+def run(call, args):
+    """
+    Send the configured number of calls from the configured number of clients.
+
+    Args:
+        call (callable): Sends one message
+        args: Parsed command-line arguments
+
+    Returns:
+        tuple: (calls per second, list of latencies in seconds)
+    """
+    def send(i):
+        start = time.perf_counter()
+        call(f"message {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        latencies = list(pool.map(send, range(args.requests)))
+    return args.requests / (time.perf_counter() - start), latencies
+
+def main():
+    """
+    Run the benchmark over HTTP and over a channel and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the channel transport against HTTP")
+    parser.add_argument("--requests", type=int, default=5000, help="Number of calls")
+    parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--pool-size", type=int, default=16, help="HTTP connections kept alive per endpoint")
+    args = parser.parse_args()
+
+    # Serve from another process, so client and server do not compete for the GIL
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports, args.clients), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get()}/agent"
+    endpoint = ports.get()
+
+    configure_session_pool(pool_size=args.pool_size)
+    http_agent = Agent("Echo", "echo", ["talk"], url, agent_type="external")
+    channel_agent = Agent("Echo", "echo", ["talk"], endpoint, agent_type="external")
+
+    print(f"External agent transports ({args.requests} calls, {args.clients} clients)")
+    print("=================================")
+    print(f"{'transport':>18} {'calls/s':>9} {'connections':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, agent, connections in (("pooled HTTP", http_agent, min(args.clients, args.pool_size)),
+                                     ("channel", channel_agent, None)):
+        throughput, latencies = run(lambda message: agent.invoke("benchmark", message), args)
+        if connections is None:
+            connections = get_channel(endpoint).stats()['connects']
+        print(f"{name:>18} {throughput:9.1f} {connections:12d} {percentile(latencies, 0.50) * 1000:8.2f} "
+              f"{percentile(latencies, 0.99) * 1000:8.2f}")
+
+    server.terminate()
+
+if __name__ == "__main__":
+    main()
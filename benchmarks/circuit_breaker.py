@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark for circuit breakers during an agent outage.
+
+This script routes messages round-robin between two local stub agents. In
+the middle phase one of them goes down and hangs until its callers time
+out; afterwards it recovers. The script prints request latency per phase
+with circuit breakers disabled and enabled: without them every other
+request waits out the timeout for the whole outage, with them the broken
+agent is skipped after a few failures and taken back once health probes
+see it recover.
+"""
+
+import sys
+import os
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.registry import Registry
+from gpi.core.broker import Broker
+from gpi.core.circuit import CircuitBreakers
+from gpi.core.retry import RetryPolicy
+from gpi.core.options import CallOptions
+
+class StubAgent:
+    """
+    Local HTTP agent that echoes messages, or hangs while it is down.
+    """
+
+    def __init__(self, name, hang):
+        self.name = name
+        self.down = False
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if stub.down:
+                    time.sleep(hang)
+                    self.reply(503, {"error": "unavailable"})
+                else:
+                    self.reply(200, {"response": f"{stub.name}: {payload.get('message')}"})
+
+            def do_GET(self):
+                self.reply(503 if stub.down else 200, {})
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The caller timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/agent"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values.
+
+    Args:
+        values (list): The values
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The percentile value
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(breakers, args):
+    """
+    Send messages through a healthy phase, an outage and a recovery.
+
+    Args:
+        breakers (CircuitBreakers or bool): Circuit breakers for the broker, or False
+        args: Parsed command-line arguments
+
+    Returns:
+        list: (phase name, latencies in seconds, failed requests) per phase
+    """
+    flaky = StubAgent("Flaky", args.hang)
+    steady = StubAgent("Steady", 0)
+    registry = Registry()
+    broker = Broker(registry, circuit_breaker=breakers)
+    # No retries, so the comparison isolates the breaker
+    options = CallOptions(timeout=(1.0, args.timeout), retry_policy=RetryPolicy(max_attempts=1))
+    for stub in (flaky, steady):
+        registry.register_agent(Agent(stub.name, stub.name.lower(), ["talk"], stub.url, agent_type="external",
+                                      options=options))
+
+    phases = []
+    for name, down in (("healthy", False), ("outage", True), ("recovered", False)):
+        flaky.down = down
+        latencies = []
+        failed = 0
+        end = time.perf_counter() + args.phase
+        i = 0
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            response = broker.process_message(f"message {i}", "bench-user")
+            latencies.append(time.perf_counter() - start)
+            failed += response.startswith("Error")
+            i += 1
+        phases.append((name, latencies, failed))
+
+    flaky.close()
+    steady.close()
+    return phases
+
+def main():
+    """
+    Run the benchmark with and without circuit breakers and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Measure request latency during an agent outage")
+    parser.add_argument("--phase", type=float, default=3.0, help="Seconds per phase")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Read timeout for agent calls in seconds")
+    parser.add_argument("--hang", type=float, default=2.0, help="Seconds the broken agent hangs per request")
+    parser.add_argument("--threshold", type=int, default=3, help="Consecutive failures that open a circuit")
+    parser.add_argument("--probe-interval", type=float, default=0.5, help="Seconds between health probes")
+    args = parser.parse_args()
+
+    print(f"Circuit breaker outage test ({args.phase:.0f} s per phase, {args.timeout * 1000:.0f} ms timeout)")
+    print("=================================")
+    print(f"{'breaker':>8} {'phase':>10} {'requests':>9} {'failed':>7} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, breakers in (("off", False),
+                            ("on", CircuitBreakers(failure_threshold=args.threshold, recovery_timeout=30.0,
+                                                   probe_interval=args.probe_interval))):
+        for name, latencies, failed in run(breakers, args):
+            print(f"{label:>8} {name:>10} {len(latencies):9d} {failed:7d} "
+                  f"{sum(latencies) / len(latencies) * 1000:8.2f} {percentile(latencies, 0.50) * 1000:8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the columnar registry export.
+
+This script fills a registry with agents, exports it with
+Registry.export_columnar, memory-maps it back and runs an ability query,
+comparing against building the per-agent dictionaries served by /api/agents.
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.registry import Registry
+from gpi.core.columnar import load_columnar
+
+ABILITY_PROFILES = [
+    ["talk"],
+    ["talk", "think"],
+    ["weather", "weather.forecast"],
+    ["finance.pricing", "talk"],
+]
+
+def main():
+    """
+    Run the benchmark and print timings for each step.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark columnar registry export")
+    parser.add_argument("--agents", type=int, default=1000000, help="Number of agents to export")
+    args = parser.parse_args()
+
+    print(f"Columnar export benchmark ({args.agents} agents)")
+    print("=================================")
+
+    registry = Registry()
+    for i in range(args.agents):
+        agent_type = "external" if i % 10 == 0 else "internal"
+        registry.register_agent(Agent(f"Agent {i}", f"agent-{i}", ABILITY_PROFILES[i % len(ABILITY_PROFILES)],
+                                      agent_type=agent_type))
+
+    path = tempfile.mkdtemp(prefix="gpi-columnar-")
+    try:
+        start = time.perf_counter()
+        registry.export_columnar(path)
+        export_time = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+        start = time.perf_counter()
+        columns = load_columnar(path)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matches = int((columns.ability_mask("weather") & columns.active).sum())
+        query_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        payload = json.dumps({agent_id: {
+            'name': agent.name,
+            'id': agent.agent_id,
+            'abilities': agent.abilities,
+            'active': agent.is_active(),
+            'type': agent.agent_type,
+            'external_endpoint': agent.external_endpoint
+        } for agent_id, agent in registry.agents.items()})
+        json_time = time.perf_counter() - start
+
+        print(f"Columnar export: {export_time:7.2f} s  ({size / 1024 / 1024:.1f} MiB on disk)")
+        print(f"Memory-map load: {load_time * 1000:7.2f} ms")
+        print(f"Ability query:   {query_time * 1000:7.2f} ms  ({matches} active weather agents)")
+        print(f"JSON dump:       {json_time:7.2f} s  ({len(payload) / 1024 / 1024:.1f} MiB)")
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    main()
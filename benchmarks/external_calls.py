@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark for calls to external agents.
+
+This script starts a local HTTP/1.1 stub agent in a separate process and
+calls it from several client threads, first with a new connection per call (module-level
+requests.post, as external agents used to), then through the pooled
+keep-alive sessions Agent.invoke uses now, and finally with the batch
+protocol, which sends concurrent calls together in one request. It prints
+calls per second, HTTP requests sent and latency percentiles for each.
+"""
+
+import sys
+import os
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.options import CallOptions
+from gpi.utils.http import configure_session_pool
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """
+    Echoes the message of each POST (or each item of a batch), keeping connections alive.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Send headers and body without delayed-ACK stalls
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if "batch" in payload:
+            reply = {"responses": [{"id": item["id"], "response": item["message"]} for item in payload["batch"]]}
+        else:
+            reply = {"response": payload.get("message")}
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def serve(ports):
+    """
+    Run the stub agent, reporting its port.
+
+    Args:
+        ports (multiprocessing.Queue): Receives the port the server listens on
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.daemon_threads = True
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values.
+
+    Args:
+        values (list): The values
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The percentile value
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(call, args):
+    """
+    Send the configured number of calls from the configured number of clients.
+
+    Args:
+        call (callable): Sends one message
+        args: Parsed command-line arguments
+
+    Returns:
+        tuple: (requests per second, list of latencies in seconds)
+    """
+    def send(i):
+        start = time.perf_counter()
+        call(f"message {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        latencies = list(pool.map(send, range(args.requests)))
+    return args.requests / (time.perf_counter() - start), latencies
+
+def main():
+    """
+    Run the benchmark without and with connection pooling and batching and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark calls to an external agent")
+    parser.add_argument("--requests", type=int, default=2000, help="Number of calls")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--pool-size", type=int, default=8, help="Connections kept alive per endpoint")
+    parser.add_argument("--batch-size", type=int, default=32, help="Largest batch for the batch protocol")
+    parser.add_argument("--batch-window", type=float, default=0.002, help="Seconds to collect a batch")
+    args = parser.parse_args()
+
+    # Serve from another process, so client and server do not compete for the GIL
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports,), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get()}/agent"
+
+    def unpooled(message):
+        payload = {"agent_id": "bench", "context": "benchmark", "message": message}
+        response = requests.post(url, data=json.dumps(payload), headers={"Content-Type": "application/json"},
+                                 timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    configure_session_pool(pool_size=args.pool_size)
+    agent = Agent("Echo", "echo", ["talk"], url, agent_type="external")
+
+    def pooled(message):
+        return agent.invoke("benchmark", message)
+
+    batch_agent = Agent("Echo", "echo", ["talk"], url, agent_type="external",
+                        options=CallOptions(batch_size=args.batch_size, batch_window=args.batch_window))
+
+    def batched(message):
+        return batch_agent.invoke("benchmark", message)
+
+    print(f"External agent calls ({args.requests} calls, {args.clients} clients)")
+    print("=================================")
+    print(f"{'mode':>22} {'calls/s':>9} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, call in (("new connection/call", unpooled), ("pooled keep-alive", pooled), ("batched", batched)):
+        throughput, latencies = run(call, args)
+        sent = batch_agent._batcher.batches if call is batched else args.requests
+        print(f"{name:>22} {throughput:9.1f} {sent:9d} {percentile(latencies, 0.50) * 1000:8.2f} "
+              f"{percentile(latencies, 0.99) * 1000:8.2f}")
+
+    server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark for agent handler execution modes.
+
+This script gives an internal agent a CPU-bound handler (a pure Python
+scoring loop) and calls it from several client threads with the handler
+run inline, on the thread pool and on the process pool. It prints calls per
+second, latency percentiles and the pool's queue metrics for each mode.
+"""
+
+import sys
+import os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.handlers import configure_handler_pools, get_handler_pool
+from gpi.core.options import CallOptions
+
+WORK = 200000  # Loop iterations per call
+
+def score(context, message):
+    """
+    CPU-bound handler: score a message with a pure Python loop.
+
+    Args:
+        context (str): The context
+        message (str): The message
+
+    Returns:
+        str: The score
+    """
+    total = 0
+    seed = len(context) + len(message)
+    for i in range(WORK):
+        total = (total + i * seed) % 1000003
+    return f"score {total}"
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values.
+
+    Args:
+        values (list): The values
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The percentile value
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    """
+    Run the handler in each execution mode and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark agent handler execution modes")
+    parser.add_argument("--calls", type=int, default=200, help="Number of calls per mode")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes in the process pool")
+    args = parser.parse_args()
+
+    configure_handler_pools(thread_workers=args.workers, process_workers=args.workers)
+    print(f"Handler execution ({args.calls} calls, {args.clients} clients, {args.workers} workers)")
+    print("=================================")
+    print(f"{'mode':>8} {'calls/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'queue ms':>9} {'run ms':>7}")
+    for mode in ("inline", "thread", "process"):
+        agent = Agent("Scorer", "scorer", ["score"], handler=score, options=CallOptions(execution=mode))
+        pool = get_handler_pool(mode) if mode != "inline" else None
+        if pool:
+            # Start the workers, then measure from here on
+            for _ in range(args.workers):
+                agent.invoke("warm-up", "start the workers")
+            before = (pool.completed, pool.queue_time, pool.run_time)
+
+        def call(i):
+            start = time.perf_counter()
+            agent.invoke("benchmark", f"message {i}")
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as clients:
+            latencies = list(clients.map(call, range(args.calls)))
+        throughput = args.calls / (time.perf_counter() - start)
+
+        queue = run = "-"
+        if pool:
+            completed = pool.completed - before[0]
+            queue = f"{(pool.queue_time - before[1]) / completed * 1000:.1f}"
+            run = f"{(pool.run_time - before[2]) / completed * 1000:.1f}"
+        print(f"{mode:>8} {throughput:9.1f} {percentile(latencies, 0.50) * 1000:8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:8.1f} {queue:>9} {run:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Load-balancing simulation for the Broker.
+
+This script registers several equivalent agents with different service
+times (one of them slow), sends concurrent messages through
+Broker.process_message with each strategy, and prints how the load was
+distributed and the resulting latency percentiles.
+"""
+
+import sys
+import os
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+from gpi.core.registry import Registry
+from gpi.core.broker import Broker
+from gpi.core.balancing import STRATEGIES
+
+class SimulatedAgent(Agent):
+    """
+    Agent that serves a limited number of requests at a time, each taking an
+    exponentially distributed service time.
+    """
+
+    __slots__ = ('service_time', 'capacity')
+
+    def invoke(self, context, message):
+        with self.capacity:
+            time.sleep(random.expovariate(1.0 / self.service_time))
+        return {'response': f"{self.agent_id} handled {message}"}
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values.
+
+    Args:
+        values (list): The values
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The percentile value
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(strategy, args):
+    """
+    Run the simulation for one strategy.
+
+    Args:
+        strategy (str): Strategy name
+        args: Parsed command-line arguments
+
+    Returns:
+        tuple: (requests per agent, list of latencies in seconds)
+    """
+    registry = Registry()
+    broker = Broker(registry, strategy=strategy)
+    for i, service_time in enumerate(args.service_times):
+        agent = SimulatedAgent(f"Agent {i}", f"agent-{i}", ["talk"], weight=1.0 / service_time)
+        agent.service_time = service_time
+        agent.capacity = threading.Semaphore(args.capacity)
+        registry.register_agent(agent)
+
+    def send(i):
+        start = time.perf_counter()
+        agent_id = broker.process_message(f"message {i}", user_id="load-balancing-benchmark").split()[0]
+        return agent_id, time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.clients) as pool:
+        results = list(pool.map(send, range(args.requests)))
+
+    counts = {agent_id: 0 for agent_id in registry.agents}
+    for agent_id, _ in results:
+        counts[agent_id] += 1
+    return counts, [latency for _, latency in results]
+
+def main():
+    """
+    Run the simulation for every strategy and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Simulate broker load balancing")
+    parser.add_argument("--requests", type=int, default=2000, help="Number of messages to send")
+    parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--capacity", type=int, default=2, help="Concurrent requests each agent can serve")
+    parser.add_argument("--service-times", type=float, nargs="+", default=[0.002, 0.002, 0.002, 0.010],
+                        help="Mean service time of each agent in seconds")
+    args = parser.parse_args()
+
+    print(f"Load-balancing simulation ({args.requests} requests, {args.clients} clients)")
+    print("=================================")
+    print(f"{'strategy':>18}  {'requests per agent':<28} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for strategy in STRATEGIES:
+        counts, latencies = run(strategy, args)
+        distribution = " ".join(f"{count:5d}" for count in counts.values())
+        print(f"{strategy:>18}  {distribution:<28} {sum(latencies) / len(latencies) * 1000:8.2f} "
+              f"{percentile(latencies, 0.50) * 1000:8.2f} {percentile(latencies, 0.99) * 1000:8.2f}")
+
+if __name__ == "__main__":
+    main()
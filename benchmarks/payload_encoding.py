@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for payload encodings of agent traffic.
+
+This script builds agent requests like the broker sends (a context from
+ContextInfo.to_string plus a message of several sizes) and encodes them in
+each mode PayloadCodec can negotiate: plain JSON, gzip, deflate and, if
+msgpack is installed, MessagePack with and without gzip. It prints the
+bytes on the wire and the CPU time to encode (client) and decode (agent)
+each request.
+"""
+
+import sys
+import os
+import argparse
+import importlib.util
+import random
+import time
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.context import ContextInfo
+from gpi.utils import encoding
+
+WORDS = ("the agent forecast weather order invoice customer shipping delay refund account "
+         "price product review summary please could you tell me about for with and in on "
+         "tomorrow yesterday report status update booking flight hotel Paris London").split()
+
+def make_payload(size, rng):
+    """
+    Build an agent request with a message of about `size` bytes.
+
+    Args:
+        size (int): Approximate message length in bytes
+        rng (random.Random): Source of words
+
+    Returns:
+        dict: The request payload
+    """
+    message = ""
+    while len(message) < size:
+        message += rng.choice(WORDS) + " "
+    context = ContextInfo(topic="travel", entities=["Paris", "London"], keywords={"flight", "hotel"},
+                          intent="question", confidence=0.82, original_query=message[:200])
+    return {'agent_id': "travel001", 'context': context.to_string(), 'message': message}
+
+def measure(payload, content_type, coding, args):
+    """
+    Encode and decode a payload repeatedly in one mode.
+
+    Args:
+        payload (dict): The request
+        content_type (str): JSON_TYPE or MSGPACK_TYPE
+        coding (str): GZIP, DEFLATE or None
+        args: Parsed command-line arguments
+
+    Returns:
+        tuple: (bytes on the wire, encode microseconds, decode microseconds)
+    """
+    start = time.thread_time()
+    for _ in range(args.repeat):
+        body = encoding.dumps(payload, content_type)
+        if coding:
+            body = encoding.compress(body, coding, args.level)
+    encode_time = (time.thread_time() - start) / args.repeat
+
+    start = time.thread_time()
+    for _ in range(args.repeat):
+        encoding.loads(encoding.decompress(body, coding), content_type)
+    decode_time = (time.thread_time() - start) / args.repeat
+    return len(body), encode_time * 1e6, decode_time * 1e6
+
+def main():
+    """
+    Measure wire size and CPU cost of each encoding and print a summary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark payload encodings for agent traffic")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 2000, 20000], help="Message sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=500, help="Encodings per measurement")
+    parser.add_argument("--level", type=int, default=encoding.DEFAULT_COMPRESS_LEVEL, help="Compression level")
+    args = parser.parse_args()
+
+    modes = [("json", encoding.JSON_TYPE, None),
+             ("json+gzip", encoding.JSON_TYPE, encoding.GZIP),
+             ("json+deflate", encoding.JSON_TYPE, encoding.DEFLATE)]
+    if importlib.util.find_spec("msgpack"):
+        modes += [("msgpack", encoding.MSGPACK_TYPE, None),
+                  ("msgpack+gzip", encoding.MSGPACK_TYPE, encoding.GZIP)]
+    else:
+        print("msgpack is not installed; skipping MessagePack modes")
+
+    rng = random.Random(42)
+    print(f"Payload encoding (compression level {args.level}, {args.repeat} repeats)")
+    print("=================================")
+    print(f"{'message':>8} {'mode':>14} {'wire bytes':>11} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for size in args.sizes:
+        payload = make_payload(size, rng)
+        baseline = None
+        for name, content_type, coding in modes:
+            wire, encode_us, decode_us = measure(payload, content_type, coding, args)
+            baseline = baseline or wire
+            print(f"{size:>8} {name:>14} {wire:11d} {wire / baseline:6.2f} {encode_us:10.1f} {decode_us:10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark for streamed agent responses.
+
+This script starts a local stub agent that generates its answer token by
+token, like a language model, and measures time to first byte and time to
+the complete answer for Agent.invoke (which waits for the whole reply) and
+Agent.stream (which receives newline-delimited JSON as tokens are produced).
+"""
+
+import sys
+import os
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path so we can import the gpi package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpi.core.agent import Agent
+
+def start_agent(tokens, token_time):
+    """
+    Start a stub agent that takes `token_time` seconds per token.
+
+    Args:
+        tokens (int): Tokens per answer
+        token_time (float): Seconds to generate each token
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def generate(self):
+            for i in range(tokens):
+                time.sleep(token_time)
+                yield f"token{i} "
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not payload.get("stream"):
+                data = json.dumps({"response": "".join(self.generate())}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in self.generate():
+                line = (json.dumps({"delta": token}) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """
+    Measure time to first byte and to the full answer with and without streaming.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark streamed agent responses")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per answer")
+    parser.add_argument("--token-time", type=float, default=0.01, help="Seconds per generated token")
+    parser.add_argument("--requests", type=int, default=10, help="Answers to request per mode")
+    args = parser.parse_args()
+
+    server = start_agent(args.tokens, args.token_time)
+    url = f"http://127.0.0.1:{server.server_address[1]}/agent"
+    agent = Agent("Writer", "writer", ["write"], url, agent_type="external")
+
+    def full():
+        yield agent.invoke("benchmark", "Write something")['response']
+
+    def streamed():
+        return agent.stream("benchmark", "Write something")
+
+    print(f"Streaming ({args.tokens} tokens at {args.token_time * 1000:.0f} ms each, {args.requests} requests)")
+    print("=================================")
+    print(f"{'mode':>10} {'first byte ms':>14} {'complete ms':>12}")
+    for name, call in (("invoke", full), ("stream", streamed)):
+        first_times, total_times = [], []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            first = None
+            for _ in call():
+                if first is None:
+                    first = time.perf_counter() - start
+            first_times.append(first)
+            total_times.append(time.perf_counter() - start)
+        print(f"{name:>10} {sum(first_times) / len(first_times) * 1000:14.1f} "
+              f"{sum(total_times) / len(total_times) * 1000:12.1f}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
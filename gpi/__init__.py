@@ -3,7 +3,9 @@ GPI - SDK Framework for AI Agentic Development
 """
 
 # Import and define the package components
-from gpi.core.agent import Agent
+import asyncio
+
+from gpi.core.agent import Agent, AgentCallError
 from gpi.core.registry import Registry
 from gpi.core.broker import Broker
 from gpi.context.manager import ContextManager, get_context_manager
@@ -12,13 +14,14 @@ import gpi.context as context_module
 
 # Initialize singletons
 _registry = Registry()
-_broker = Broker(_registry)
 _context_manager = get_context_manager()
-_http_client = HttpClient()
 
-# Set the context module manager to use our singleton
+# Set the context module manager to use our singleton before the broker picks it up
 context_module._manager = _context_manager
 
+_broker = Broker(_registry)
+_http_client = HttpClient()
+
 # Define API classes
 class create:
     @staticmethod
@@ -126,6 +129,22 @@ class register:
         """
         return _http_client.register_agent(endpoint, payload)
     
+    @staticmethod
+    def agents_http(endpoint, payloads, concurrency=None):
+        """
+        Register many agents via HTTP endpoint, several at a time.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): Agent information to send, one dict per agent
+            concurrency (int, optional): Registrations in flight at once
+            
+        Returns:
+            dict: Report with the number 'succeeded' and 'failed' and, under
+                'results', each registration's response or error, in payload order
+        """
+        return _http_client.register_agents(endpoint, payloads, concurrency)
+    
     @staticmethod
     def llm_http(endpoint, payload):
         """
@@ -140,6 +159,17 @@ class register:
         """
         return _http_client.register_llm(endpoint, payload)
     
+    @staticmethod
+    def ability_keywords(ability, keywords):
+        """
+        Register keywords or phrases that route messages to an ability.
+        
+        Args:
+            ability (str): The ability to route to
+            keywords (list): Keywords or phrases indicating the ability
+        """
+        _broker.ability_matcher.add_ability(ability, keywords)
+    
     @staticmethod
     def context_function(func):
         """
@@ -154,18 +184,21 @@ class register:
         # In the future, implement a registry for context functions
         return func
 
-def car(context=None, message=None, user_id="default", use_llm=False):
+def _prepare_context(context, message, user_id, use_llm):
     """
-    Generate a context-aware response.
+    Check a message and set the user's context, extracting it from the message if not given.
     
     Args:
-        context (str, optional): The context string (if None, auto-extracted from message)
-        message (str): The message to respond to
-        user_id (str, optional): User identifier for context tracking
-        use_llm (bool, optional): Whether to use LLM for context extraction
+        context (str): The context for the communication (if None, auto-extracted)
+        message (str): The message to process
+        user_id (str): User identifier for context tracking
+        use_llm (bool): Whether to use LLM for context extraction
         
     Returns:
-        str: The context-aware response
+        str: The user's context
+        
+    Raises:
+        ValueError: If the message is None
     """
     if message is None:
         raise ValueError("Message cannot be None")
@@ -176,10 +209,26 @@ def car(context=None, message=None, user_id="default", use_llm=False):
         llm = _registry.get_llm("default") if use_llm else None
         
         # Extract and update context
-        context = _context_manager.extract_and_update_context(message, user_id, use_llm, llm)
-    else:
-        # Manually set context
-        _context_manager.set_context(user_id, context)
+        return _context_manager.extract_and_update_context(message, user_id, use_llm, llm)
+    
+    # Manually set context
+    _context_manager.set_context(user_id, context)
+    return context
+
+def car(context=None, message=None, user_id="default", use_llm=False):
+    """
+    Generate a context-aware response.
+    
+    Args:
+        context (str, optional): The context string (if None, auto-extracted from message)
+        message (str): The message to respond to
+        user_id (str, optional): User identifier for context tracking
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        
+    Returns:
+        str: The context-aware response
+    """
+    _prepare_context(context, message, user_id, use_llm)
     
     return _broker.generate_response(message, user_id)
 
@@ -196,21 +245,157 @@ def bapi(context=None, message=None, user_id="default", use_llm=False):
     Returns:
         str: The response generated by the appropriate agent/LLM
     """
-    if message is None:
-        raise ValueError("Message cannot be None")
+    _prepare_context(context, message, user_id, use_llm)
     
-    # Auto-extract context if not provided
-    if context is None:
-        # Get the LLM if available and requested
-        llm = _registry.get_llm("default") if use_llm else None
+    return _broker.process_message(message, user_id)
+
+async def bapi_async(context=None, message=None, user_id="default", use_llm=False,
+                     fanout=1, hedge=True, hedge_delay=None, timeout=None):
+    """
+    Use the Broker API asynchronously, racing capable agents to cut tail latency.
+    
+    Args:
+        context (str, optional): The context for the communication (if None, auto-extracted)
+        message (str): The message to process
+        user_id (str, optional): User identifier for context tracking
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        fanout (int, optional): Number of agents to call at once
+        hedge (bool, optional): Whether to send backup requests to slow agents
+        hedge_delay (float, optional): Seconds before a backup request (default: the agent's p95 latency)
+        timeout (float, optional): Overall deadline in seconds
         
-        # Extract and update context
-        context = _context_manager.extract_and_update_context(message, user_id, use_llm, llm)
-    else:
-        # Manually set context
-        _context_manager.set_context(user_id, context)
+    Returns:
+        str: The first successful response from the agents called
+    """
+    # Context extraction may run NLTK or an LLM, so keep it off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, _prepare_context, context, message, user_id, use_llm)
     
-    return _broker.process_message(message, user_id)
+    return await _broker.process_message_async(message, user_id, fanout, hedge, hedge_delay, timeout)
+
+def bapi_stream(context=None, message=None, user_id="default", use_llm=False, timeout=None, raise_errors=False):
+    """
+    Use the Broker API, receiving the response piece by piece as the agent produces it.
+    
+    Args:
+        context (str, optional): The context for the communication (if None, auto-extracted)
+        message (str): The message to process
+        user_id (str, optional): User identifier for context tracking
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        timeout (float, optional): Deadline in seconds for the agent call
+        raise_errors (bool, optional): Raise AgentCallError on failure instead of
+            yielding the error message like bapi returns it
+        
+    Returns:
+        generator: Pieces of the response (str), in order
+    """
+    _prepare_context(context, message, user_id, use_llm)
+    
+    pieces = _broker.stream_message(message, user_id, timeout)
+    return pieces if raise_errors else _errors_as_text(pieces)
+
+async def bapi_stream_async(context=None, message=None, user_id="default", use_llm=False, timeout=None,
+                            raise_errors=False):
+    """
+    Asynchronous version of bapi_stream.
+    
+    Args:
+        context (str, optional): The context for the communication (if None, auto-extracted)
+        message (str): The message to process
+        user_id (str, optional): User identifier for context tracking
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        timeout (float, optional): Deadline in seconds for the agent call
+        raise_errors (bool, optional): Raise AgentCallError on failure instead of
+            yielding the error message
+        
+    Yields:
+        str: Pieces of the response, in order
+    """
+    # Context extraction may run NLTK or an LLM, so keep it off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, _prepare_context, context, message, user_id, use_llm)
+    
+    pieces = _broker.stream_message_async(message, user_id, timeout)
+    try:
+        async for piece in pieces:
+            yield piece
+    except AgentCallError as e:
+        if raise_errors:
+            raise
+        yield str(e)
+    finally:
+        await pieces.aclose()
+
+def _errors_as_text(pieces):
+    """
+    Pass a response stream through, ending it with the error message if it fails.
+    
+    Args:
+        pieces (generator): Pieces of a response
+        
+    Yields:
+        str: The pieces, then the error message if the stream failed
+    """
+    try:
+        yield from pieces
+    except AgentCallError as e:
+        yield str(e)
+
+def bapi_batch(batch, use_llm=False):
+    """
+    Use the Broker API for a batch of messages.
+    
+    Args:
+        batch (list): Message strings, or dicts with 'message' and optional 'context' and 'user_id'
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        
+    Returns:
+        list: One result dict per message, in order, with 'response', 'agent_id',
+            'context' and 'error' (None unless the message failed)
+    """
+    # Get the LLM if available and requested
+    llm = _registry.get_llm("default") if use_llm else None
+    
+    return _broker.process_messages(batch, use_llm, llm)
+
+def bapi_gather(context=None, message=None, user_id="default", use_llm=False,
+                ability=None, merge="concat", deadline=5.0):
+    """
+    Use the Broker API in scatter-gather mode, asking every matching agent.
+    
+    Args:
+        context (str, optional): The context for the communication (if None, auto-extracted)
+        message (str): The message to process
+        user_id (str, optional): User identifier for context tracking
+        use_llm (bool, optional): Whether to use LLM for context extraction
+        ability (str, optional): Ability the agents must have (default: routed by context)
+        merge (optional): "concat", "vote", "best_confidence" or a callable taking the results
+        deadline (float, optional): Seconds to wait for the agents
+        
+    Returns:
+        dict: The merged 'response', per-agent 'results' and whether all agents answered ('complete')
+    """
+    _prepare_context(context, message, user_id, use_llm)
+    
+    return _broker.scatter_gather(message, user_id, ability, merge, deadline)
+
+def replicate(node_id, port=0, peers=None, host="127.0.0.1", interval=0.5):
+    """
+    Replicate the registry with other GPI nodes over TCP.
+    
+    Args:
+        node_id (str): Unique identifier of this node
+        port (int, optional): Port to listen on for peers (0 picks a free port)
+        peers (list, optional): Peer addresses as (host, port) or "host:port"
+        host (str, optional): Host address to bind to
+        interval (float, optional): Seconds between pulls from each peer
+        
+    Returns:
+        RegistryReplicator: The running replicator
+    """
+    from gpi.core.replication import RegistryReplicator, TcpTransport
+    
+    replicator = RegistryReplicator(_registry, node_id, TcpTransport(host, port, peers), interval)
+    replicator.start()
+    return replicator
 
 # Context management functions
 def get_context(user_id="default"):
@@ -253,6 +438,12 @@ __all__ = [
     'register',
     'car',
     'bapi',
+    'bapi_async',
+    'bapi_stream',
+    'bapi_stream_async',
+    'bapi_batch',
+    'bapi_gather',
+    'replicate',
     'Agent',
     'get_context',
     'clear_context',
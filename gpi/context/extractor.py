@@ -73,6 +73,19 @@ class ContextInfo:
             
         return base + f"Query: {self.original_query}"
     
+    @staticmethod
+    def manual(context: str) -> 'ContextInfo':
+        """Create from a manually set context string"""
+        return ContextInfo(
+            topic="",
+            entities=[],
+            keywords=set(),
+            intent="manual",
+            confidence=1.0,  # High confidence since manually set
+            original_query=context,
+            llm_enhanced=False
+        )
+    
     @staticmethod
     def from_dict(data: Dict) -> 'ContextInfo':
         """Create from dictionary"""
@@ -4,7 +4,7 @@ This module maintains context history and provides context management functions.
 """
 
 import time
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import threading
 import json
 import os
@@ -40,7 +40,7 @@ class ContextManager:
         self.context_history: Dict[str, List[Dict]] = {}  # user_id -> list of context entries
         self.active_contexts: Dict[str, Dict] = {}  # user_id -> active context
         self.session_data: Dict[str, Dict] = {}  # user_id -> session data
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()  # Re-entrant: set_context calls _update_context
         
         # Load persisted context if available
         if persistence_path and os.path.exists(persistence_path):
@@ -68,6 +68,22 @@ class ContextManager:
                 return ContextInfo.from_dict(context_data).to_string()
             return None
     
+    def get_context_info(self, user_id: str = "default") -> Optional[ContextInfo]:
+        """
+        Get the current structured context for a user
+        
+        Args:
+            user_id: User identifier
+            
+        Returns:
+            The current ContextInfo or None if no context exists
+        """
+        with self._lock:
+            context_data = self.active_contexts.get(user_id)
+            if context_data:
+                return ContextInfo.from_dict(context_data)
+            return None
+    
     def extract_and_update_context(self, message: str, user_id: str = "default", 
                                   use_llm: bool = False, llm = None) -> str:
         """
@@ -95,6 +111,36 @@ class ContextManager:
         """
         Update the context history for a user
         
+        Args:
+            user_id: User identifier
+            context_info: Context information to add
+        """
+        with self._lock:
+            self._record_context(user_id, context_info)
+            
+            # Persist if path is set
+            self._persist()
+    
+    def update_contexts(self, updates: List[Tuple[str, ContextInfo]]) -> None:
+        """
+        Update the context history for many users at once
+        
+        The lock is taken and the history persisted once for the whole batch.
+        
+        Args:
+            updates: (user_id, context_info) pairs, applied in order
+        """
+        with self._lock:
+            for user_id, context_info in updates:
+                self._record_context(user_id, context_info)
+            
+            # Persist if path is set
+            self._persist()
+    
+    def _record_context(self, user_id: str, context_info: ContextInfo) -> None:
+        """
+        Add context to a user's history and make it active, without persisting
+        
         Args:
             user_id: User identifier
             context_info: Context information to add
@@ -119,9 +165,6 @@ class ContextManager:
             
             # Update active context
             self.active_contexts[user_id] = context_dict
-            
-            # Persist if path is set
-            self._persist()
     
     def set_context(self, user_id: str, context: str) -> None:
         """
@@ -132,19 +175,8 @@ class ContextManager:
             context: Context string
         """
         with self._lock:
-            # Create a simple context info
-            context_info = ContextInfo(
-                topic="",
-                entities=[],
-                keywords=set(),
-                intent="manual",
-                confidence=1.0,  # High confidence since manually set
-                original_query=context,
-                llm_enhanced=False
-            )
-            
-            # Update context
-            self._update_context(user_id, context_info)
+            # Create a simple context info and update context
+            self._update_context(user_id, ContextInfo.manual(context))
     
     def clear_context(self, user_id: str = "default") -> None:
         """
@@ -6,10 +6,14 @@ from gpi.core.agent import Agent
 from gpi.core.registry import Registry
 from gpi.core.broker import Broker
 from gpi.core.context import ContextManager
+from gpi.core.events import RegistryEvent
+from gpi.core.options import CallOptions
 
 __all__ = [
     'Agent',
     'Registry',
     'Broker',
-    'ContextManager'
+    'ContextManager',
+    'RegistryEvent',
+    'CallOptions'
 ]
@@ -0,0 +1,261 @@
+"""
+Module for the hierarchical ability index.
+
+Abilities are dotted paths such as "weather.forecast.hourly". The AbilityTrie
+stores which agents advertise each path so that exact, prefix and wildcard
+lookups cost time proportional to the ability depth rather than the number
+of registered agents. Abilities with empty segments, such as "weather." or
+"weather..alerts", are malformed: adding one raises ValueError, and lookups
+for one find no agents.
+"""
+
+SEPARATOR = "."
+WILDCARD = "*"
+
+
+def split_ability(ability):
+    """
+    Split a dotted ability into its segments.
+
+    Args:
+        ability (str): The ability, e.g. "weather.forecast"
+
+    Returns:
+        list: The ability segments, e.g. ["weather", "forecast"]
+
+    Raises:
+        ValueError: If the ability is empty or has an empty segment
+    """
+    segments = ability.split(SEPARATOR)
+    if not all(segments):
+        raise ValueError(f"Malformed ability {ability!r}: abilities are non-empty segments separated by "
+                         f"'{SEPARATOR}'")
+    return segments
+
+
+def _lookup_segments(ability):
+    """
+    Split an ability being looked up, which no agent has if it is malformed.
+
+    Args:
+        ability (str): The ability or pattern
+
+    Returns:
+        list or None: The ability segments, None if the ability is malformed
+    """
+    try:
+        return split_ability(ability)
+    except ValueError:
+        return None
+
+
+class _TrieNode:
+    """
+    A node in the ability trie.
+    """
+
+    __slots__ = ("children", "agent_ids")
+
+    def __init__(self):
+        self.children = {}   # segment -> _TrieNode
+        self.agent_ids = {}  # agent_id -> None, used as an insertion-ordered set
+
+
+class AbilityTrie:
+    """
+    Trie mapping dotted ability paths to the IDs of agents advertising them.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty trie.
+        """
+        self._root = _TrieNode()
+
+    def add(self, ability, agent_id):
+        """
+        Record that an agent advertises an ability.
+
+        Args:
+            ability (str): The dotted ability
+            agent_id (str): The ID of the agent
+        """
+        node = self._root
+        for segment in split_ability(ability):
+            node = node.children.setdefault(segment, _TrieNode())
+        node.agent_ids[agent_id] = None
+
+    def remove(self, ability, agent_id):
+        """
+        Record that an agent no longer advertises an ability.
+
+        Empty branches are pruned so the trie does not grow without bound.
+
+        Args:
+            ability (str): The dotted ability
+            agent_id (str): The ID of the agent
+
+        Returns:
+            bool: True if the agent was removed, False if it was not present
+        """
+        path = [self._root]
+        segments = _lookup_segments(ability) or []
+        if not segments:
+            return False
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return False
+            path.append(node)
+
+        if agent_id not in path[-1].agent_ids:
+            return False
+        del path[-1].agent_ids[agent_id]
+
+        # Prune nodes that no longer hold agents or children
+        for depth in range(len(segments), 0, -1):
+            node = path[depth]
+            if node.agent_ids or node.children:
+                break
+            del path[depth - 1].children[segments[depth - 1]]
+        return True
+
+    def _find(self, segments):
+        """
+        Walk the trie along the given segments.
+
+        Args:
+            segments (list): Ability segments
+
+        Returns:
+            _TrieNode or None: The node for the path, None if it does not exist
+        """
+        node = self._root
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def exact(self, ability):
+        """
+        Get the agents advertising exactly the given ability.
+
+        Args:
+            ability (str): The dotted ability
+
+        Returns:
+            list: Agent IDs in registration order
+        """
+        segments = _lookup_segments(ability)
+        node = self._find(segments) if segments else None
+        return list(node.agent_ids) if node else []
+
+    def prefix(self, ability):
+        """
+        Get the agents advertising the given ability or any ability below it.
+
+        Args:
+            ability (str): The dotted ability prefix, e.g. "weather"
+
+        Returns:
+            list: Agent IDs, without duplicates
+        """
+        segments = _lookup_segments(ability)
+        node = self._find(segments) if segments else None
+        if node is None:
+            return []
+
+        result = {}
+        self._collect(node, result)
+        return list(result)
+
+    def match(self, pattern):
+        """
+        Get the agents advertising abilities that match a wildcard pattern.
+
+        A "*" segment matches any single segment, except in the last
+        position where it matches everything below the preceding path, so
+        "weather.*" matches "weather.forecast" and "weather.alerts.severe"
+        but not "weather" itself. Patterns without wildcards match exactly.
+
+        Args:
+            pattern (str): The pattern, e.g. "weather.*" or "*.forecast"
+
+        Returns:
+            list: Agent IDs, without duplicates
+        """
+        segments = _lookup_segments(pattern)
+        if segments is None:
+            return []
+        result = {}
+        self._match(self._root, segments, 0, result)
+        return list(result)
+
+    def _match(self, node, segments, index, result):
+        """
+        Recursively match a pattern from a node.
+
+        Args:
+            node (_TrieNode): The current node
+            segments (list): Pattern segments
+            index (int): Index of the next segment to match
+            result (dict): Ordered set collecting matching agent IDs
+        """
+        if index == len(segments):
+            result.update(node.agent_ids)
+            return
+
+        segment = segments[index]
+        if segment != WILDCARD:
+            child = node.children.get(segment)
+            if child is not None:
+                self._match(child, segments, index + 1, result)
+        elif index == len(segments) - 1:
+            for child in node.children.values():
+                self._collect(child, result)
+        else:
+            for child in node.children.values():
+                self._match(child, segments, index + 1, result)
+
+    def _collect(self, node, result):
+        """
+        Collect the agents of a node and all of its descendants.
+
+        Args:
+            node (_TrieNode): The subtree root
+            result (dict): Ordered set collecting agent IDs
+        """
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            result.update(current.agent_ids)
+            stack.extend(reversed(list(current.children.values())))
+
+    def resolve(self, ability, accept=None):
+        """
+        Resolve an ability to the agents with the most specific match.
+
+        The trie is walked along the requested path and the deepest node
+        holding acceptable agents wins, so a request for
+        "weather.forecast.hourly" is served by "weather.forecast" agents if
+        there are no "weather.forecast.hourly" agents, then by "weather" agents.
+
+        Args:
+            ability (str): The requested dotted ability
+            accept (callable, optional): Predicate on agent IDs (e.g. "is active")
+
+        Returns:
+            list: Agent IDs of the most specific match, empty if none
+        """
+        best = []
+        node = self._root
+        for segment in _lookup_segments(ability) or []:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            candidates = [agent_id for agent_id in node.agent_ids
+                          if accept is None or accept(agent_id)]
+            if candidates:
+                best = candidates
+        return best
@@ -0,0 +1,282 @@
+"""
+Module for admission control in front of the broker.
+
+The AdmissionController runs work on a fixed pool of worker threads fed by a
+bounded queue. Requests are queued per priority class and, within a class,
+per user; workers serve the highest non-empty class and rotate between its
+users so that one busy user cannot starve the others. Load is shed early:
+a request is rejected on arrival when the queue is full, when its user has
+too many requests queued, or when its estimated queue wait exceeds the
+budget, and a request that still waited too long is dropped unrun. A job
+standing for several requests, such as a batch, is submitted with a cost and
+counts as that many requests; it is admitted or rejected as a whole.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+DEFAULT_PRIORITIES = ("high", "normal", "low")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is rejected by admission control.
+    """
+
+    def __init__(self, message, status=503, retry_after=1):
+        """
+        Initialize the error.
+
+        Args:
+            message (str): Why the request was rejected
+            status (int, optional): HTTP status to report (429 for a user over
+                their share, 503 when the service as a whole is overloaded)
+            retry_after (int, optional): Suggested seconds before retrying
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Job:
+    """
+    A queued request.
+    """
+
+    __slots__ = ('func', 'args', 'kwargs', 'user_id', 'cost', 'future', 'enqueued')
+
+    def __init__(self, func, args, kwargs, user_id, cost=1):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.user_id = user_id
+        self.cost = cost
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Bounded, fair, prioritized work queue served by a fixed worker pool.
+    """
+
+    def __init__(self, workers=8, max_queue=256, max_per_user=32, queue_budget=1.0,
+                 priorities=DEFAULT_PRIORITIES, alpha=0.2):
+        """
+        Initialize the controller. Workers start with the first request.
+
+        Args:
+            workers (int, optional): Number of worker threads
+            max_queue (int, optional): Maximum number of queued requests
+            max_per_user (int, optional): Maximum number of queued requests per user
+            queue_budget (float, optional): Maximum seconds a request may wait in the queue
+            priorities (tuple, optional): Priority class names, highest first
+            alpha (float, optional): EWMA weight used to estimate service time
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_budget = queue_budget
+        self.priorities = tuple(priorities)
+        self.alpha = alpha
+        self._queues = [OrderedDict() for _ in self.priorities]  # user_id -> deque of _Job
+        self._user_counts = {}  # user_id -> queued requests
+        self._queued = 0  # Queued requests, i.e. the total cost of the queued jobs
+        self._busy = 0
+        self._service_time = None  # EWMA of seconds per request
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._counts = {'admitted': 0, 'completed': 0, 'rejected_user': 0,
+                        'rejected_full': 0, 'rejected_wait': 0, 'shed': 0}
+
+    def start(self):
+        """
+        Start the worker threads if they are not running.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [threading.Thread(target=self._work, name=f"gpi-admission-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop the worker threads, failing any requests still queued.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+            for queue in self._queues:
+                for jobs in queue.values():
+                    for job in jobs:
+                        job.future.set_exception(Overloaded("Server is shutting down"))
+                queue.clear()
+            self._user_counts.clear()
+            self._queued = 0
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, func, *args, user_id="default", priority="normal", cost=1, **kwargs):
+        """
+        Queue `func(*args, **kwargs)` for a worker.
+
+        Args:
+            func (callable): The work to run
+            *args: Positional arguments for func
+            user_id (str, optional): User the request is accounted to
+            priority (str, optional): Priority class name
+            cost (int, optional): Number of requests the job stands for, e.g. the
+                size of a batch; it must fit in the queue and the user's share as a whole
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            Future: Resolves to the result of func, or raises Overloaded if the
+                request was shed before it ran
+
+        Raises:
+            ValueError: If the priority class is unknown
+            Overloaded: If the request is rejected on arrival
+        """
+        if priority not in self.priorities:
+            raise ValueError(f"Unknown priority: {priority}. Choose from: {', '.join(self.priorities)}")
+        level = self.priorities.index(priority)
+        cost = max(1, int(cost))
+
+        self.start()
+        with self._condition:
+            if self._user_counts.get(user_id, 0) + cost > self.max_per_user:
+                self._counts['rejected_user'] += cost
+                raise Overloaded(f"Too many queued requests for user {user_id}", 429)
+
+            if self._queued + cost > self.max_queue:
+                self._counts['rejected_full'] += cost
+                raise Overloaded("Request queue is full", 503)
+
+            wait = self._estimate_wait(level)
+            if wait > self.queue_budget:
+                self._counts['rejected_wait'] += cost
+                raise Overloaded(f"Estimated queue wait of {wait:.2f}s exceeds the budget", 503,
+                                 max(1, math.ceil(wait)))
+
+            job = _Job(func, args, kwargs, user_id, cost)
+            self._queues[level].setdefault(user_id, deque()).append(job)
+            self._user_counts[user_id] = self._user_counts.get(user_id, 0) + cost
+            self._queued += cost
+            self._counts['admitted'] += cost
+            self._condition.notify()
+            return job.future
+
+    def _estimate_wait(self, level):
+        """
+        Estimate how long a new request of a priority class would wait.
+
+        Must be called with the lock held.
+
+        Args:
+            level (int): Index of the priority class
+
+        Returns:
+            float: Estimated seconds in the queue
+        """
+        if self._service_time is None:
+            return 0.0
+        ahead = sum(job.cost for queue in self._queues[:level + 1] for jobs in queue.values() for job in jobs)
+        # Every worker is busy until the requests ahead of this one have been served
+        if self._busy + ahead < self.workers:
+            return 0.0
+        return (ahead + 1) * self._service_time / self.workers
+
+    def _next_job(self):
+        """
+        Take the next request, rotating between the users of the highest class.
+
+        Must be called with the lock held and at least one request queued.
+
+        Returns:
+            _Job: The request to run
+        """
+        for queue in self._queues:
+            if queue:
+                user_id, jobs = next(iter(queue.items()))
+                job = jobs.popleft()
+                del queue[user_id]
+                if jobs:
+                    queue[user_id] = jobs  # Move the user to the back of the rotation
+                break
+
+        count = self._user_counts[job.user_id] - job.cost
+        if count:
+            self._user_counts[job.user_id] = count
+        else:
+            del self._user_counts[job.user_id]
+        self._queued -= job.cost
+        return job
+
+    def _work(self):
+        """
+        Worker loop: run queued requests until stopped.
+        """
+        while True:
+            with self._condition:
+                while self._running and not self._queued:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                job = self._next_job()
+                waited = time.monotonic() - job.enqueued
+                if waited > self.queue_budget:
+                    self._counts['shed'] += job.cost
+                    job.future.set_exception(Overloaded(f"Request waited {waited:.2f}s in the queue", 503))
+                    continue
+                self._busy += 1
+
+            if not job.future.set_running_or_notify_cancel():
+                with self._condition:
+                    self._busy -= 1
+                continue
+
+            start = time.monotonic()
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                # Per request, so batches do not skew the estimate
+                elapsed = (time.monotonic() - start) / job.cost
+                with self._condition:
+                    self._busy -= 1
+                    self._counts['completed'] += job.cost
+                    if self._service_time is None:
+                        self._service_time = elapsed
+                    else:
+                        self._service_time += self.alpha * (elapsed - self._service_time)
+
+    def stats(self):
+        """
+        Get admission metrics.
+
+        Returns:
+            dict: Request counts by outcome, queue lengths per priority class,
+                busy workers and the estimated service time
+        """
+        with self._condition:
+            stats = dict(self._counts)
+            stats.update({
+                'queued': self._queued,
+                'queued_by_priority': {name: sum(job.cost for jobs in queue.values() for job in jobs)
+                                       for name, queue in zip(self.priorities, self._queues)},
+                'busy_workers': self._busy,
+                'workers': self.workers,
+                'service_time': self._service_time
+            })
+            return stats
@@ -2,6 +2,74 @@
 Module for Agent class implementation.
 """
 
+import sys
+import threading
+import weakref
+
+from gpi.core import events
+from gpi.core.abilities import split_ability
+from gpi.core.batching import MicroBatcher
+from gpi.core.handlers import EXECUTION_MODES, INLINE, check_handler, get_handler_pool
+from gpi.core.options import DEFAULT_CALL_OPTIONS, CallOptions
+
+class AgentCallError(Exception):
+    """
+    Raised when an agent fails to produce a response.
+    """
+    pass
+
+# Shared, interned ability sets: agents with the same abilities share one AbilitySet
+_ability_sets = weakref.WeakValueDictionary()
+
+# Guards the lazy creation of agents' batchers
+_batcher_lock = threading.Lock()
+
+# Content types of streamed replies with one JSON object per line
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+class AbilitySet:
+    """
+    Immutable, interned set of abilities that remembers their order.
+    
+    Large fleets tend to reuse a handful of ability combinations, so agents
+    hold a reference to a shared AbilitySet instead of their own list.
+    """
+    
+    __slots__ = ('order', 'members', '__weakref__')
+    
+    def __init__(self, order):
+        """
+        Initialize an ability set. Use AbilitySet.intern instead of calling this directly.
+        
+        Args:
+            order (tuple): Interned ability strings in insertion order
+        """
+        self.order = order
+        self.members = frozenset(order)
+    
+    @staticmethod
+    def intern(abilities):
+        """
+        Get the shared ability set for the given abilities.
+        
+        Args:
+            abilities (iterable): Ability strings (duplicates are dropped)
+            
+        Returns:
+            AbilitySet: The shared ability set
+            
+        Raises:
+            ValueError: If an ability is malformed (see gpi.core.abilities.split_ability)
+        """
+        order = tuple(sys.intern(ability) for ability in dict.fromkeys(abilities))
+        ability_set = _ability_sets.get(order)
+        if ability_set is None:
+            for ability in order:
+                split_ability(ability)
+            ability_set = AbilitySet(order)
+            _ability_sets[order] = ability_set
+        return ability_set
+
 class Agent:
     """
     Represents an agent with a name, ID, and abilities.
@@ -10,7 +78,23 @@ class Agent:
     with other agents and LLMs.
     """
     
-    def __init__(self, name, agent_id, abilities, external_endpoint=None, api_key=None, agent_type="internal"):
+    __slots__ = (
+        'name',
+        'agent_id',
+        '_abilities',
+        'active',
+        'external_endpoint',
+        'api_key',
+        'agent_type',
+        'weight',
+        'options',
+        'handler',
+        '_batcher',
+        '_listener'
+    )
+    
+    def __init__(self, name, agent_id, abilities, external_endpoint=None, api_key=None, agent_type="internal",
+                 weight=1, options=None, handler=None):
         """
         Initialize an agent with name, ID, and abilities.
         
@@ -21,7 +105,13 @@ class Agent:
             external_endpoint (str, optional): API endpoint for external agents
             api_key (str, optional): API key for authentication with external agents
             agent_type (str, optional): Type of agent ("internal" or "external")
+            weight (float, optional): Relative share of traffic under weighted load balancing
+            options (CallOptions, optional): Caching, timeout, retry, concurrency, batching
+                and handler execution settings (defaults to DEFAULT_CALL_OPTIONS)
+            handler (callable, optional): Produces the responses of an internal agent, run
+                in the execution mode of the options (see set_handler)
         """
+        self._listener = None  # Set by the registry to receive change notifications
         self.name = name
         self.agent_id = agent_id
         self.abilities = abilities
@@ -29,6 +119,12 @@ class Agent:
         self.external_endpoint = external_endpoint
         self.api_key = api_key
         self.agent_type = agent_type
+        self.weight = weight
+        self.options = options or DEFAULT_CALL_OPTIONS
+        self.handler = None
+        self._batcher = None
+        if handler is not None:
+            self.set_handler(handler, self.options.execution)
     
     def __str__(self):
         """
@@ -39,6 +135,82 @@ class Agent:
         """
         return f"Agent(name={self.name}, id={self.agent_id}, type={self.agent_type}, abilities={self.abilities})"
     
+    def to_dict(self):
+        """
+        Convert the agent's registration details to a dictionary.
+        
+        This is what registry events and replication carry. The handler and
+        the node-local options (see CallOptions.to_dict) are not included.
+        
+        Returns:
+            dict: Dictionary representation of the agent
+        """
+        return {
+            'agent_id': self.agent_id,
+            'name': self.name,
+            'abilities': self.abilities,
+            'agent_type': self.agent_type,
+            'external_endpoint': self.external_endpoint,
+            'api_key': self.api_key,
+            'weight': self.weight,
+            'options': self.options.to_dict(),
+            'active': self.is_active()
+        }
+    
+    @staticmethod
+    def from_dict(data):
+        """
+        Create an agent from a dictionary.
+        
+        Args:
+            data (dict): Dictionary produced by to_dict
+            
+        Returns:
+            Agent: The reconstructed agent
+        """
+        agent = Agent(
+            data['name'],
+            data['agent_id'],
+            data['abilities'],
+            data.get('external_endpoint'),
+            data.get('api_key'),
+            data.get('agent_type', "internal"),
+            data.get('weight', 1),
+            CallOptions.from_dict(data.get('options') or {})
+        )
+        if not data.get('active', True):
+            agent.deactivate()
+        return agent
+    
+    @property
+    def abilities(self):
+        """
+        The agent's abilities in the order they were added.
+        
+        Returns:
+            list: A copy of the ability list; use add_ability/remove_ability to edit it
+        """
+        return list(self._abilities.order)
+    
+    @abilities.setter
+    def abilities(self, abilities):
+        """
+        Replace the agent's abilities.
+        
+        Args:
+            abilities (list): List of strings representing agent abilities
+        """
+        previous = getattr(self, '_abilities', None)
+        self._abilities = AbilitySet.intern(abilities)
+        
+        if previous is not None:
+            for ability in previous.order:
+                if ability not in self._abilities.members:
+                    self._notify(events.ABILITY_REMOVED, ability=ability)
+            for ability in self._abilities.order:
+                if ability not in previous.members:
+                    self._notify(events.ABILITY_ADDED, ability=ability)
+    
     def has_ability(self, ability):
         """
         Check if the agent has a specific ability.
@@ -49,7 +221,7 @@ class Agent:
         Returns:
             bool: True if the agent has the ability, False otherwise
         """
-        return ability in self.abilities
+        return ability in self._abilities.members
     
     def add_ability(self, ability):
         """
@@ -60,11 +232,15 @@ class Agent:
             
         Returns:
             bool: True if ability was added, False if already present
+            
+        Raises:
+            ValueError: If the ability is malformed, e.g. "weather."
         """
-        if ability in self.abilities:
+        if ability in self._abilities.members:
             return False
         
-        self.abilities.append(ability)
+        self._abilities = AbilitySet.intern(self._abilities.order + (ability,))
+        self._notify(events.ABILITY_ADDED, ability=ability)
         return True
     
     def remove_ability(self, ability):
@@ -77,23 +253,39 @@ class Agent:
         Returns:
             bool: True if ability was removed, False if not present
         """
-        if ability not in self.abilities:
+        if ability not in self._abilities.members:
             return False
         
-        self.abilities.remove(ability)
+        self._abilities = AbilitySet.intern(a for a in self._abilities.order if a != ability)
+        self._notify(events.ABILITY_REMOVED, ability=ability)
         return True
     
     def deactivate(self):
         """
         Deactivate the agent.
         """
-        self.active = False
+        if self.active:
+            self.active = False
+            self._notify(events.AGENT_DEACTIVATED)
     
     def activate(self):
         """
         Activate the agent.
         """
-        self.active = True
+        if not self.active:
+            self.active = True
+            self._notify(events.AGENT_ACTIVATED)
+    
+    def _notify(self, kind, **data):
+        """
+        Notify the owning registry about a change to this agent.
+        
+        Args:
+            kind (str): Kind of change (see gpi.core.events)
+            **data: Additional details about the change
+        """
+        if self._listener is not None:
+            self._listener(self, kind, data)
     
     def is_active(self):
         """
@@ -113,6 +305,107 @@ class Agent:
         """
         return self.agent_type == "external"
     
+    def check_health(self, timeout=None):
+        """
+        Check whether the agent can take requests.
+        
+        External agents are probed with a GET to their endpoint; any reply but
+        a server error (501 Not Implemented aside) counts as healthy. Agents
+        reached over a channel are healthy while it can be connected. Internal
+        agents are healthy while active.
+        
+        Args:
+            timeout (optional): Seconds, or a (connect, read) tuple (defaults to the agent's timeout)
+            
+        Returns:
+            bool: True if the agent is healthy
+        """
+        if not self.is_external() or not self.external_endpoint:
+            return self.active
+        
+        import requests
+        from gpi.utils.channel import get_channel, is_channel_endpoint
+        from gpi.utils.http import get_session_pool
+        
+        if is_channel_endpoint(self.external_endpoint):
+            # Healthy if the channel is (or can be) connected
+            try:
+                get_channel(self.external_endpoint).connect(timeout)
+            except ConnectionError:
+                return False
+            return True
+        
+        try:
+            response = get_session_pool().get(self.external_endpoint, timeout=timeout or self.options.timeout)
+        except requests.exceptions.RequestException:
+            return False
+        return response.status_code < 500 or response.status_code == 501
+    
+    def set_handler(self, handler, execution=INLINE):
+        """
+        Set the callable that produces this internal agent's responses, and where it runs.
+        
+        The handler is called with the context and the message and returns
+        the response text, or a reply dict with the text under 'response'.
+        It runs on the calling thread ("inline"), on the shared thread pool
+        ("thread") or on the shared process pool ("process", for CPU-bound
+        work; the handler must then be a module-level function). Handlers are
+        local to this process and are not replicated.
+        
+        Args:
+            handler (callable): The handler, or None to restore the built-in responses
+            execution (str, optional): One of gpi.core.handlers.EXECUTION_MODES
+            
+        Raises:
+            ValueError: If the execution mode is unknown or the handler cannot run in it
+        """
+        if handler is not None:
+            check_handler(handler, execution)
+        elif execution not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution}")
+        self.handler = handler
+        if execution != self.options.execution:
+            self.options = self.options.replace(execution=execution)
+    
+    def _run_handler(self, context, message, deadline=None, cancel=None):
+        """
+        Run the agent's handler in its execution mode.
+        
+        Args:
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline (pooled modes only)
+            cancel (threading.Event, optional): Skips the handler if set before it starts
+            
+        Returns:
+            dict: The reply, with the response text under 'response'
+            
+        Raises:
+            AgentCallError: If the handler failed, missed the deadline or was cancelled
+        """
+        from gpi.core.retry import RequestCancelled, remaining
+        
+        handler = self.handler
+        try:
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled("Request cancelled")
+            execution = self.options.execution
+            if execution == INLINE:
+                reply = handler(context, message)
+            else:
+                left = remaining(deadline)
+                if left is not None and left <= 0:
+                    raise TimeoutError("Request deadline exceeded")
+                reply = get_handler_pool(execution).call(handler, context, message, left)
+        except Exception as e:
+            raise AgentCallError(f"Handler of agent {self.name} failed: {str(e) or type(e).__name__}") from e
+        
+        if isinstance(reply, dict):
+            if 'response' not in reply:
+                raise AgentCallError(f"Handler of agent {self.name} returned no response")
+            return reply
+        return {'response': reply}
+    
     def process_message(self, context, message):
         """
         Process a message with the given context.
@@ -124,9 +417,41 @@ class Agent:
         Returns:
             str: The response from the agent
         """
+        try:
+            return self.invoke(context, message)['response']
+        except AgentCallError as e:
+            return str(e)
+    
+    def invoke(self, context, message, deadline=None, cancel=None):
+        """
+        Process a message and return the agent's full reply.
+        
+        Unlike process_message, failures are raised rather than returned as
+        text, so callers such as the Broker can tell errors from answers.
+        
+        Args:
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() time by which
+                the reply is needed (external agents and pooled handlers only)
+            cancel (threading.Event, optional): Set when the reply is no longer
+                needed; the call then stops before its next attempt (batched
+                calls are shared with other callers and run to completion)
+            
+        Returns:
+            dict: The reply, with the response text under 'response'
+            
+        Raises:
+            AgentCallError: If the agent could not produce a response
+        """
         # If this is an external agent with an endpoint, we would call the external API
         if self.is_external() and self.external_endpoint:
-            return self._call_external_endpoint(context, message)
+            if self.options.batch_size and self.options.batch_size > 1:
+                return self._get_batcher().submit((context, message), deadline)
+            return self._call_external_endpoint(context, message, deadline, cancel)
+        
+        if self.handler is not None:
+            return self._run_handler(context, message, deadline, cancel)
         
         # This is a simple simulation of message processing for internal agents
         # In a real implementation, this would use the agent's abilities
@@ -135,66 +460,341 @@ class Agent:
         response = f"Agent {self.name} received: {message} (Context: {context})"
         
         # Simulate different responses based on abilities
-        if "talk" in self.abilities:
+        if self.has_ability("talk"):
             response += f"\nI can talk and respond to your message."
         
-        if "think" in self.abilities:
+        if self.has_ability("think"):
             response += f"\nI've analyzed your request and am processing it."
         
-        if "learn" in self.abilities:
+        if self.has_ability("learn"):
             response += f"\nI'm learning from this interaction to improve future responses."
             
-        return response
+        return {'response': response}
     
-    def _call_external_endpoint(self, context, message):
+    def stream(self, context, message, deadline=None):
         """
-        Call the external endpoint for an external agent.
+        Process a message, yielding the response text as it is produced.
+        
+        External agents are asked to stream ('stream': true in the request)
+        and may answer with newline-delimited JSON (one {"delta": ...} object
+        per line, or {"error": ...}), with chunked text/plain, or with an
+        ordinary JSON reply, which is yielded whole. Internal agents and
+        agents reached over a channel yield their full response at once.
         
         Args:
             context (str): The context for processing the message
             message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+                (external agents only)
             
-        Returns:
-            str: The response from the external agent
+        Yields:
+            str: Pieces of the response, in order
+            
+        Raises:
+            AgentCallError: If the agent could not produce (all of) a response
+        """
+        from gpi.utils.channel import is_channel_endpoint
+        
+        if self.is_external() and self.external_endpoint and not is_channel_endpoint(self.external_endpoint):
+            yield from self._stream_external_endpoint(context, message, deadline)
+        elif deadline is not None:
+            yield self.invoke(context, message, deadline)['response']
+        else:
+            yield self.invoke(context, message)['response']
+    
+    def _stream_external_endpoint(self, context, message, deadline=None):
+        """
+        Call the external endpoint for an external agent, streaming the reply.
+        
+        Only the request itself is retried; once the reply has started, a
+        failure ends the stream with AgentCallError.
+        
+        Args:
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Yields:
+            str: Pieces of the response, in order
+            
+        Raises:
+            AgentCallError: If the endpoint could not be reached, returned an error
+                or the deadline passed mid-stream
         """
         import requests
+        from gpi.core.retry import remaining
+        
+        payload = {
+            'agent_id': self.agent_id,
+            'context': context,
+            'message': message,
+            'stream': True
+        }
+        response = self._post(payload, deadline, stream=True)
+        
+        try:
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            response.encoding = response.encoding or 'utf-8'
+            if content_type in NDJSON_TYPES:
+                pieces = self._parse_ndjson(response.iter_lines(chunk_size=None, decode_unicode=True))
+            elif content_type.startswith('text/'):
+                pieces = response.iter_content(chunk_size=None, decode_unicode=True)
+            else:
+                response_data = response.json()
+                pieces = [response_data.get('response',
+                                            f"External agent {self.name} responded but provided no message")]
+            
+            for piece in pieces:
+                if piece:
+                    yield piece
+                left = remaining(deadline)
+                if left is not None and left <= 0:
+                    raise AgentCallError(f"External agent {self.name} did not finish before the deadline")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise AgentCallError(f"Error communicating with external agent {self.name}: {str(e)}") from e
+        finally:
+            response.close()
+    
+    def _parse_ndjson(self, lines):
+        """
+        Turn the lines of a newline-delimited JSON reply into response text.
+        
+        Args:
+            lines (iterable): Lines of the reply
+            
+        Yields:
+            str: The 'delta' (or 'response') text of each line
+            
+        Raises:
+            AgentCallError: If a line reports an error
+            ValueError: If a line is not valid JSON
+        """
         import json
         
+        for line in lines:
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get('error') is not None:
+                raise AgentCallError(f"Error from external agent {self.name}: {event['error']}")
+            yield event.get('delta', event.get('response'))
+    
+    def _call_external_endpoint(self, context, message, deadline=None, cancel=None):
+        """
+        Call the external endpoint for an external agent.
+        
+        Args:
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            cancel (threading.Event, optional): Stops retrying once set
+            
+        Returns:
+            dict: The reply from the external agent, with the text under 'response'
+            
+        Raises:
+            AgentCallError: If the endpoint could not be reached or returned an error
+        """
         # Skip the actual API call if no endpoint is provided
         if not self.external_endpoint:
-            return f"External agent {self.name} has no endpoint configured"
+            return {'response': f"External agent {self.name} has no endpoint configured"}
+        
+        payload = {
+            'agent_id': self.agent_id,
+            'context': context,
+            'message': message
+        }
+        response_data = self._post(payload, deadline, cancel=cancel)
+        
+        # Fill in a default message if the agent provided none
+        response_data.setdefault('response', f"External agent {self.name} responded but provided no message")
+        return response_data
+    
+    def _get_batcher(self):
+        """
+        Get the batcher for calls to the external endpoint, creating it on first use.
+        
+        Returns:
+            MicroBatcher: The agent's batcher
+        """
+        if self._batcher is None:
+            with _batcher_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(self._call_external_batch, self.options.batch_size,
+                                                 self.options.batch_window)
+        return self._batcher
+    
+    def _call_external_batch(self, items, deadline=None):
+        """
+        Send several messages to the external endpoint in one request.
+        
+        Args:
+            items (list): (context, message) pairs
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Returns:
+            list: One reply dict, or AgentCallError for a failed message, per item
+            
+        Raises:
+            AgentCallError: If the endpoint could not be reached or returned an error
+        """
+        payload = {
+            'agent_id': self.agent_id,
+            'batch': [{'id': i, 'context': context, 'message': message}
+                      for i, (context, message) in enumerate(items)]
+        }
+        response_data = self._post(payload, deadline)
+        
+        replies = {}
+        for reply in response_data.get('responses') or []:
+            if isinstance(reply, dict):
+                replies[reply.get('id')] = reply
+        
+        results = []
+        for i in range(len(items)):
+            reply = replies.get(i)
+            if reply is None:
+                results.append(AgentCallError(f"External agent {self.name} returned no reply for batch item {i}"))
+            elif reply.get('error') is not None:
+                results.append(AgentCallError(f"Error from external agent {self.name}: {reply['error']}"))
+            else:
+                reply = {key: value for key, value in reply.items() if key != 'id'}
+                reply.setdefault('response', f"External agent {self.name} responded but provided no message")
+                results.append(reply)
+        return results
+    
+    def _send_over_channel(self, payload, deadline=None, cancel=None):
+        """
+        Send a payload over the shared multiplexed channel to a gpi+tcp:// endpoint.
+        
+        The API key and the time left before the deadline travel in the frame
+        as 'authorization' and 'deadline_ms'. Lost connections and timeouts are
+        retried according to the agent's retry policy; each retry reconnects.
+        
+        Args:
+            payload (dict): The request body
+            deadline (float, optional): Absolute time.monotonic() deadline
+            cancel (threading.Event, optional): Stops retrying once set
+            
+        Returns:
+            dict: The reply
+            
+        Raises:
+            AgentCallError: If the agent could not be reached or returned an error
+        """
+        from gpi.core.retry import DEFAULT_RETRY_POLICY, DeadlineExceeded, RequestCancelled
+        from gpi.utils.channel import get_channel
+        from gpi.utils.http import get_session_pool
+        
+        channel = get_channel(self.external_endpoint)
+        timeout = self.options.timeout or get_session_pool().timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        
+        def attempt(left):
+            request = dict(payload)
+            if self.api_key:
+                request['authorization'] = f'Bearer {self.api_key}'
+            if left is not None:
+                request['deadline_ms'] = max(1, int(left * 1000))
+                return channel.call(request, min(read, left), min(connect, left))
+            return channel.call(request, read, connect)
         
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
+            options = self.options
+            reply = (options.retry_policy or DEFAULT_RETRY_POLICY).call(attempt, deadline, options.idempotent, cancel)
+        except (OSError, DeadlineExceeded, RequestCancelled) as e:
+            raise AgentCallError(f"Error communicating with external agent {self.name}: {str(e)}") from e
+        if 'error' in reply:
+            raise AgentCallError(f"Error from external agent {self.name}: {reply['error']}")
+        return reply
+    
+    def _post(self, payload, deadline=None, stream=False, cancel=None):
+        """
+        Send a payload to the external endpoint and parse the reply.
+        
+        The body is JSON, compressed or MessagePack as negotiated with the
+        endpoint by the shared PayloadCodec. Transient failures are retried
+        according to the agent's retry policy. With a deadline, attempts are
+        cut short at the deadline and the time left is sent to the agent in
+        the DEADLINE_HEADER header.
+        
+        Args:
+            payload (dict): The request body
+            deadline (float, optional): Absolute time.monotonic() deadline
+            stream (bool, optional): Whether to return the open response, before
+                its body is read, instead of the parsed reply
+            cancel (threading.Event, optional): Stops retrying once set
+            
+        Returns:
+            dict or requests.Response: The parsed reply, or the response when streaming
+            
+        Raises:
+            AgentCallError: If the endpoint could not be reached or returned an error
+        """
+        import requests
+        from gpi.core.retry import DEADLINE_HEADER, DEFAULT_RETRY_POLICY, DeadlineExceeded, RequestCancelled
+        from gpi.utils.channel import is_channel_endpoint
+        from gpi.utils.encoding import get_payload_codec
+        from gpi.utils.http import get_session_pool
+        
+        if is_channel_endpoint(self.external_endpoint):
+            return self._send_over_channel(payload, deadline, cancel)
+        
+        try:
+            codec = get_payload_codec()
+            if stream:
+                headers = {
+                    'Accept': ', '.join(NDJSON_TYPES + ('text/plain', 'application/json')),
+                    'Accept-Encoding': 'identity'  # Compressed streams arrive in bursts
+                }
+            else:
+                headers = codec.accept_headers()
             
             # Add API key if provided
             if self.api_key:
                 headers['Authorization'] = f'Bearer {self.api_key}'
             
-            payload = {
-                'agent_id': self.agent_id,
-                'context': context,
-                'message': message
-            }
-            
-            response = requests.post(
-                self.external_endpoint,
-                data=json.dumps(payload),
-                headers=headers,
-                timeout=30  # 30 seconds timeout
-            )
-            
-            response.raise_for_status()
+            pool = get_session_pool()
+            timeout = self.options.timeout or pool.timeout
             
-            # Parse the response JSON
-            response_data = response.json()
+            def attempt(left):
+                attempt_timeout = timeout
+                if left is not None:
+                    # Never wait past the deadline, and tell the agent how long it has
+                    headers[DEADLINE_HEADER] = str(max(1, int(left * 1000)))
+                    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+                    attempt_timeout = (min(connect, left), min(read, left))
+                
+                while True:
+                    # Compressed or MessagePack body, if the endpoint has shown it accepts them
+                    data, body_headers = codec.encode(self.external_endpoint, payload)
+                    
+                    # Pooled keep-alive connection, with separate connect and read timeouts
+                    response = pool.post(
+                        self.external_endpoint,
+                        data=data,
+                        headers=dict(headers, **body_headers),
+                        timeout=attempt_timeout,
+                        stream=stream
+                    )
+                    if not codec.rejected(self.external_endpoint, response, body_headers):
+                        break
+                    response.close()
+                
+                if stream:
+                    codec.learn(self.external_endpoint, response)
+                    if not response.ok:
+                        response.close()
+                    response.raise_for_status()
+                    return response
+                
+                response.raise_for_status()
+                
+                # Parse the reply (JSON or MessagePack)
+                return codec.decode(self.external_endpoint, response)
             
-            # Return the response message or a default message
-            return response_data.get('response', f"External agent {self.name} responded but provided no message")
+            options = self.options
+            return (options.retry_policy or DEFAULT_RETRY_POLICY).call(attempt, deadline, options.idempotent, cancel)
             
-        except requests.exceptions.RequestException as e:
-            # In a real implementation, you'd want to log this error
-            return f"Error communicating with external agent {self.name}: {str(e)}"
+        except (requests.exceptions.RequestException, ValueError, DeadlineExceeded, RequestCancelled) as e:
+            raise AgentCallError(f"Error communicating with external agent {self.name}: {str(e)}") from e
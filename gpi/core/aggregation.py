@@ -0,0 +1,147 @@
+"""
+Module for merging responses in scatter-gather mode.
+
+In scatter-gather mode the broker sends a message to every matching agent and
+collects one AgentResult per agent. A merge function turns the successful
+results into a single response; custom merge functions take the same
+argument and return a string.
+"""
+
+from collections import Counter
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+
+
+class AgentResult:
+    """
+    Outcome of calling one agent in scatter-gather mode.
+    """
+
+    __slots__ = ('agent_id', 'name', 'status', 'response', 'confidence', 'elapsed', 'error')
+
+    def __init__(self, agent_id, name, status, response=None, confidence=None, elapsed=None, error=None):
+        """
+        Initialize the result.
+
+        Args:
+            agent_id (str): The agent ID
+            name (str): The agent name
+            status (str): OK, ERROR or TIMEOUT
+            response (str, optional): The agent's response
+            confidence (float, optional): Confidence reported by the agent
+            elapsed (float, optional): Seconds spent on the call
+            error (str, optional): Error message if the call failed
+        """
+        self.agent_id = agent_id
+        self.name = name
+        self.status = status
+        self.response = response
+        self.confidence = confidence
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == OK
+
+    def to_dict(self):
+        """
+        Convert the result to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the result
+        """
+        return {
+            'agent_id': self.agent_id,
+            'name': self.name,
+            'status': self.status,
+            'response': self.response,
+            'confidence': self.confidence,
+            'elapsed': self.elapsed,
+            'error': self.error
+        }
+
+
+def merge_concat(results):
+    """
+    Join all responses, one line per agent.
+
+    Args:
+        results (list): Successful AgentResults, in candidate order
+
+    Returns:
+        str: The combined response
+    """
+    return "\n".join(f"{result.name}: {result.response}" for result in results)
+
+
+def merge_vote(results):
+    """
+    Pick the most common response, ignoring case and surrounding whitespace.
+
+    Ties go to the response that appeared first. Responses that are not
+    strings (numbers, JSON objects) vote by their text form, str(response).
+
+    Args:
+        results (list): Successful AgentResults, in candidate order
+
+    Returns:
+        The winning response as the agent returned it, None if there are no results
+    """
+    if not results:
+        return None
+
+    def ballot(result):
+        return str(result.response).strip().casefold()
+
+    votes = Counter(ballot(result) for result in results)
+    best = max(votes.values())
+    for result in results:
+        if votes[ballot(result)] == best:
+            return result.response
+
+
+def merge_best_confidence(results):
+    """
+    Pick the response with the highest reported confidence.
+
+    Agents that report no confidence count as 0, so without any confidence
+    the first response wins.
+
+    Args:
+        results (list): Successful AgentResults, in candidate order
+
+    Returns:
+        str or None: The winning response, None if there are no results
+    """
+    if not results:
+        return None
+    return max(results, key=lambda result: result.confidence or 0.0).response
+
+
+MERGE_FUNCTIONS = {
+    'concat': merge_concat,
+    'vote': merge_vote,
+    'best_confidence': merge_best_confidence,
+}
+
+
+def get_merge(merge):
+    """
+    Get a merge function by name, or pass a callable through.
+
+    Args:
+        merge: Merge function name (see MERGE_FUNCTIONS) or callable
+
+    Returns:
+        function: The merge function
+    """
+    if callable(merge):
+        return merge
+
+    if merge not in MERGE_FUNCTIONS:
+        raise ValueError(f"Unknown merge function: {merge}. "
+                         f"Choose from: {', '.join(MERGE_FUNCTIONS)}")
+    return MERGE_FUNCTIONS[merge]
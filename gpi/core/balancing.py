@@ -0,0 +1,254 @@
+"""
+Module for broker load-balancing strategies.
+
+A strategy picks one agent from the candidates that can handle a message.
+Strategies that look at load use an InFlightTracker, which the broker keeps
+up to date around every agent call.
+"""
+
+import random
+import threading
+from collections import OrderedDict
+
+
+class InFlightTracker:
+    """
+    Thread-safe count of outstanding requests per agent.
+    """
+
+    def __init__(self):
+        """
+        Initialize the tracker with no outstanding requests.
+        """
+        self._counts = {}  # agent_id -> outstanding requests
+        self._lock = threading.Lock()
+
+    def acquire(self, agent_id):
+        """
+        Record the start of a request to an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            int: Outstanding requests to the agent, including this one
+        """
+        with self._lock:
+            count = self._counts.get(agent_id, 0) + 1
+            self._counts[agent_id] = count
+            return count
+
+    def release(self, agent_id):
+        """
+        Record the end of a request to an agent.
+
+        Args:
+            agent_id (str): The agent ID
+        """
+        with self._lock:
+            count = self._counts.get(agent_id, 0) - 1
+            if count > 0:
+                self._counts[agent_id] = count
+            else:
+                self._counts.pop(agent_id, None)
+
+    def get(self, agent_id):
+        """
+        Get the outstanding requests to an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            int: Number of outstanding requests
+        """
+        return self._counts.get(agent_id, 0)
+
+    def snapshot(self):
+        """
+        Get the outstanding requests to all agents.
+
+        Returns:
+            dict: Agent ID -> outstanding requests (agents with none are omitted)
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+class Strategy:
+    """
+    Base class for load-balancing strategies.
+    """
+
+    name = None
+    uses_latency = False  # Whether the constructor takes a LatencyTracker
+
+    def select(self, agents, in_flight):
+        """
+        Select an agent to handle a request.
+
+        Args:
+            agents (list): Candidate agents (never empty)
+            in_flight (InFlightTracker): Outstanding requests per agent
+
+        Returns:
+            Agent: The selected agent
+        """
+        raise NotImplementedError
+
+
+class FirstStrategy(Strategy):
+    """
+    Always selects the first candidate (the broker's original behavior).
+    """
+
+    name = "first"
+
+    def select(self, agents, in_flight):
+        return agents[0]
+
+
+class RoundRobinStrategy(Strategy):
+    """
+    Cycles through the candidates, keeping a separate position per candidate set.
+
+    Positions are kept for the `max_sets` most recently used candidate sets;
+    a set that was evicted starts again from its first candidate.
+    """
+
+    name = "round_robin"
+
+    def __init__(self, max_sets=1024):
+        self.max_sets = max_sets
+        self._positions = OrderedDict()  # tuple of agent IDs -> next position, least recently used first
+        self._lock = threading.Lock()
+
+    def select(self, agents, in_flight):
+        key = tuple(agent.agent_id for agent in agents)
+        with self._lock:
+            position = self._positions.pop(key, 0)
+            self._positions[key] = (position + 1) % len(agents)
+            if len(self._positions) > self.max_sets:
+                self._positions.popitem(last=False)
+        return agents[position]
+
+
+class WeightedStrategy(Strategy):
+    """
+    Selects candidates at random in proportion to their `weight`.
+    """
+
+    name = "weighted"
+
+    def select(self, agents, in_flight):
+        weights = [max(getattr(agent, 'weight', 1), 0) for agent in agents]
+        if not any(weights):
+            return random.choice(agents)
+        return random.choices(agents, weights)[0]
+
+
+class LeastOutstandingStrategy(Strategy):
+    """
+    Selects the candidate with the fewest outstanding requests, breaking ties at random.
+    """
+
+    name = "least_outstanding"
+
+    def select(self, agents, in_flight):
+        fewest = min(in_flight.get(agent.agent_id) for agent in agents)
+        return random.choice([agent for agent in agents if in_flight.get(agent.agent_id) == fewest])
+
+
+class PowerOfTwoStrategy(Strategy):
+    """
+    Samples two candidates at random and selects the one with fewer outstanding requests.
+    """
+
+    name = "power_of_two"
+
+    def select(self, agents, in_flight):
+        if len(agents) == 1:
+            return agents[0]
+        first, second = random.sample(agents, 2)
+        if in_flight.get(second.agent_id) < in_flight.get(first.agent_id):
+            return second
+        return first
+
+
+class LatencyAwareStrategy(Strategy):
+    """
+    Selects the candidate with the best expected latency.
+
+    Candidates with fewer than `warmup` recent observations are tried first,
+    so new (or long idle) agents get measured. With probability `exploration`
+    a random candidate is chosen so that estimates for the others stay fresh.
+    Expected latency is scaled by the candidate's outstanding requests, so a
+    fast agent does not get swamped.
+    """
+
+    name = "latency"
+    uses_latency = True
+
+    def __init__(self, latency, warmup=3, exploration=0.05):
+        """
+        Initialize the strategy.
+
+        Args:
+            latency (LatencyTracker): Per-agent latency statistics
+            warmup (int, optional): Observations needed before an agent's estimate is trusted
+            exploration (float, optional): Probability of choosing a random candidate
+        """
+        self.latency = latency
+        self.warmup = warmup
+        self.exploration = exploration
+
+    def select(self, agents, in_flight):
+        if len(agents) == 1:
+            return agents[0]
+
+        # Warm up agents without enough recent observations, least measured (or pending) first
+        samples = {agent.agent_id: round(self.latency.samples(agent.agent_id)) for agent in agents}
+        warming = [agent for agent in agents if samples[agent.agent_id] < self.warmup]
+        if warming:
+            return min(warming, key=lambda agent: samples[agent.agent_id] + in_flight.get(agent.agent_id))
+
+        if random.random() < self.exploration:
+            return random.choice(agents)
+
+        def cost(agent):
+            return self.latency.expected_latency(agent.agent_id) * (1 + in_flight.get(agent.agent_id))
+
+        return min(agents, key=cost)
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (FirstStrategy, RoundRobinStrategy, WeightedStrategy,
+                     LeastOutstandingStrategy, PowerOfTwoStrategy, LatencyAwareStrategy)
+}
+
+
+def get_strategy(strategy, latency=None):
+    """
+    Get a strategy instance by name, or pass an instance through.
+
+    Args:
+        strategy: Strategy name (see STRATEGIES) or Strategy instance
+        latency (LatencyTracker, optional): Statistics for strategies that use latency
+
+    Returns:
+        Strategy: The strategy instance
+    """
+    if isinstance(strategy, Strategy):
+        return strategy
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown load-balancing strategy: {strategy}. "
+                         f"Choose from: {', '.join(STRATEGIES)}")
+
+    strategy_class = STRATEGIES[strategy]
+    if strategy_class.uses_latency:
+        if latency is None:
+            raise ValueError(f"Strategy {strategy} requires a LatencyTracker")
+        return strategy_class(latency)
+    return strategy_class()
@@ -0,0 +1,141 @@
+"""
+Module for batching calls to external agents.
+
+Agents that advertise a `batch_size` accept several messages in one request:
+
+    {"agent_id": ..., "batch": [{"id": 0, "context": ..., "message": ...}, ...]}
+
+and answer with one entry per message, matched by id:
+
+    {"responses": [{"id": 0, "response": ...}, {"id": 1, "error": ...}, ...]}
+
+A MicroBatcher collects concurrent calls for up to `window` seconds, or
+until `max_size` calls are waiting, and sends them together. There is no
+background thread: the first caller of a batch collects it, sends it and
+hands every caller its own result.
+"""
+
+import threading
+
+# Seconds to wait for more calls before sending a batch
+DEFAULT_BATCH_WINDOW = 0.005
+
+
+class _Pending:
+    """
+    A call waiting to be sent in a batch.
+    """
+
+    __slots__ = ('item', 'deadline', 'event', 'result', 'error', 'lead')
+
+    def __init__(self, item, deadline):
+        self.item = item
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.lead = False  # Whether this caller collects and sends the next batch
+
+
+class MicroBatcher:
+    """
+    Groups concurrent calls into batches of up to `max_size` items.
+    """
+
+    def __init__(self, send, max_size, window=DEFAULT_BATCH_WINDOW):
+        """
+        Initialize the batcher.
+
+        Args:
+            send (callable): Called with a list of items and the earliest deadline among
+                them (or None); returns one result or exception instance per item
+            max_size (int): Largest number of items per batch
+            window (float, optional): Seconds to wait for a batch to fill
+        """
+        self.send = send
+        self.max_size = max_size
+        self.window = window
+        self._pending = []
+        self._collecting = False
+        self._condition = threading.Condition()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item, deadline=None):
+        """
+        Send an item as part of a batch and wait for its result.
+
+        Args:
+            item: The item to send
+            deadline (float, optional): Absolute time.monotonic() deadline
+
+        Returns:
+            The item's result
+
+        Raises:
+            Exception: The item's error, or the error that failed the whole batch
+        """
+        entry = _Pending(item, deadline)
+        with self._condition:
+            self._pending.append(entry)
+            if not self._collecting:
+                self._collecting = True
+                entry.lead = True
+            elif len(self._pending) >= self.max_size:
+                self._condition.notify_all()
+
+        if not entry.lead:
+            entry.event.wait()  # Until answered, or promoted to collect the next batch
+        if entry.lead:
+            self._lead()
+
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _lead(self):
+        """
+        Collect a batch, send it and hand out the results.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._pending) >= self.max_size, self.window)
+            batch = self._pending[:self.max_size]
+            del self._pending[:self.max_size]
+            if self._pending:
+                # Calls left over for the next batch: let the oldest collect it
+                successor = self._pending[0]
+                successor.lead = True
+                successor.event.set()
+            else:
+                self._collecting = False
+            self.batches += 1
+            self.items += len(batch)
+
+        for entry in batch:
+            entry.lead = False
+        deadlines = [entry.deadline for entry in batch if entry.deadline is not None]
+        try:
+            results = self.send([entry.item for entry in batch], min(deadlines) if deadlines else None)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for entry, result in zip(batch, results):
+            if isinstance(result, Exception):
+                entry.error = result
+            else:
+                entry.result = result
+            entry.event.set()
+
+    def stats(self):
+        """
+        Get batching metrics.
+
+        Returns:
+            dict: Batches sent, items sent and the average batch size
+        """
+        with self._condition:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'average_size': self.items / self.batches if self.batches else 0.0
+            }
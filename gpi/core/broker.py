@@ -5,24 +5,123 @@ The Broker is responsible for handling communication between agents and LLMs,
 and for generating responses based on the current context.
 """
 
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import gpi.context
+from gpi.core.agent import AgentCallError
+from gpi.core.aggregation import OK, ERROR, TIMEOUT, AgentResult, get_merge
+from gpi.core.balancing import InFlightTracker, get_strategy
+from gpi.core.bulkhead import Bulkheads, BulkheadFull
+from gpi.core.circuit import CircuitBreakers
+from gpi.core.coalescing import SingleFlight
+from gpi.core.latency import LatencyTracker
+from gpi.core.matcher import AbilityMatcher
+from gpi.core.response_cache import ResponseCache
+from gpi.core.routing import RouteCache
+
+# Seconds to wait before hedging to an agent with no latency history
+DEFAULT_HEDGE_DELAY = 0.5
 
 class Broker:
     """
     Broker API (BAPI) for handling communication between agents and LLMs.
     """
     
-    def __init__(self, registry):
+    def __init__(self, registry, ability_table=None, strategy="round_robin", route_cache_size=1024,
+                 max_workers=16, coalesce=False, cache_bytes=16 * 1024 * 1024, cache_policy="lru",
+                 request_timeout=None, circuit_breaker=True, bulkhead=True):
         """
         Initialize the broker with a reference to the registry.
         
         Args:
             registry: The registry containing agents and LLMs
+            ability_table (dict, optional): Ability -> keywords used to route by context
+                (defaults to gpi.core.matcher.DEFAULT_ABILITY_KEYWORDS)
+            strategy (optional): Load-balancing strategy name or instance used to pick
+                among equivalent agents (see gpi.core.balancing.STRATEGIES)
+            route_cache_size (int, optional): Maximum number of cached routing decisions
+                (0 disables the cache)
+            max_workers (int, optional): Size of the thread pool used to call agents concurrently
+            coalesce (bool, optional): Whether concurrent identical calls to an agent share
+                a single request (see set_coalescing)
+            cache_bytes (int, optional): Memory bound of the response cache used for agents
+                that declare a cache_ttl (and LLMs with 'cache_ttl' in their config)
+            cache_policy (str, optional): Response cache eviction policy, "lru" or "lfu"
+            request_timeout (float, optional): Default deadline in seconds for process_message;
+                external agents stop retrying and waiting once it passes
+            circuit_breaker (optional): True for default per-agent circuit breakers, a
+                gpi.core.circuit.CircuitBreakers instance, or False to disable them
+            bulkhead (optional): True for default per-agent concurrency limits on external
+                agents, a gpi.core.bulkhead.Bulkheads instance, or False to disable them
         """
         self.registry = registry
         self.context_manager = gpi.context.get_manager()
+        self.ability_matcher = AbilityMatcher(ability_table)
+        self.in_flight = InFlightTracker()
+        self.latency = LatencyTracker()
+        self.strategy = get_strategy(strategy, self.latency)
+        self.route_cache = RouteCache(route_cache_size)
+        registry.subscribe(self.route_cache.invalidate)
+        self.singleflight = SingleFlight() if coalesce else None
+        self.response_cache = ResponseCache(cache_bytes, cache_policy)
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        if isinstance(circuit_breaker, CircuitBreakers):
+            self.circuits = circuit_breaker
+        else:
+            self.circuits = CircuitBreakers() if circuit_breaker else None
+        if isinstance(bulkhead, Bulkheads):
+            self.bulkheads = bulkhead
+        else:
+            self.bulkheads = Bulkheads() if bulkhead else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    def set_strategy(self, strategy):
+        """
+        Change the load-balancing strategy.
+        
+        Args:
+            strategy: Strategy name or instance (see gpi.core.balancing.STRATEGIES)
+            
+        Returns:
+            Strategy: The new strategy instance
+        """
+        self.strategy = get_strategy(strategy, self.latency)
+        return self.strategy
+    
+    def set_coalescing(self, enabled):
+        """
+        Turn request coalescing on or off.
+        
+        While on, concurrent calls with the same (agent, context, message) share
+        one in-flight call to the agent and all receive its result.
+        
+        Args:
+            enabled (bool): Whether to coalesce identical concurrent calls
+        """
+        if not enabled:
+            self.singleflight = None
+        elif self.singleflight is None:
+            self.singleflight = SingleFlight()
+    
+    @property
+    def executor(self):
+        """
+        Thread pool used to call agents concurrently, created on first use.
+        
+        The broker owns the pool, so abandoned requests do not hold up the
+        shutdown of an event loop's default executor.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="gpi-broker")
+            return self._executor
     
-    def process_message(self, message, user_id="default"):
+    def process_message(self, message, user_id="default", timeout=None):
         """
         Process a message using the current context and available agents/LLMs.
         
@@ -32,40 +131,164 @@ class Broker:
         Args:
             message (str): The message to process
             user_id (str, optional): User identifier for context tracking
+            timeout (float, optional): Deadline in seconds for the agent call
+                (defaults to the broker's request_timeout)
             
         Returns:
             str: The generated response
         """
         # Get the current context for this user
-        context = self.context_manager.get_context(user_id)
+        context_info = self.context_manager.get_context_info(user_id)
+        context = context_info.to_string() if context_info else None
         
-        if context:
-            # If we have context, try to find an agent with an appropriate ability for the context
-            context_abilities = self._extract_abilities_from_context(context)
+        if timeout is None:
+            timeout = self.request_timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        candidates = self._find_candidates(context, context_info)
+        if candidates:
+            return self._dispatch(candidates, context or "No specific context available", message, deadline)
+        
+        return self._fallback_response(message, context)
+    
+    async def process_message_async(self, message, user_id="default", fanout=1, hedge=True,
+                                    hedge_delay=None, timeout=None):
+        """
+        Process a message asynchronously, racing capable agents against each other.
+        
+        The message is sent to `fanout` candidate agents at once and the first
+        successful response wins. With hedging, a backup request is sent to the
+        next candidate whenever the newest request has been outstanding for
+        longer than that agent's p95 latency, and a failed request is replaced
+        right away. Once a response wins, backup requests that have not started
+        are cancelled and responses from the others are discarded.
+        
+        Args:
+            message (str): The message to process
+            user_id (str, optional): User identifier for context tracking
+            fanout (int, optional): Number of agents to call at once
+            hedge (bool, optional): Whether to send backup requests to further candidates
+            hedge_delay (float, optional): Seconds before a backup request (defaults to the
+                p95 latency of the newest agent called, or DEFAULT_HEDGE_DELAY if unknown)
+            timeout (float, optional): Overall deadline in seconds
             
-            for ability in context_abilities:
-                agents = self.registry.get_agents_by_ability(ability)
-                if agents:
-                    # Use the first agent with the required ability
-                    response = agents[0].process_message(context, message)
-                    return response
+        Returns:
+            str: The generated response
+        """
+        context_info = self.context_manager.get_context_info(user_id)
+        context = context_info.to_string() if context_info else None
         
-        # If no context or no agent matches context, check for any active agents
-        active_agents = self.registry.get_active_agents()
-        if active_agents:
-            # Use the first active agent
-            agent_context = context or "No specific context available"
-            response = active_agents[0].process_message(agent_context, message)
-            return response
+        candidates = self._find_candidates(context, context_info)
+        if not candidates:
+            return self._fallback_response(message, context)
         
-        # If no agent can handle the message, try to use an LLM
-        active_llms = self.registry.get_active_llms()
-        if active_llms:
-            # Use the first active LLM
-            return self._simulate_llm_response(active_llms[0], message, context or "No specific context")
+        return await self._race(self._rank_agents(candidates), context or "No specific context available",
+                                message, fanout, hedge, hedge_delay, timeout)
+    
+    def stream_message(self, message, user_id="default", timeout=None):
+        """
+        Process a message like process_message, yielding the response as it arrives.
         
-        # If no agent or LLM can handle the message, return a default response
-        return f"No agent or LLM available to process message: {message}"
+        Streamed replies bypass the response cache and request coalescing. If
+        the selected agent's bulkhead is full, the next candidate is tried.
+        
+        Args:
+            message (str): The message to process
+            user_id (str, optional): User identifier for context tracking
+            timeout (float, optional): Deadline in seconds for the agent call
+                (defaults to the broker's request_timeout)
+            
+        Yields:
+            str: Pieces of the response, in order
+            
+        Raises:
+            AgentCallError: If the agent could not produce (all of) a response
+        """
+        context_info = self.context_manager.get_context_info(user_id)
+        context = context_info.to_string() if context_info else None
+        
+        if timeout is None:
+            timeout = self.request_timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        candidates = self._find_candidates(context, context_info)
+        if not candidates:
+            yield self._fallback_response(message, context)
+            return
+        
+        agent_context = context or "No specific context available"
+        remaining = list(candidates)
+        while True:
+            agent = self._select_agent(remaining)
+            remaining.remove(agent)
+            pieces = self._stream_agent(agent, agent_context, message, deadline)
+            try:
+                first = next(pieces)
+            except StopIteration:
+                return
+            except BulkheadFull:
+                if not remaining:
+                    raise
+                continue
+            
+            yield first
+            yield from pieces
+            return
+    
+    async def stream_message_async(self, message, user_id="default", timeout=None):
+        """
+        Asynchronous version of stream_message.
+        
+        The stream is read on the broker's executor and handed to the event
+        loop piece by piece; closing the generator early stops the stream.
+        
+        Args:
+            message (str): The message to process
+            user_id (str, optional): User identifier for context tracking
+            timeout (float, optional): Deadline in seconds for the agent call
+            
+        Yields:
+            str: Pieces of the response, in order
+            
+        Raises:
+            AgentCallError: If the agent could not produce (all of) a response
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stopped = threading.Event()
+        end = object()
+        
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stopped.set()  # The event loop is gone
+        
+        def pump():
+            pieces = self.stream_message(message, user_id, timeout)
+            try:
+                for piece in pieces:
+                    if stopped.is_set():
+                        break
+                    put((piece, None))
+            except Exception as e:
+                put((end, e))
+            else:
+                put((end, None))
+            finally:
+                pieces.close()
+        
+        loop.run_in_executor(self.executor, pump)
+        try:
+            while True:
+                piece, error = await queue.get()
+                if piece is end:
+                    if error is not None:
+                        raise error
+                    return
+                yield piece
+        finally:
+            stopped.set()
     
     def generate_response(self, message, user_id="default"):
         """
@@ -88,47 +311,695 @@ class Broker:
         active_agents = self.registry.get_active_agents()
         
         if active_agents:
-            # For simplicity, use the first active agent
-            # In a real system, we would select the most appropriate agent
             agent_context = context or "No specific context available"
-            response = active_agents[0].process_message(agent_context, message)
+            response = self._dispatch(active_agents, agent_context, message)
             return f"Context-Aware Response: {response}"
         
         # If no agent is available, try to use an LLM
         active_llms = self.registry.get_active_llms()
         if active_llms:
-            return f"Context-Aware Response: {self._simulate_llm_response(active_llms[0], message, context or 'No specific context')}"
+            return f"Context-Aware Response: {self._llm_response(active_llms[0], message, context or 'No specific context')}"
         
         # If no agent or LLM is available, return a default response
         return f"No agent or LLM available to generate a context-aware response for: {message}"
     
-    def _extract_abilities_from_context(self, context):
+    def _find_candidates(self, context, context_info=None):
         """
-        Extract relevant abilities from the given context.
+        Find the agents that could handle a message in the given context.
+        
+        Agents with the most specific match for the first ability found in the
+        context are preferred; otherwise every active agent is a candidate.
+        Decisions are cached per context signature and registry version.
         
         Args:
-            context (str): The context to analyze
+            context (str): The current context, or None
+            context_info (ContextInfo, optional): Structured form of the context
             
         Returns:
-            list: List of abilities that might be relevant for the context
+            list: Candidate agents, empty if no agent is active
+        """
+        # Read the versions first, so a concurrent change can only make the entry unreachable
+        key = (self.ability_matcher.signature(context, context_info),
+               self.registry.version, self.ability_matcher.version)
+        candidates = self.route_cache.get(key)
+        if candidates is None:
+            candidates = self._route(context, context_info)
+            self.route_cache.put(key, candidates)
+        return candidates
+    
+    def _route(self, context, context_info=None):
+        """
+        Compute the candidate agents for a context without the cache.
+        
+        Args:
+            context (str): The current context, or None
+            context_info (ContextInfo, optional): Structured form of the context
+            
+        Returns:
+            list: Candidate agents, empty if no agent is active
+        """
+        if context:
+            for ability in self._extract_abilities_from_context(context, context_info):
+                agents = self.registry.resolve_agents(ability)
+                if agents:
+                    return agents
+        
+        return self.registry.get_active_agents()
+    
+    def _select_agent(self, candidates):
+        """
+        Select one of the candidate agents using the load-balancing strategy.
+        
+        Agents whose circuit is open are skipped, unless every candidate's is.
+        
+        Args:
+            candidates (list): Candidate agents (never empty)
+            
+        Returns:
+            Agent: The selected agent
+        """
+        if self.circuits is not None:
+            candidates = self.circuits.filter(candidates) or candidates
+        return self.strategy.select(candidates, self.in_flight)
+    
+    def process_messages(self, batch, use_llm=False, llm=None):
+        """
+        Process a batch of messages, returning one result per message in order.
+        
+        Each item is a message string or a dict with 'message' and optional
+        'context' and 'user_id', processed like gpi.bapi: without a context,
+        one is extracted from the message. Contexts are extracted once per
+        distinct message and recorded in one update, and calls to external
+        agents run concurrently on the broker's thread pool, where agents that
+        speak the batch protocol send them together. An item that fails at any
+        step gets an error result without affecting the others.
+        
+        Args:
+            batch (list): Message strings or dicts
+            use_llm (bool, optional): Whether to use an LLM for context extraction
+            llm (optional): LLM to use for context extraction
+            
+        Returns:
+            list: One dict per item with 'response', 'agent_id', 'context' and
+                'error' (None unless the item failed)
+        """
+        results = [None] * len(batch)
+        items = []  # (index, user_id, message, context_info)
+        extracted = {}  # message -> ContextInfo
+        
+        for index, item in enumerate(batch):
+            if isinstance(item, str):
+                item = {'message': item}
+            message = item.get('message') if isinstance(item, dict) else None
+            if not message:
+                results[index] = self._batch_error(None, None, "Message is required")
+                continue
+            
+            try:
+                if item.get('context') is not None:
+                    context_info = gpi.context.ContextInfo.manual(item['context'])
+                else:
+                    context_info = extracted.get(message)
+                    if context_info is None:
+                        context_info = extracted[message] = gpi.context.extract_context(message, use_llm, llm)
+            except Exception as e:
+                results[index] = self._batch_error(None, None, str(e))
+                continue
+            items.append((index, item.get('user_id', "default"), message, context_info))
+        
+        self.context_manager.update_contexts([(user_id, context_info) for _, user_id, _, context_info in items])
+        
+        # Internal agents answer inline, external agents are called concurrently
+        futures = []
+        for index, _, message, context_info in items:
+            agent = context = None
+            try:
+                context = context_info.to_string()
+                candidates = self._find_candidates(context, context_info)
+                if not candidates:
+                    results[index] = {'response': self._fallback_response(message, context), 'agent_id': None,
+                                      'context': context, 'error': None}
+                    continue
+                
+                agent = self._select_agent(candidates)
+                if agent.is_external():
+                    futures.append((index, agent, context, self.executor.submit(
+                        self._invoke_candidates, agent, candidates, context, message)))
+                else:
+                    results[index] = self._batch_result(
+                        agent, context, lambda: self._invoke_candidates(agent, candidates, context, message))
+            except Exception as e:
+                results[index] = self._batch_error(agent, context, str(e))
+        
+        for index, agent, context, future in futures:
+            results[index] = self._batch_result(agent, context, future.result)
+        
+        return results
+    
+    def _batch_result(self, agent, context, call):
+        """
+        Build the batch result for one message.
+        
+        Args:
+            agent: The agent the message was sent to
+            context (str): The message's context
+            call (callable): Returns the (agent, reply) that answered
+            
+        Returns:
+            dict: The result, with the error message if the call failed
+        """
+        try:
+            agent, reply = call()
+        except Exception as e:
+            return self._batch_error(agent, context, str(e))
+        return {'response': reply['response'], 'agent_id': agent.agent_id, 'context': context, 'error': None}
+    
+    def _batch_error(self, agent, context, error):
+        """
+        Build the batch result for a message that failed.
+        
+        Args:
+            agent: The agent the message was sent to, if one was selected
+            context (str): The message's context, if known
+            error (str): What went wrong
+            
+        Returns:
+            dict: The result
+        """
+        return {'response': None, 'agent_id': agent.agent_id if agent else None, 'context': context,
+                'error': error}
+    
+    def scatter_gather(self, message, user_id="default", ability=None, merge="concat", deadline=5.0):
+        """
+        Send a message to every matching agent in parallel and merge the responses.
+        
+        Calls go through the broker's bounded thread pool. Agents that have not
+        answered by the deadline are reported as timed out (calls still queued
+        are cancelled), so partial results are returned rather than waiting on
+        the slowest agent.
+        
+        Args:
+            message (str): The message to process
+            user_id (str, optional): User identifier for context tracking
+            ability (str, optional): Ability the agents must have (default: routed by context)
+            merge (optional): Merge function name or callable (see gpi.core.aggregation.MERGE_FUNCTIONS)
+            deadline (float, optional): Seconds to wait for the agents
+            
+        Returns:
+            dict: The merged 'response', per-agent 'results' (status, response,
+                confidence and timing) and whether all agents answered ('complete')
+        """
+        merge = get_merge(merge)
+        context_info = self.context_manager.get_context_info(user_id)
+        context = context_info.to_string() if context_info else None
+        
+        agents = self.registry.resolve_agents(ability) if ability else self._find_candidates(context, context_info)
+        if not agents:
+            return {'response': self._fallback_response(message, context), 'results': [], 'complete': True}
+        
+        agent_context = context or "No specific context available"
+        call_deadline = time.monotonic() + deadline
+        futures = [self.executor.submit(self._gather_one, agent, agent_context, message, call_deadline)
+                   for agent in agents]
+        wait(futures, timeout=deadline)
+        
+        results = []
+        for agent, future in zip(agents, futures):
+            if future.done():
+                results.append(future.result())
+            else:
+                future.cancel()
+                results.append(AgentResult(agent.agent_id, agent.name, TIMEOUT, elapsed=deadline,
+                                           error=f"No response within {deadline} seconds"))
+        
+        return {
+            'response': merge([result for result in results if result.ok]),
+            'results': [result.to_dict() for result in results],
+            'complete': all(result.status != TIMEOUT for result in results)
+        }
+    
+    def _gather_one(self, agent, context, message, deadline=None):
+        """
+        Call one agent for scatter-gather, capturing its outcome.
+        
+        Args:
+            agent: The agent to call
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Returns:
+            AgentResult: The outcome of the call
+        """
+        start = time.perf_counter()
+        try:
+            reply = self._invoke(agent, context, message, deadline)
+        except AgentCallError as e:
+            # A call cut short by the deadline did not answer in time, rather than fail
+            status = TIMEOUT if deadline is not None and time.monotonic() >= deadline else ERROR
+            return AgentResult(agent.agent_id, agent.name, status, elapsed=time.perf_counter() - start, error=str(e))
+        
+        confidence = reply.get('confidence')
+        if not isinstance(confidence, (int, float)):
+            confidence = None
+        return AgentResult(agent.agent_id, agent.name, OK, reply['response'], confidence,
+                           time.perf_counter() - start)
+    
+    def _rank_agents(self, candidates):
+        """
+        Order candidate agents by repeatedly applying the load-balancing strategy.
+        
+        Args:
+            candidates (list): Candidate agents
+            
+        Returns:
+            list: The candidates, in the order they should be tried
+        """
+        remaining = list(candidates)
+        ranked = []
+        while remaining:
+            agent = self._select_agent(remaining)
+            remaining.remove(agent)
+            ranked.append(agent)
+        return ranked
+    
+    def _hedge_delay(self, agent, hedge_delay=None):
+        """
+        Get the time to wait on an agent before sending a backup request.
+        
+        Args:
+            agent: The agent being waited on
+            hedge_delay (float, optional): Fixed delay overriding the agent's statistics
+            
+        Returns:
+            float: Delay in seconds
+        """
+        if hedge_delay is not None:
+            return hedge_delay
+        
+        p95 = self.latency.percentile(agent.agent_id, 0.95)
+        return DEFAULT_HEDGE_DELAY if p95 is None else p95
+    
+    async def _race(self, agents, context, message, fanout=1, hedge=True, hedge_delay=None, timeout=None):
+        """
+        Call agents concurrently and return the first successful response.
+        
+        Agent calls run in the broker's executor, since agents are invoked
+        synchronously. Once a winner is found, the other calls are cancelled:
+        those still queued never start, and those running stop before their
+        next attempt or retry, releasing their bulkhead and in-flight slots.
+        
+        Args:
+            agents (list): Agents in the order they should be tried
+            context (str): The context for processing the message
+            message (str): The message to process
+            fanout (int, optional): Number of agents to call at once
+            hedge (bool, optional): Whether to send backup requests after the hedge delay
+            hedge_delay (float, optional): Fixed hedge delay in seconds
+            timeout (float, optional): Overall deadline in seconds
+            
+        Returns:
+            str: The first successful response, otherwise the last error message
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        deadline = None if timeout is None else loop.time() + timeout
+        call_deadline = None if timeout is None else time.monotonic() + timeout
+        upcoming = list(agents)
+        pending = {}  # future -> agent
+        errors = []
+        newest = None
+        cancel = threading.Event()
+        
+        def launch():
+            nonlocal newest
+            if upcoming:
+                agent = upcoming.pop(0)
+                pending[loop.run_in_executor(executor, self._invoke, agent, context, message,
+                                                call_deadline, cancel)] = agent
+                newest = agent
+        
+        for _ in range(max(fanout, 1)):
+            launch()
+        
+        try:
+            while pending:
+                wait = self._hedge_delay(newest, hedge_delay) if hedge and upcoming else None
+                if deadline is not None:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    wait = remaining if wait is None else min(wait, remaining)
+                
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()  # Hedge
+                    continue
+                
+                outcomes = [(future, future.exception()) for future in done]
+                for future, error in outcomes:
+                    del pending[future]
+                    if error is None:
+                        return future.result()['response']
+                
+                # Every finished request failed, so replace each with the next candidate
+                for future, error in outcomes:
+                    if not isinstance(error, AgentCallError):
+                        raise error
+                    errors.append(str(error))
+                    launch()
+        finally:
+            cancel.set()
+            for future in pending:
+                future.cancel()
+        
+        if pending or not errors:
+            return f"No agent responded within {timeout} seconds to message: {message}"
+        return errors[-1]
+    
+    def _invoke(self, agent, context, message, deadline=None, cancel=None):
+        """
+        Call an agent, serving cacheable responses from the response cache.
+        
+        Args:
+            agent: The agent to call
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            cancel (threading.Event, optional): Set when the reply is no longer needed
+            
+        Returns:
+            dict: The agent's reply, with the response text under 'response'
+            
+        Raises:
+            AgentCallError: If the agent could not be reached or replied with an error
+        """
+        options = agent.options
+        if options.cache_ttl:
+            return self._cached(('agent', agent.agent_id, context, message), options.cache_ttl, options.stale_ttl,
+                                self._coalesced_call, agent, context, message, deadline=deadline, cancel=cancel)
+        return self._coalesced_call(agent, context, message, deadline, cancel)
+    
+    def _cached(self, key, ttl, stale_ttl, func, *args, **kwargs):
+        """
+        Get a value from the response cache, computing and caching it on a miss.
+        
+        A stale value is returned as is while one background refresh runs on the
+        broker's executor. Replies that set 'cacheable' to False are not cached.
+        
+        Args:
+            key (tuple): The cache key
+            ttl (float): Seconds the value stays fresh
+            stale_ttl (float): Further seconds a stale value may be served
+            func (callable): Computes the value
+            *args: Arguments for func
+            **kwargs: Keyword arguments for func on a miss only (the background
+                refresh is not bound by the caller's deadline)
+            
+        Returns:
+            The cached or computed value
+        """
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            value, fresh = cached
+            if not fresh and self.response_cache.begin_refresh(key):
+                self.executor.submit(self._refresh, key, ttl, stale_ttl, func, args)
+            return value
+        
+        value = func(*args, **kwargs)
+        if not (isinstance(value, dict) and value.get('cacheable') is False):
+            self.response_cache.put(key, value, ttl, stale_ttl)
+        return value
+    
+    def _refresh(self, key, ttl, stale_ttl, func, args):
+        """
+        Recompute a stale cache entry in the background, keeping it if the call fails.
+        
+        Args:
+            key (tuple): The cache key
+            ttl (float): Seconds the value stays fresh
+            stale_ttl (float): Further seconds a stale value may be served
+            func (callable): Computes the value
+            args (tuple): Arguments for func
+        """
+        try:
+            value = func(*args)
+            if not (isinstance(value, dict) and value.get('cacheable') is False):
+                self.response_cache.put(key, value, ttl, stale_ttl)
+        except AgentCallError:
+            pass
+        finally:
+            self.response_cache.end_refresh(key)
+    
+    def _coalesced_call(self, agent, context, message, deadline=None, cancel=None):
+        """
+        Call an agent, sharing the call with identical concurrent ones if coalescing is on.
+        
+        A shared call runs under the deadline of the caller that started it,
+        and is not cancelled, since other callers may still be waiting on it.
+        
+        Args:
+            agent: The agent to call
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            cancel (threading.Event, optional): Set when the reply is no longer needed
+            
+        Returns:
+            dict: The agent's reply, with the response text under 'response'
+            
+        Raises:
+            AgentCallError: If the agent could not be reached or replied with an error
+        """
+        singleflight = self.singleflight
+        if singleflight is not None:
+            return singleflight.do((agent.agent_id, context, message), self._call_agent, agent, context, message,
+                                   deadline)
+        return self._call_agent(agent, context, message, deadline, cancel)
+    
+    def _call_agent(self, agent, context, message, deadline=None, cancel=None):
+        """
+        Call an agent, tracking it as an outstanding request and recording its
+        latency and outcome. Calls to an agent whose circuit is open fail at once,
+        and calls to an external agent wait for a slot in its bulkhead.
+        
+        Args:
+            agent: The agent to call
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            cancel (threading.Event, optional): Stops the call before its next attempt once set
+            
+        Returns:
+            dict: The agent's reply, with the response text under 'response'
+            
+        Raises:
+            BulkheadFull: If the agent's concurrency limit stayed reached
+            AgentCallError: If the agent could not be reached or replied with an error
+        """
+        admitted = self._admit(agent, deadline)
+        start = time.perf_counter()
+        failed = True
+        try:
+            if cancel is not None:
+                reply = agent.invoke(context, message, deadline, cancel)
+            elif deadline is None:
+                reply = agent.invoke(context, message)
+            else:
+                reply = agent.invoke(context, message, deadline)
+            failed = False
+        except AgentCallError:
+            self.latency.record(agent.agent_id, time.perf_counter() - start, error=True)
+            raise
+        finally:
+            self._finish(agent, admitted, failed)
+        
+        self.latency.record(agent.agent_id, time.perf_counter() - start)
+        return reply
+    
+    def _stream_agent(self, agent, context, message, deadline=None):
+        """
+        Stream a reply from an agent, with the same tracking as _call_agent.
+        
+        The agent's slots are held until the stream ends or is closed.
+        
+        Args:
+            agent: The agent to call
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Yields:
+            str: Pieces of the response, in order
+            
+        Raises:
+            BulkheadFull: If the agent's concurrency limit stayed reached
+            AgentCallError: If the agent could not be reached or replied with an error
         """
-        # This is a simple implementation that looks for keywords in the context
-        # In a real system, this would involve more sophisticated NLP techniques
+        admitted = self._admit(agent, deadline)
+        start = time.perf_counter()
+        failed = False
+        try:
+            if deadline is None:
+                yield from agent.stream(context, message)
+            else:
+                yield from agent.stream(context, message, deadline)
+        except AgentCallError:
+            failed = True
+            self.latency.record(agent.agent_id, time.perf_counter() - start, error=True)
+            raise
+        else:
+            self.latency.record(agent.agent_id, time.perf_counter() - start)
+        finally:
+            self._finish(agent, admitted, failed)
+    
+    def _admit(self, agent, deadline=None):
+        """
+        Take a slot in the agent's bulkhead and pass its circuit breaker before a call.
         
-        abilities = []
+        Args:
+            agent: The agent about to be called
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Returns:
+            tuple: (bulkheads, circuits) that admitted the call, for _finish
+            
+        Raises:
+            BulkheadFull: If the agent's concurrency limit stayed reached
+            AgentCallError: If the agent's circuit is open
+        """
+        # Only external calls block a thread on someone else's endpoint
+        bulkheads = self.bulkheads if agent.is_external() else None
+        if bulkheads is not None:
+            bulkheads.acquire(agent, deadline)
         
-        if "talk" in context.lower() or "conversation" in context.lower() or "chat" in context.lower():
-            abilities.append("talk")
+        circuits = self.circuits
+        if circuits is not None and not circuits.acquire(agent.agent_id):
+            if bulkheads is not None:
+                bulkheads.release(agent.agent_id)
+            raise AgentCallError(f"Circuit open for agent {agent.name}")
         
-        if "think" in context.lower() or "analyze" in context.lower() or "reason" in context.lower():
-            abilities.append("think")
+        self.in_flight.acquire(agent.agent_id)
+        return bulkheads, circuits
+    
+    def _finish(self, agent, admitted, failed):
+        """
+        Release what _admit took and record the outcome with the circuit breaker.
         
-        if "learn" in context.lower() or "study" in context.lower() or "adapt" in context.lower():
-            abilities.append("learn")
+        Args:
+            agent: The agent that was called
+            admitted (tuple): The value returned by _admit
+            failed (bool): Whether the call failed
+        """
+        bulkheads, circuits = admitted
+        self.in_flight.release(agent.agent_id)
+        if circuits is not None:
+            circuits.record(agent, failed)
+        if bulkheads is not None:
+            bulkheads.release(agent.agent_id)
+    
+    def _dispatch(self, candidates, context, message, deadline=None):
+        """
+        Send a message to one of the candidate agents, returning call errors as text.
         
-        # Add more mappings as needed
+        Args:
+            candidates (list): Candidate agents (never empty)
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Returns:
+            str: The agent's response, or the error message if the call failed
+        """
+        try:
+            _, reply = self._invoke_candidates(self._select_agent(candidates), candidates, context, message,
+                                               deadline)
+            return reply['response']
+        except AgentCallError as e:
+            return str(e)
+    
+    def _invoke_candidates(self, agent, candidates, context, message, deadline=None):
+        """
+        Call an agent, moving on to the next candidate while bulkheads are full.
         
-        return abilities
+        Args:
+            agent: The selected agent
+            candidates (list): Candidate agents, including the selected one
+            context (str): The context for processing the message
+            message (str): The message to process
+            deadline (float, optional): Absolute time.monotonic() deadline
+            
+        Returns:
+            tuple: (agent that answered, its reply)
+            
+        Raises:
+            AgentCallError: If the call failed, or every candidate's bulkhead was full
+        """
+        remaining = [candidate for candidate in candidates if candidate is not agent]
+        while True:
+            try:
+                return agent, self._invoke(agent, context, message, deadline)
+            except BulkheadFull:
+                if not remaining:
+                    raise
+            agent = self._select_agent(remaining)
+            remaining.remove(agent)
+    
+    def _fallback_response(self, message, context):
+        """
+        Respond when no agent can handle a message.
+        
+        Args:
+            message (str): The message to process
+            context (str): The current context, or None
+            
+        Returns:
+            str: A response from the first active LLM, or a default response
+        """
+        # If no agent can handle the message, try to use an LLM
+        active_llms = self.registry.get_active_llms()
+        if active_llms:
+            # Use the first active LLM
+            return self._llm_response(active_llms[0], message, context or "No specific context")
+        
+        # If no agent or LLM can handle the message, return a default response
+        return f"No agent or LLM available to process message: {message}"
+    
+    def _extract_abilities_from_context(self, context, context_info=None):
+        """
+        Extract relevant abilities from the given context.
+        
+        Args:
+            context (str): The context to analyze
+            context_info (ContextInfo, optional): Structured context, used instead of
+                re-parsing the context string when available
+            
+        Returns:
+            list: List of abilities that might be relevant for the context
+        """
+        if context_info is not None:
+            return self.ability_matcher.match_context_info(context_info)
+        
+        return self.ability_matcher.match(context)
+    
+    def _llm_response(self, llm_info, message, context):
+        """
+        Get a response from an LLM, using the response cache if the LLM's config
+        declares a 'cache_ttl' (and optionally a 'stale_ttl').
+        
+        Args:
+            llm_info (dict): Information about the LLM
+            message (str): The message to process
+            context (str): The current context
+            
+        Returns:
+            str: The LLM response
+        """
+        config = llm_info.get("config") or {}
+        if config.get("cache_ttl"):
+            return self._cached(('llm', llm_info["name"], context, message), config["cache_ttl"],
+                                config.get("stale_ttl", 0), self._simulate_llm_response, llm_info, message, context)
+        return self._simulate_llm_response(llm_info, message, context)
     
     def _simulate_llm_response(self, llm_info, message, context):
         """
@@ -0,0 +1,146 @@
+"""
+Module for per-agent concurrency limits (bulkheads).
+
+Each agent gets a compartment that admits a bounded number of concurrent
+calls, so one slow agent can tie up at most its own share of the threads
+serving requests. A call that finds its agent's compartment full waits up
+to `queue_timeout` seconds for a slot and is then rejected with
+BulkheadFull, which lets the broker move on to another candidate agent.
+"""
+
+import threading
+import time
+
+from gpi.core.agent import AgentCallError
+
+
+class BulkheadFull(AgentCallError):
+    """
+    Raised when an agent's concurrency limit stays reached for the whole queue-wait timeout.
+    """
+    pass
+
+
+class _Compartment:
+    """
+    Concurrency slots and counters for a single agent.
+    """
+
+    __slots__ = ('limit', 'in_flight', 'waiting', 'admitted', 'rejected', 'condition')
+
+    def __init__(self, limit, lock):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.condition = threading.Condition(lock)
+
+    def to_dict(self):
+        """
+        Convert the compartment counters to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the compartment
+        """
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected
+        }
+
+
+class Bulkheads:
+    """
+    Thread-safe concurrency limits for all agents.
+    """
+
+    def __init__(self, max_concurrent=10, queue_timeout=0.1):
+        """
+        Initialize the bulkheads.
+
+        Args:
+            max_concurrent (int, optional): Concurrent calls allowed per agent, unless the
+                the agent's options set their own max_concurrency
+            queue_timeout (float, optional): Seconds a call may wait for a free slot
+        """
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._compartments = {}  # agent_id -> _Compartment
+        self._lock = threading.Lock()
+
+    def acquire(self, agent, deadline=None):
+        """
+        Take a concurrency slot for a call to an agent, waiting for one if needed.
+
+        Every acquire must be followed by release().
+
+        Args:
+            agent: The agent to call
+            deadline (float, optional): Absolute time.monotonic() deadline, which
+                shortens the wait if it comes first
+
+        Raises:
+            BulkheadFull: If no slot frees up in time
+        """
+        limit = agent.options.max_concurrency or self.max_concurrent
+        wait = self.queue_timeout
+        if deadline is not None:
+            wait = min(wait, deadline - time.monotonic())
+
+        with self._lock:
+            compartment = self._compartments.get(agent.agent_id)
+            if compartment is None:
+                compartment = self._compartments[agent.agent_id] = _Compartment(limit, self._lock)
+            compartment.limit = limit
+
+            if compartment.in_flight >= limit and wait > 0:
+                compartment.waiting += 1
+                try:
+                    compartment.condition.wait_for(lambda: compartment.in_flight < compartment.limit, wait)
+                finally:
+                    compartment.waiting -= 1
+
+            if compartment.in_flight >= limit:
+                compartment.rejected += 1
+                raise BulkheadFull(f"Agent {agent.name} is at its limit of {limit} concurrent requests")
+            compartment.in_flight += 1
+            compartment.admitted += 1
+
+    def release(self, agent_id):
+        """
+        Give back the slot taken with acquire().
+
+        Args:
+            agent_id (str): The agent ID
+        """
+        with self._lock:
+            compartment = self._compartments[agent_id]
+            compartment.in_flight -= 1
+            compartment.condition.notify()
+
+    def get(self, agent_id):
+        """
+        Get the counters for an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            dict or None: Limit, in-flight, waiting, admitted and rejected calls, None if unknown
+        """
+        with self._lock:
+            compartment = self._compartments.get(agent_id)
+            return compartment.to_dict() if compartment else None
+
+    def snapshot(self):
+        """
+        Get the counters for all agents.
+
+        Returns:
+            dict: Agent ID -> counters dictionary
+        """
+        with self._lock:
+            return {agent_id: compartment.to_dict() for agent_id, compartment in self._compartments.items()}
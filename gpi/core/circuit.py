@@ -0,0 +1,279 @@
+"""
+Module for per-agent circuit breakers.
+
+A circuit starts closed. After `failure_threshold` consecutive failed calls
+it opens, and the broker stops routing to the agent and fails calls to it
+at once instead of waiting for timeouts. Once `recovery_timeout` seconds
+have passed the circuit is half-open: a limited number of trial calls go
+through, and their outcome closes or re-opens it. Meanwhile a background
+thread probes the health of agents with open circuits and closes a circuit
+as soon as its agent is healthy again.
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit state for a single agent. Not thread-safe on its own; see CircuitBreakers.
+    """
+
+    __slots__ = ('state', 'failures', 'opened', 'trials', 'times_opened', 'rejected')
+
+    def __init__(self):
+        """
+        Initialize a closed circuit.
+        """
+        self.state = CLOSED
+        self.failures = 0      # Consecutive failures
+        self.opened = 0.0      # time.monotonic() when the circuit last opened
+        self.trials = 0        # Trial calls in flight while half-open
+        self.times_opened = 0
+        self.rejected = 0
+
+    def to_dict(self):
+        """
+        Convert the circuit state to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the circuit
+        """
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
+
+
+class CircuitBreakers:
+    """
+    Thread-safe circuit breakers for all agents, with background health probes.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_calls=1,
+                 probe_interval=5.0, probe=None):
+        """
+        Initialize the breakers.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open a circuit
+            recovery_timeout (float, optional): Seconds before an open circuit lets trial calls through
+            half_open_calls (int, optional): Trial calls allowed at once while half-open
+            probe_interval (float, optional): Seconds between health probes of agents with
+                open circuits (0 disables probing)
+            probe (callable, optional): Called with an agent, returns True if it is healthy
+                (defaults to Agent.check_health)
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.probe_interval = probe_interval
+        self.probe = probe or (lambda agent: agent.check_health())
+        self._circuits = {}  # agent_id -> CircuitBreaker
+        self._open = {}  # agent_id -> agent, for circuits that are not closed
+        self._condition = threading.Condition()
+        self._prober = None
+
+    def _circuit(self, agent_id):
+        """
+        Get the circuit of an agent, creating it if needed. Must be called with the lock held.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            CircuitBreaker: The agent's circuit
+        """
+        circuit = self._circuits.get(agent_id)
+        if circuit is None:
+            circuit = self._circuits[agent_id] = CircuitBreaker()
+        return circuit
+
+    def _recovering(self, circuit):
+        """
+        Check whether an open circuit has waited out the recovery timeout. Must be called with the lock held.
+
+        Args:
+            circuit (CircuitBreaker): The circuit
+
+        Returns:
+            bool: True if trial calls may be let through
+        """
+        return time.monotonic() - circuit.opened >= self.recovery_timeout
+
+    def available(self, agent_id):
+        """
+        Check whether a call to an agent would be let through, without claiming it.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            bool: True unless the agent's circuit is open (or half-open with no trial slot free)
+        """
+        with self._condition:
+            circuit = self._circuits.get(agent_id)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            if circuit.state == OPEN:
+                return self._recovering(circuit)
+            return circuit.trials < self.half_open_calls
+
+    def filter(self, agents):
+        """
+        Keep the agents whose circuits would let a call through.
+
+        Args:
+            agents (list): Candidate agents
+
+        Returns:
+            list: The available agents, in the same order
+        """
+        return [agent for agent in agents if self.available(agent.agent_id)]
+
+    def acquire(self, agent_id):
+        """
+        Claim permission to call an agent, moving a recovered open circuit to half-open.
+
+        Every successful acquire must be followed by record().
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            bool: True if the call may go ahead, False if it should fail fast
+        """
+        with self._condition:
+            circuit = self._circuit(agent_id)
+            if circuit.state == OPEN and self._recovering(circuit):
+                circuit.state = HALF_OPEN
+                circuit.trials = 0
+            if circuit.state == CLOSED:
+                return True
+            if circuit.state == HALF_OPEN and circuit.trials < self.half_open_calls:
+                circuit.trials += 1
+                return True
+            circuit.rejected += 1
+            return False
+
+    def record(self, agent, error=False):
+        """
+        Record the outcome of a call claimed with acquire().
+
+        Args:
+            agent: The agent that was called
+            error (bool, optional): Whether the call failed
+        """
+        with self._condition:
+            circuit = self._circuit(agent.agent_id)
+            if circuit.state == HALF_OPEN:
+                circuit.trials = max(0, circuit.trials - 1)
+
+            if not error:
+                circuit.failures = 0
+                if circuit.state != CLOSED:
+                    self._close(agent.agent_id, circuit)
+                return
+
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or (circuit.state == CLOSED
+                                              and circuit.failures >= self.failure_threshold):
+                self._trip(agent, circuit)
+
+    def _trip(self, agent, circuit):
+        """
+        Open a circuit and make sure its agent is being probed. Must be called with the lock held.
+
+        Args:
+            agent: The agent
+            circuit (CircuitBreaker): The agent's circuit
+        """
+        circuit.state = OPEN
+        circuit.opened = time.monotonic()
+        circuit.trials = 0
+        circuit.times_opened += 1
+        self._open[agent.agent_id] = agent
+        if self.probe_interval and self._prober is None:
+            self._prober = threading.Thread(target=self._probe_loop, name="gpi-circuit-probe", daemon=True)
+            self._prober.start()
+
+    def _close(self, agent_id, circuit):
+        """
+        Close a circuit. Must be called with the lock held.
+
+        Args:
+            agent_id (str): The agent ID
+            circuit (CircuitBreaker): The agent's circuit
+        """
+        circuit.state = CLOSED
+        circuit.failures = 0
+        circuit.trials = 0
+        self._open.pop(agent_id, None)
+
+    def _probe_loop(self):
+        """
+        Probe agents with open circuits until every circuit is closed.
+        """
+        while True:
+            with self._condition:
+                self._condition.wait(self.probe_interval)
+                agents = list(self._open.values())
+                if not agents:
+                    self._prober = None
+                    return
+
+            for agent in agents:
+                try:
+                    healthy = self.probe(agent)
+                except Exception:
+                    healthy = False
+                if healthy:
+                    with self._condition:
+                        circuit = self._circuits.get(agent.agent_id)
+                        if circuit is not None and circuit.state != CLOSED:
+                            self._close(agent.agent_id, circuit)
+
+    def state(self, agent_id):
+        """
+        Get the state of an agent's circuit.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            str: CLOSED, OPEN or HALF_OPEN
+        """
+        with self._condition:
+            circuit = self._circuits.get(agent_id)
+            return circuit.state if circuit else CLOSED
+
+    def reset(self, agent_id=None):
+        """
+        Close and forget the circuit of one agent or all agents.
+
+        Args:
+            agent_id (str, optional): The agent ID (None resets all agents)
+        """
+        with self._condition:
+            if agent_id is None:
+                self._circuits.clear()
+                self._open.clear()
+            else:
+                self._circuits.pop(agent_id, None)
+                self._open.pop(agent_id, None)
+
+    def snapshot(self):
+        """
+        Get the circuits of all agents.
+
+        Returns:
+            dict: Agent ID -> circuit dictionary
+        """
+        with self._condition:
+            return {agent_id: circuit.to_dict() for agent_id, circuit in self._circuits.items()}
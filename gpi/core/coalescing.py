@@ -0,0 +1,96 @@
+"""
+Module for coalescing identical concurrent calls.
+
+SingleFlight lets concurrent callers with the same key share one execution:
+the first caller runs the function, and the others wait for it and receive
+its result (or exception). Once the call finishes, the next caller with that
+key starts a new execution, so results are never reused after the fact.
+"""
+
+import threading
+
+
+class _Call:
+    """
+    An execution shared by the callers of one key.
+    """
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-safe coalescing of concurrent calls with the same key.
+    """
+
+    def __init__(self):
+        """
+        Initialize with no calls in flight.
+        """
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        self.calls = 0       # Calls made through do()
+        self.executions = 0  # Calls that actually ran the function
+
+    def do(self, key, func, *args):
+        """
+        Run `func(*args)`, or wait for the in-flight call with the same key.
+
+        Args:
+            key: Hashable key identifying equivalent calls
+            func (callable): The function to run
+            *args: Arguments for the function
+
+        Returns:
+            The function's result, shared by all callers of the execution
+
+        Raises:
+            Exception: Whatever the shared execution raised
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """
+        Get coalescing metrics.
+
+        Returns:
+            dict: Calls, executions, coalesced calls, coalescing ratio
+                (coalesced / calls) and calls currently in flight
+        """
+        with self._lock:
+            coalesced = self.calls - self.executions
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': coalesced,
+                'coalescing_ratio': coalesced / self.calls if self.calls else 0.0,
+                'in_flight': len(self._calls)
+            }
@@ -0,0 +1,257 @@
+"""
+Module for columnar registry export.
+
+Registry state is written as a directory of plain NumPy arrays (one .npy file
+per column) plus a JSON manifest, so offline tools can memory-map large
+exports without building a Python object per agent:
+
+    manifest.json        counts, registry version, type and ability vocabularies
+    agent_ids.npy        UTF-8 bytes of all agent IDs, concatenated (uint8)
+    agent_id_offsets.npy start offset of each ID in agent_ids.npy (int64, N+1)
+    names.npy            UTF-8 bytes of all agent names, concatenated (uint8)
+    name_offsets.npy     start offset of each name in names.npy (int64, N+1)
+    agent_types.npy      index into manifest "types" per agent (uint8)
+    active.npy           active flag per agent (bool)
+    ability_indptr.npy   CSR row pointer into ability_indices.npy (int64, N+1)
+    ability_indices.npy  index into manifest "abilities" (int32)
+
+NumPy is only needed for export and import, not for the rest of the SDK.
+"""
+
+import json
+import os
+
+FORMAT_NAME = "gpi-columnar"
+FORMAT_VERSION = 1
+
+
+def _require_numpy():
+    """
+    Import NumPy, with a helpful error if it is not installed.
+
+    Returns:
+        module: The numpy module
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Columnar export requires NumPy. Install it with: pip install numpy")
+    return numpy
+
+
+def _pack_strings(np, strings):
+    """
+    Pack strings into a concatenated byte array and an offsets array.
+
+    Args:
+        np: The numpy module
+        strings (list): Strings to pack
+
+    Returns:
+        tuple: (uint8 data array, int64 offsets array of length len(strings) + 1)
+    """
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def export_columnar(registry, path):
+    """
+    Export the agents of a registry as columnar arrays.
+
+    Args:
+        registry: The registry to export
+        path (str): Directory to write (created if needed)
+
+    Returns:
+        dict: The manifest that was written
+    """
+    np = _require_numpy()
+
+    with registry.locked():
+        agents = list(registry.agents.values())
+        version = registry.version
+
+    types = {}
+    abilities = {}
+    # Agents share interned ability sets, so each set is translated only once
+    translated = {}
+
+    type_codes = np.empty(len(agents), dtype=np.uint8)
+    active = np.empty(len(agents), dtype=np.bool_)
+    indptr = np.zeros(len(agents) + 1, dtype=np.int64)
+    indices = []
+
+    for i, agent in enumerate(agents):
+        type_code = types.get(agent.agent_type)
+        if type_code is None:
+            if len(types) >= 256:
+                raise ValueError("Columnar export supports at most 256 distinct agent types")
+            type_code = types[agent.agent_type] = len(types)
+        type_codes[i] = type_code
+        active[i] = agent.active
+
+        ability_set = agent._abilities
+        codes = translated.get(id(ability_set))
+        if codes is None:
+            codes = [abilities.setdefault(ability, len(abilities)) for ability in ability_set.order]
+            translated[id(ability_set)] = codes
+        indices.extend(codes)
+        indptr[i + 1] = len(indices)
+
+    agent_ids, agent_id_offsets = _pack_strings(np, [agent.agent_id for agent in agents])
+    names, name_offsets = _pack_strings(np, [agent.name for agent in agents])
+
+    os.makedirs(path, exist_ok=True)
+    columns = {
+        'agent_ids': agent_ids,
+        'agent_id_offsets': agent_id_offsets,
+        'names': names,
+        'name_offsets': name_offsets,
+        'agent_types': type_codes,
+        'active': active,
+        'ability_indptr': indptr,
+        'ability_indices': np.array(indices, dtype=np.int32),
+    }
+    for column, array in columns.items():
+        np.save(os.path.join(path, f"{column}.npy"), array)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'count': len(agents),
+        'registry_version': version,
+        'types': list(types),
+        'abilities': list(abilities),
+        'columns': list(columns),
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    return manifest
+
+
+class ColumnarRegistry:
+    """
+    Read-only view of a columnar registry export.
+
+    Columns are NumPy arrays (memory-mapped by default) available as
+    attributes, e.g. `active` or `ability_indptr`.
+    """
+
+    def __init__(self, manifest, columns):
+        """
+        Initialize the view. Use load_columnar instead of calling this directly.
+
+        Args:
+            manifest (dict): The export manifest
+            columns (dict): Column name -> array
+        """
+        self.manifest = manifest
+        self.types = manifest['types']
+        self.abilities = manifest['abilities']
+        self._ability_codes = {ability: i for i, ability in enumerate(self.abilities)}
+        for column, array in columns.items():
+            setattr(self, column, array)
+
+    def __len__(self):
+        return self.manifest['count']
+
+    def agent_id(self, index):
+        """
+        Get the ID of the agent at a row.
+
+        Args:
+            index (int): Row index
+
+        Returns:
+            str: The agent ID
+        """
+        start, end = self.agent_id_offsets[index], self.agent_id_offsets[index + 1]
+        return bytes(self.agent_ids[start:end]).decode("utf-8")
+
+    def name(self, index):
+        """
+        Get the name of the agent at a row.
+
+        Args:
+            index (int): Row index
+
+        Returns:
+            str: The agent name
+        """
+        start, end = self.name_offsets[index], self.name_offsets[index + 1]
+        return bytes(self.names[start:end]).decode("utf-8")
+
+    def agent_type(self, index):
+        """
+        Get the type of the agent at a row.
+
+        Args:
+            index (int): Row index
+
+        Returns:
+            str: The agent type
+        """
+        return self.types[self.agent_types[index]]
+
+    def abilities_of(self, index):
+        """
+        Get the abilities of the agent at a row.
+
+        Args:
+            index (int): Row index
+
+        Returns:
+            list: The agent's abilities in order
+        """
+        start, end = self.ability_indptr[index], self.ability_indptr[index + 1]
+        return [self.abilities[code] for code in self.ability_indices[start:end]]
+
+    def ability_mask(self, ability):
+        """
+        Get a boolean mask of the agents with an ability.
+
+        Args:
+            ability (str): The ability
+
+        Returns:
+            numpy.ndarray: Boolean array with one entry per agent
+        """
+        np = _require_numpy()
+
+        mask = np.zeros(len(self), dtype=np.bool_)
+        code = self._ability_codes.get(ability)
+        if code is None:
+            return mask
+
+        positions = np.flatnonzero(self.ability_indices == code)
+        rows = np.searchsorted(self.ability_indptr, positions, side="right") - 1
+        mask[rows] = True
+        return mask
+
+
+def load_columnar(path, mmap_mode="r"):
+    """
+    Load a columnar registry export.
+
+    Args:
+        path (str): Directory written by export_columnar
+        mmap_mode (str, optional): NumPy memory-map mode, or None to read into memory
+
+    Returns:
+        ColumnarRegistry: Read-only view of the export
+    """
+    np = _require_numpy()
+
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != FORMAT_NAME or manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar export in {path}")
+
+    columns = {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode=mmap_mode)
+               for column in manifest['columns']}
+    return ColumnarRegistry(manifest, columns)
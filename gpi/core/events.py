@@ -0,0 +1,157 @@
+"""
+Module for registry change events.
+
+The Registry publishes a RegistryEvent for every mutation so that anything
+caching agent lists or routing decisions can invalidate precisely.
+"""
+
+import asyncio
+import time
+
+# Event kinds
+AGENT_REGISTERED = "agent_registered"
+AGENT_ACTIVATED = "agent_activated"
+AGENT_DEACTIVATED = "agent_deactivated"
+ABILITY_ADDED = "ability_added"
+ABILITY_REMOVED = "ability_removed"
+LLM_REGISTERED = "llm_registered"
+LLM_ACTIVATED = "llm_activated"
+LLM_DEACTIVATED = "llm_deactivated"
+
+
+class RegistryEvent:
+    """
+    A single, ordered change to the registry.
+
+    Every event carries the registry version produced by the change, so
+    subscribers can detect gaps and compare against cached versions.
+    """
+
+    def __init__(self, version, kind, target, data=None, timestamp=None):
+        """
+        Initialize a registry event.
+
+        Args:
+            version (int): Registry version after the change was applied
+            kind (str): Kind of change (one of the module-level constants)
+            target (str): ID of the agent or name of the LLM that changed
+            data (dict, optional): Additional details about the change
+            timestamp (float, optional): Time of the change (defaults to now)
+        """
+        self.version = version
+        self.kind = kind
+        self.target = target
+        self.data = data or {}
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def __repr__(self):
+        """
+        String representation of the event.
+
+        Returns:
+            str: String representation
+        """
+        return f"RegistryEvent(version={self.version}, kind={self.kind}, target={self.target})"
+
+    def to_dict(self):
+        """
+        Convert the event to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the event
+        """
+        return {
+            'version': self.version,
+            'kind': self.kind,
+            'target': self.target,
+            'data': self.data,
+            'timestamp': self.timestamp
+        }
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Create an event from a dictionary.
+
+        Args:
+            data (dict): Dictionary produced by to_dict
+
+        Returns:
+            RegistryEvent: The reconstructed event
+        """
+        return RegistryEvent(
+            data['version'],
+            data['kind'],
+            data['target'],
+            data.get('data'),
+            data.get('timestamp')
+        )
+
+
+class AsyncSubscription:
+    """
+    Bounded asyncio queue fed with registry events.
+
+    Events are published from whichever thread mutates the registry and are
+    handed to the owning event loop thread-safely. When the queue is full the
+    oldest event is dropped and counted in `dropped`; a consumer that sees a
+    gap in versions should treat it as "invalidate everything".
+    """
+
+    def __init__(self, registry, loop, maxsize=1000):
+        """
+        Initialize the subscription.
+
+        Args:
+            registry: The registry the subscription is attached to
+            loop: The asyncio event loop that consumes the events
+            maxsize (int, optional): Maximum number of queued events
+        """
+        self.registry = registry
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def __call__(self, event):
+        """
+        Deliver an event from any thread.
+
+        Args:
+            event (RegistryEvent): The event to deliver
+        """
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        """
+        Put an event on the queue, dropping the oldest one if full.
+
+        Args:
+            event (RegistryEvent): The event to enqueue
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        """
+        Wait for the next event.
+
+        Returns:
+            RegistryEvent: The next event
+        """
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def close(self):
+        """
+        Stop receiving events.
+        """
+        self.registry.unsubscribe(self)
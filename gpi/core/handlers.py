@@ -0,0 +1,280 @@
+"""
+Module for running custom agent handlers.
+
+An internal agent can be given a handler: a callable taking the context and
+the message and returning the response text (or a reply dict with the text
+under 'response'). Each agent picks where its handler runs:
+
+- INLINE: on the calling thread. Best for quick handlers.
+- THREAD: on a shared thread pool. Best for handlers that wait on I/O or
+  release the GIL.
+- PROCESS: on a shared process pool, outside the GIL. Best for CPU-bound
+  Python such as scoring or retrieval.
+
+Only the handler reference, the context and the message are sent to a worker
+process, and only the reply comes back. Process handlers must therefore be
+picklable by reference, i.e. module-level functions, and should take and
+return plain data.
+"""
+
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+EXECUTION_MODES = (INLINE, THREAD, PROCESS)
+
+# Start method for handler processes; "spawn" keeps workers clear of the
+# locks held by the broker's threads when the pool starts
+DEFAULT_START_METHOD = "spawn"
+
+
+def check_handler(handler, execution):
+    """
+    Check that a handler can run in an execution mode.
+
+    Args:
+        handler (callable): The handler
+        execution (str): One of EXECUTION_MODES
+
+    Raises:
+        ValueError: If the mode is unknown or a process handler cannot be pickled
+    """
+    if execution not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {execution} (expected one of {', '.join(EXECUTION_MODES)})")
+    if not callable(handler):
+        raise ValueError("Handler must be callable")
+    if execution == PROCESS:
+        try:
+            pickle.dumps(handler)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise ValueError(f"Process handlers must be module-level functions: {e}") from e
+
+
+def run_handler(handler, context, message):
+    """
+    Call a handler on a pool worker, timing it.
+
+    The timestamps let the pool tell the time a call spent queued from the
+    time it ran.
+
+    Args:
+        handler (callable): The handler
+        context (str): The context for processing the message
+        message (str): The message to process
+
+    Returns:
+        tuple: (reply, start, end), with time.monotonic() start and end times
+    """
+    start = time.monotonic()
+    reply = handler(context, message)
+    return reply, start, time.monotonic()
+
+
+class HandlerPool:
+    """
+    Thread or process pool running agent handlers, with queue metrics.
+    """
+
+    def __init__(self, mode, max_workers=None, start_method=DEFAULT_START_METHOD):
+        """
+        Initialize the pool. Workers are started on first use.
+
+        Args:
+            mode (str): THREAD or PROCESS
+            max_workers (int, optional): Worker threads or processes (defaults to the
+                CPU count for processes, and to ThreadPoolExecutor's default for threads)
+            start_method (str, optional): multiprocessing start method for process workers
+        """
+        if mode not in (THREAD, PROCESS):
+            raise ValueError(f"Handler pools are {THREAD} or {PROCESS}, not {mode}")
+        self.mode = mode
+        cpus = os.cpu_count() or 1
+        self.max_workers = max_workers or (cpus if mode == PROCESS else min(32, cpus + 4))
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.queue_time = 0.0
+        self.run_time = 0.0
+        self.max_queue_time = 0.0
+
+    def _get_executor(self):
+        """
+        Get the executor, starting it on first use or after it broke.
+
+        Returns:
+            Executor: The thread or process pool
+        """
+        with self._lock:
+            if self._executor is None:
+                if self.mode == PROCESS:
+                    self._executor = ProcessPoolExecutor(self.max_workers,
+                                                         multiprocessing.get_context(self.start_method))
+                else:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="gpi-handler")
+            return self._executor
+
+    def call(self, handler, context, message, timeout=None):
+        """
+        Run a handler on a worker and wait for its reply.
+
+        Args:
+            handler (callable): The handler
+            context (str): The context for processing the message
+            message (str): The message to process
+            timeout (float, optional): Seconds to wait, queueing included
+
+        Returns:
+            The handler's reply
+
+        Raises:
+            TimeoutError: If the reply did not arrive in time (a call that has
+                not started yet is cancelled)
+            Exception: Whatever the handler raised, or BrokenExecutor if its worker died
+        """
+        executor = self._get_executor()
+        submitted = time.monotonic()
+        try:
+            future = executor.submit(run_handler, handler, context, message)
+        except BrokenExecutor:
+            # A worker process died and took the pool with it; start a fresh one
+            self._discard(executor)
+            executor = self._get_executor()
+            future = executor.submit(run_handler, handler, context, message)
+        with self._lock:
+            self.submitted += 1
+
+        try:
+            reply, start, end = future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise TimeoutError(f"Handler did not finish within {timeout} seconds") from None
+        except BaseException as e:
+            if isinstance(e, BrokenExecutor):
+                self._discard(executor)
+            with self._lock:
+                self.failed += 1
+            raise
+
+        with self._lock:
+            self.completed += 1
+            wait = max(0.0, start - submitted)
+            self.queue_time += wait
+            self.max_queue_time = max(self.max_queue_time, wait)
+            self.run_time += end - start
+        return reply
+
+    def _discard(self, executor):
+        """
+        Drop a broken executor so the next call starts a new one.
+
+        Args:
+            executor (Executor): The broken executor
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def stats(self):
+        """
+        Get pool metrics.
+
+        Returns:
+            dict: Mode, workers, calls submitted, completed, failed, timed out and
+                pending, and the average and longest queue wait and the average run time in ms
+        """
+        with self._lock:
+            finished = self.completed
+            return {
+                'mode': self.mode,
+                'workers': self.max_workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'pending': self.submitted - self.completed - self.failed - self.timed_out,
+                'avg_queue_ms': self.queue_time / finished * 1000 if finished else 0.0,
+                'max_queue_ms': self.max_queue_time * 1000,
+                'avg_run_ms': self.run_time / finished * 1000 if finished else 0.0
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers.
+
+        Args:
+            wait (bool, optional): Whether to wait for queued calls to finish
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# Shared pools used by agents with THREAD or PROCESS handlers
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_handler_pool(mode):
+    """
+    Get the shared pool for an execution mode, creating it on first use.
+
+    Args:
+        mode (str): THREAD or PROCESS
+
+    Returns:
+        HandlerPool: The shared pool
+    """
+    with _pools_lock:
+        pool = _pools.get(mode)
+        if pool is None:
+            pool = _pools[mode] = HandlerPool(mode)
+        return pool
+
+
+def configure_handler_pools(thread_workers=None, process_workers=None, start_method=DEFAULT_START_METHOD):
+    """
+    Replace the shared handler pools, shutting down the previous ones.
+
+    Args:
+        thread_workers (int, optional): Threads in the thread pool
+        process_workers (int, optional): Processes in the process pool
+        start_method (str, optional): multiprocessing start method for the process pool
+
+    Returns:
+        dict: The new pools by mode
+    """
+    with _pools_lock:
+        previous = list(_pools.values())
+        _pools[THREAD] = HandlerPool(THREAD, thread_workers)
+        _pools[PROCESS] = HandlerPool(PROCESS, process_workers, start_method)
+        pools = dict(_pools)
+    for pool in previous:
+        pool.shutdown(wait=False)
+    return pools
+
+
+def handler_pool_stats():
+    """
+    Get the metrics of the shared pools that exist.
+
+    Returns:
+        dict: Mode -> pool metrics
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.mode: pool.stats() for pool in pools}
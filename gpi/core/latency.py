@@ -0,0 +1,221 @@
+"""
+Module for per-agent latency and error statistics.
+
+The LatencyTracker keeps an exponentially weighted moving average (EWMA) of
+response time and error rate per agent, plus a small fixed-bucket histogram
+for percentiles. Like the EWMA, the histogram favours recent observations:
+its counts shrink a little with every new observation, so percentiles follow
+a change in latency instead of averaging over the agent's whole history.
+Statistics also decay with age, so an agent that has not been used for a
+while is treated as unknown again and gets re-measured.
+"""
+
+import bisect
+import threading
+import time
+
+# Upper bounds of the histogram buckets, in seconds (the last bucket is open-ended)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class AgentStats:
+    """
+    Latency and error statistics for a single agent.
+    """
+
+    __slots__ = ('latency', 'error_rate', 'samples', 'errors', 'histogram', 'updated')
+
+    def __init__(self, buckets):
+        """
+        Initialize empty statistics.
+
+        Args:
+            buckets (tuple): Histogram bucket upper bounds
+        """
+        self.latency = 0.0     # EWMA of response time in seconds
+        self.error_rate = 0.0  # EWMA of failures (0.0 - 1.0)
+        self.samples = 0.0     # Number of observations, decayed with age
+        self.errors = 0
+        self.histogram = [0.0] * (len(buckets) + 1)  # Decayed observations per bucket
+        self.updated = 0.0
+
+    def to_dict(self):
+        """
+        Convert the statistics to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the statistics
+        """
+        return {
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'samples': self.samples,
+            'errors': self.errors,
+            'histogram': list(self.histogram),
+            'updated': self.updated
+        }
+
+
+class LatencyTracker:
+    """
+    Thread-safe latency and error statistics for all agents.
+    """
+
+    def __init__(self, alpha=0.2, half_life=60.0, error_penalty=1.0, buckets=DEFAULT_BUCKETS,
+                 histogram_alpha=0.02):
+        """
+        Initialize the tracker.
+
+        Args:
+            alpha (float, optional): EWMA weight of the newest observation
+            half_life (float, optional): Seconds after which the sample count and histogram
+                of an idle agent halve
+            error_penalty (float, optional): Seconds added to the expected latency per unit of error rate
+            buckets (tuple, optional): Histogram bucket upper bounds in seconds
+            histogram_alpha (float, optional): Share of the histogram weight given to the newest
+                observation; lower than alpha, since percentiles need more observations than a mean
+        """
+        self.alpha = alpha
+        self.histogram_alpha = histogram_alpha
+        self.half_life = half_life
+        self.error_penalty = error_penalty
+        self.buckets = tuple(buckets)
+        self._stats = {}  # agent_id -> AgentStats
+        self._lock = threading.Lock()
+
+    def _decay(self, stats, now):
+        """
+        Age the sample count and histogram of an agent's statistics.
+
+        Args:
+            stats (AgentStats): The statistics to decay
+            now (float): Current time
+        """
+        if stats.updated and self.half_life:
+            factor = 0.5 ** ((now - stats.updated) / self.half_life)
+            stats.samples *= factor
+            stats.histogram = [count * factor for count in stats.histogram]
+        stats.updated = now
+
+    def record(self, agent_id, latency, error=False):
+        """
+        Record the outcome of a request to an agent.
+
+        Args:
+            agent_id (str): The agent ID
+            latency (float): Response time in seconds
+            error (bool, optional): Whether the request failed
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get(agent_id)
+            if stats is None:
+                stats = self._stats[agent_id] = AgentStats(self.buckets)
+                stats.latency = latency
+                stats.error_rate = 1.0 if error else 0.0
+            else:
+                self._decay(stats, now)
+                stats.latency += self.alpha * (latency - stats.latency)
+                stats.error_rate += self.alpha * ((1.0 if error else 0.0) - stats.error_rate)
+                keep = 1.0 - self.histogram_alpha
+                stats.histogram = [count * keep for count in stats.histogram]
+
+            stats.updated = now
+            stats.samples += 1
+            stats.errors += 1 if error else 0
+            stats.histogram[bisect.bisect_left(self.buckets, latency)] += 1
+
+    def samples(self, agent_id):
+        """
+        Get the decayed number of observations for an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            float: Observations, halved for every half-life since the last one
+        """
+        with self._lock:
+            stats = self._stats.get(agent_id)
+            if stats is None:
+                return 0.0
+            if not self.half_life:
+                return stats.samples
+            return stats.samples * 0.5 ** ((time.time() - stats.updated) / self.half_life)
+
+    def expected_latency(self, agent_id):
+        """
+        Get the expected cost of sending a request to an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            float or None: EWMA latency plus the error penalty, None if the agent is unknown
+        """
+        with self._lock:
+            stats = self._stats.get(agent_id)
+            if stats is None:
+                return None
+            return stats.latency + stats.error_rate * self.error_penalty
+
+    def percentile(self, agent_id, fraction):
+        """
+        Estimate a latency percentile for an agent from its (decayed) histogram.
+
+        Args:
+            agent_id (str): The agent ID
+            fraction (float): Percentile as a fraction, e.g. 0.95
+
+        Returns:
+            float or None: Upper bound of the bucket holding the percentile, None if unknown
+        """
+        with self._lock:
+            stats = self._stats.get(agent_id)
+            if stats is None:
+                return None
+
+            target = fraction * sum(stats.histogram)
+            seen = 0
+            for i, count in enumerate(stats.histogram):
+                seen += count
+                if seen >= target and count:
+                    return self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            return self.buckets[-1]
+
+    def get(self, agent_id):
+        """
+        Get the statistics for an agent.
+
+        Args:
+            agent_id (str): The agent ID
+
+        Returns:
+            dict or None: The statistics, None if the agent is unknown
+        """
+        with self._lock:
+            stats = self._stats.get(agent_id)
+            return stats.to_dict() if stats else None
+
+    def snapshot(self):
+        """
+        Get the statistics for all agents.
+
+        Returns:
+            dict: Agent ID -> statistics dictionary
+        """
+        with self._lock:
+            return {agent_id: stats.to_dict() for agent_id, stats in self._stats.items()}
+
+    def reset(self, agent_id=None):
+        """
+        Forget the statistics for one agent or all agents.
+
+        Args:
+            agent_id (str, optional): The agent ID (None resets all agents)
+        """
+        with self._lock:
+            if agent_id is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(agent_id, None)
@@ -0,0 +1,243 @@
+"""
+Module for table-driven ability matching.
+
+The AbilityMatcher maps keywords and multi-word phrases to abilities. Text is
+tokenized once and every token (and short run of tokens) is looked up in a
+dictionary, so matching cost depends on the length of the context, not on
+the number of mappings in the table.
+"""
+
+import re
+
+from gpi.core.abilities import split_ability
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Suffixes stripped when a token has no exact match ("talking" -> "talk")
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+DEFAULT_ABILITY_KEYWORDS = {
+    'talk': ['talk', 'conversation', 'chat'],
+    'think': ['think', 'analyze', 'reason'],
+    'learn': ['learn', 'study', 'adapt'],
+    'weather': ['weather', 'forecast', 'temperature'],
+    'news': ['news', 'headline'],
+    'finance': ['finance', 'financial', 'stock', 'market'],
+    'travel': ['travel', 'trip', 'flight', 'hotel'],
+}
+
+
+def _tokenize(text):
+    """
+    Split text into lowercase alphanumeric tokens.
+
+    Args:
+        text (str): The text to tokenize
+
+    Returns:
+        list: The tokens
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _variants(token):
+    """
+    Yield a token followed by its naive stems.
+
+    Args:
+        token (str): A lowercase token
+
+    Yields:
+        str: The token, then candidate stems
+    """
+    yield token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            stem = token[:-len(suffix)]
+            yield stem
+            yield stem + "e"
+            if len(stem) > 3 and stem[-1] == stem[-2]:
+                yield stem[:-1]  # "chatting" -> "chatt" -> "chat"
+
+
+class AbilityMatcher:
+    """
+    Matches text and extracted context against a keyword -> ability table.
+    """
+
+    def __init__(self, table=None):
+        """
+        Initialize the matcher.
+
+        Args:
+            table (dict, optional): Ability -> list of keywords or phrases.
+                Defaults to DEFAULT_ABILITY_KEYWORDS.
+        """
+        self._table = {}  # keyword tuple -> list of abilities
+        self._max_words = 1
+        self.version = 0  # Bumped on every table change, so cached matches can be invalidated
+        for ability, keywords in (DEFAULT_ABILITY_KEYWORDS if table is None else table).items():
+            self.add_ability(ability, keywords)
+
+    def __len__(self):
+        return len(self._table)
+
+    def add(self, keyword, ability):
+        """
+        Map a keyword or phrase to an ability.
+
+        Args:
+            keyword (str): Keyword or multi-word phrase, matched case-insensitively
+            ability (str): The ability it indicates
+
+        Returns:
+            bool: True if the mapping was added, False if it already existed
+
+        Raises:
+            ValueError: If the keyword has no words or the ability is malformed
+        """
+        split_ability(ability)
+        key = tuple(_tokenize(keyword))
+        if not key:
+            raise ValueError(f"Keyword has no matchable words: {keyword!r}")
+
+        abilities = self._table.setdefault(key, [])
+        if ability in abilities:
+            return False
+
+        abilities.append(ability)
+        self._max_words = max(self._max_words, len(key))
+        self.version += 1
+        return True
+
+    def add_ability(self, ability, keywords):
+        """
+        Map several keywords or phrases to an ability.
+
+        Args:
+            ability (str): The ability
+            keywords (iterable): Keywords or phrases indicating the ability
+
+        Raises:
+            ValueError: If a keyword has no words or the ability is malformed
+        """
+        for keyword in keywords:
+            self.add(keyword, ability)
+
+    def remove(self, keyword, ability=None):
+        """
+        Remove a keyword mapping.
+
+        Args:
+            keyword (str): The keyword or phrase
+            ability (str, optional): Only remove the mapping to this ability
+
+        Returns:
+            bool: True if a mapping was removed, False otherwise
+        """
+        key = tuple(_tokenize(keyword))
+        abilities = self._table.get(key)
+        if not abilities or (ability is not None and ability not in abilities):
+            return False
+
+        if ability is None or len(abilities) == 1:
+            del self._table[key]
+        else:
+            abilities.remove(ability)
+        self.version += 1
+        return True
+
+    def signature(self, context, context_info=None):
+        """
+        Get a normalized signature of everything the matcher reads from a context.
+
+        Contexts with equal signatures always match the same abilities.
+
+        Args:
+            context (str): The context string, or None
+            context_info (ContextInfo, optional): Structured context
+
+        Returns:
+            tuple: Hashable signature
+        """
+        if context_info is not None:
+            return (
+                tuple(_tokenize(context_info.topic or "")),
+                tuple(_tokenize(context_info.original_query)),
+                tuple(_tokenize(context_info.intent or "")),
+                tuple(sorted(context_info.keywords))
+            )
+        return (tuple(_tokenize(context)),) if context else ()
+
+    def _lookup(self, token):
+        """
+        Look up a single token, falling back to naive stems.
+
+        Args:
+            token (str): A lowercase token
+
+        Returns:
+            list or None: The abilities for the token
+        """
+        for variant in _variants(token):
+            abilities = self._table.get((variant,))
+            if abilities:
+                return abilities
+        return None
+
+    def _match_tokens(self, tokens, found):
+        """
+        Match a token sequence in a single pass.
+
+        Args:
+            tokens (list): Lowercase tokens
+            found (dict): Ordered set collecting matched abilities
+        """
+        for i, token in enumerate(tokens):
+            abilities = self._lookup(token)
+            if abilities:
+                found.update(dict.fromkeys(abilities))
+
+            for length in range(2, min(self._max_words, len(tokens) - i) + 1):
+                abilities = self._table.get(tuple(tokens[i:i + length]))
+                if abilities:
+                    found.update(dict.fromkeys(abilities))
+
+    def match(self, text):
+        """
+        Find the abilities indicated by a piece of text.
+
+        Args:
+            text (str): The text to analyze
+
+        Returns:
+            list: Abilities in order of first appearance
+        """
+        found = {}
+        self._match_tokens(_tokenize(text), found)
+        return list(found)
+
+    def match_context_info(self, context_info):
+        """
+        Find the abilities indicated by extracted context information.
+
+        The topic is considered first, then the original query and intent,
+        then the extracted keywords, so no string has to be re-parsed.
+
+        Args:
+            context_info (ContextInfo): Structured context from gpi.context
+
+        Returns:
+            list: Abilities, most relevant first
+        """
+        found = {}
+        if context_info.topic:
+            self._match_tokens(_tokenize(context_info.topic), found)
+        self._match_tokens(_tokenize(context_info.original_query), found)
+        if context_info.intent:
+            self._match_tokens(_tokenize(context_info.intent), found)
+        for keyword in sorted(context_info.keywords):
+            abilities = self._lookup(keyword)
+            if abilities:
+                found.update(dict.fromkeys(abilities))
+        return list(found)
@@ -0,0 +1,112 @@
+"""
+Module for per-agent call options.
+
+CallOptions groups the settings that shape how calls to an agent are made:
+response caching, timeouts, retries, the bulkhead limit, batching and where
+the handler runs. Agent holds one reference to them instead of a slot per
+setting, and agents left at the defaults all share DEFAULT_CALL_OPTIONS.
+Options are immutable; use replace() to derive changed ones.
+"""
+
+from gpi.core.batching import DEFAULT_BATCH_WINDOW
+from gpi.core.handlers import INLINE
+
+# Options that travel with an agent's registration (see to_dict)
+_REPLICATED = ('cache_ttl', 'stale_ttl', 'timeout', 'idempotent', 'max_concurrency', 'batch_size', 'batch_window')
+
+
+class CallOptions:
+    """
+    Immutable settings for calls to an agent.
+    """
+
+    __slots__ = ('cache_ttl', 'stale_ttl', 'timeout', 'retry_policy', 'idempotent', 'max_concurrency',
+                 'batch_size', 'batch_window', 'execution')
+
+    def __init__(self, cache_ttl=None, stale_ttl=0, timeout=None, retry_policy=None, idempotent=False,
+                 max_concurrency=None, batch_size=None, batch_window=DEFAULT_BATCH_WINDOW, execution=INLINE):
+        """
+        Initialize call options.
+
+        Args:
+            cache_ttl (float, optional): Seconds the broker may reuse a response to the same
+                context and message (None means responses are not cacheable)
+            stale_ttl (float, optional): Further seconds an expired response may be served
+                while it is refreshed in the background
+            timeout (optional): Seconds, or a (connect, read) tuple, for calls to the external
+                endpoint (defaults to the shared session pool's timeouts)
+            retry_policy (RetryPolicy, optional): Retries for calls to the external endpoint
+                (defaults to gpi.core.retry.DEFAULT_RETRY_POLICY)
+            idempotent (bool, optional): Whether the external endpoint may safely handle a
+                message twice, letting read timeouts and lost connections be retried
+            max_concurrency (int, optional): Concurrent calls the broker may make to the external
+                endpoint (defaults to the broker's bulkhead limit)
+            batch_size (int, optional): Largest batch the external endpoint accepts; set it
+                only for agents that speak the batch protocol (see gpi.core.batching)
+            batch_window (float, optional): Seconds to collect concurrent calls into a batch
+            execution (str, optional): Where the handler runs: "inline", "thread" or "process"
+        """
+        values = (cache_ttl, stale_ttl, timeout, retry_policy, idempotent, max_concurrency,
+                  batch_size, batch_window, execution)
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CallOptions are immutable; use replace() to change them")
+
+    def __repr__(self):
+        """
+        String representation of the options.
+
+        Returns:
+            str: The options that differ from the defaults
+        """
+        changed = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__
+                            if getattr(self, name) != getattr(DEFAULT_CALL_OPTIONS, name))
+        return f"CallOptions({changed})"
+
+    def replace(self, **changes):
+        """
+        Get a copy of the options with some settings changed.
+
+        Args:
+            **changes: Settings to change, by name
+
+        Returns:
+            CallOptions: The new options
+        """
+        settings = {name: getattr(self, name) for name in self.__slots__}
+        settings.update(changes)
+        return CallOptions(**settings)
+
+    def to_dict(self):
+        """
+        Convert the options that travel with an agent's registration to a dictionary.
+
+        The retry policy and execution mode are node-local and not included.
+
+        Returns:
+            dict: Dictionary representation of the options
+        """
+        return {name: getattr(self, name) for name in _REPLICATED}
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Create options from a dictionary.
+
+        Args:
+            data (dict): Dictionary produced by to_dict
+
+        Returns:
+            CallOptions: The options, DEFAULT_CALL_OPTIONS if all are defaults
+        """
+        settings = {name: data[name] for name in _REPLICATED if name in data}
+        if isinstance(settings.get('timeout'), list):
+            settings['timeout'] = tuple(settings['timeout'])  # JSON turns tuples into lists
+        options = DEFAULT_CALL_OPTIONS.replace(**settings)
+        return DEFAULT_CALL_OPTIONS if options.to_dict() == DEFAULT_CALL_OPTIONS.to_dict() else options
+
+
+# Shared by every agent created without options
+DEFAULT_CALL_OPTIONS = CallOptions()
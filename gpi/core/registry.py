@@ -2,11 +2,20 @@
 Module for Registry class implementation.
 """
 
+import asyncio
+import threading
+from contextlib import contextmanager
+
+from gpi.core import events
+from gpi.core.abilities import AbilityTrie
+from gpi.core.events import RegistryEvent, AsyncSubscription
+
 class Registry:
     """
     Registry for agents and LLMs/AIs.
     
     Manages the registration and retrieval of agents and LLMs/AIs in the GPI system.
+    Every change bumps `version` and is published as a RegistryEvent to subscribers.
     """
     
     def __init__(self):
@@ -15,22 +24,143 @@ class Registry:
         """
         self.agents = {}  # agent_id -> Agent
         self.llms = {}    # llm_name -> LLM info
+        self.ability_index = AbilityTrie()  # dotted ability -> agent IDs
+        self.version = 0
+        self._subscribers = []
+        self._lock = threading.RLock()
+    
+    @contextmanager
+    def locked(self):
+        """
+        Hold the registry lock for a group of reads and changes.
+        
+        Other threads cannot change the registry or subscribe until the block
+        ends, so the group sees and makes a consistent set of changes. Events
+        are still delivered as each change is made, on the calling thread.
+        
+        Yields:
+            Registry: This registry
+        """
+        with self._lock:
+            yield self
+    
+    def subscribe(self, callback):
+        """
+        Subscribe to registry change events.
+        
+        The callback is invoked synchronously, in version order, with a
+        RegistryEvent for every change. It must be quick and must not raise.
+        
+        Args:
+            callback: Callable taking a single RegistryEvent argument
+            
+        Returns:
+            The callback, which can be passed to unsubscribe
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+    
+    def subscribe_async(self, maxsize=1000, loop=None):
+        """
+        Subscribe to registry change events through a bounded asyncio queue.
+        
+        Args:
+            maxsize (int, optional): Maximum number of queued events
+            loop (optional): Event loop consuming the events (defaults to the running loop)
+            
+        Returns:
+            AsyncSubscription: Subscription whose `get()` returns the next event
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        
+        return self.subscribe(AsyncSubscription(self, loop, maxsize))
+    
+    def unsubscribe(self, callback):
+        """
+        Stop delivering events to a subscriber.
+        
+        Args:
+            callback: A callback previously passed to subscribe
+            
+        Returns:
+            bool: True if the subscriber was removed, False if it was not subscribed
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                return False
+            self._subscribers.remove(callback)
+            return True
+    
+    def _publish(self, kind, target, data=None):
+        """
+        Bump the registry version and deliver an event to all subscribers.
+        
+        Args:
+            kind (str): Kind of change (see gpi.core.events)
+            target (str): ID of the agent or name of the LLM that changed
+            data (dict, optional): Additional details about the change
+            
+        Returns:
+            RegistryEvent: The published event
+        """
+        with self._lock:
+            self.version += 1
+            event = RegistryEvent(self.version, kind, target, data)
+            
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Registry subscriber failed on {event}: {e}")
+            
+            return event
+    
+    def _on_agent_change(self, agent, kind, data):
+        """
+        Publish a change reported by a registered agent.
+        
+        Args:
+            agent: The agent that changed
+            kind (str): Kind of change
+            data (dict): Additional details about the change
+        """
+        with self._lock:
+            if kind == events.ABILITY_ADDED:
+                self.ability_index.add(data['ability'], agent.agent_id)
+            elif kind == events.ABILITY_REMOVED:
+                self.ability_index.remove(data['ability'], agent.agent_id)
+            
+            self._publish(kind, agent.agent_id, data)
     
-    def register_agent(self, agent):
+    def register_agent(self, agent, replace=False):
         """
         Register an agent with the registry.
         
         Args:
             agent: The agent object to register
+            replace (bool, optional): Whether to replace an agent already
+                registered with the same ID instead of failing
             
         Returns:
             bool: True if registration was successful, False otherwise
         """
-        if agent.agent_id in self.agents:
-            return False
-        
-        self.agents[agent.agent_id] = agent
-        return True
+        with self._lock:
+            existing = self.agents.get(agent.agent_id)
+            if existing is not None:
+                if not replace:
+                    return False
+                for ability in existing.abilities:
+                    self.ability_index.remove(ability, existing.agent_id)
+                existing._listener = None
+            
+            self.agents[agent.agent_id] = agent
+            for ability in agent.abilities:
+                self.ability_index.add(ability, agent.agent_id)
+            agent._listener = self._on_agent_change
+            self._publish(events.AGENT_REGISTERED, agent.agent_id, agent.to_dict())
+            return True
     
     def register_llm(self, name, api_key, model_path=None, config=None):
         """
@@ -53,7 +183,9 @@ class Registry:
             "active": True
         }
         
-        self.llms[name] = llm_info
+        with self._lock:
+            self.llms[name] = llm_info
+            self._publish(events.LLM_REGISTERED, name, dict(llm_info))
         return llm_info
     
     def get_agent(self, agent_id):
@@ -124,7 +256,9 @@ class Registry:
         """
         llm = self.get_llm(name)
         if llm:
-            llm["active"] = False
+            if llm["active"]:
+                llm["active"] = False
+                self._publish(events.LLM_DEACTIVATED, name)
             return True
         return False
     
@@ -140,7 +274,9 @@ class Registry:
         """
         llm = self.get_llm(name)
         if llm:
-            llm["active"] = True
+            if not llm["active"]:
+                llm["active"] = True
+                self._publish(events.LLM_ACTIVATED, name)
             return True
         return False
     
@@ -154,8 +290,61 @@ class Registry:
         Returns:
             list: List of agents with the specified ability
         """
-        return [agent for agent in self.agents.values() 
-                if agent.has_ability(ability) and agent.is_active()]
+        return self._active_agents(self.ability_index.exact(ability))
+    
+    def find_agents(self, pattern):
+        """
+        Get all active agents with an ability matching a wildcard pattern.
+        
+        Args:
+            pattern (str): Dotted ability pattern, e.g. "weather.*" or "*.forecast"
+            
+        Returns:
+            list: List of matching agents
+        """
+        return self._active_agents(self.ability_index.match(pattern))
+    
+    def get_agents_by_prefix(self, prefix):
+        """
+        Get all active agents with the given ability or any ability below it.
+        
+        Args:
+            prefix (str): Dotted ability prefix, e.g. "weather"
+            
+        Returns:
+            list: List of matching agents
+        """
+        return self._active_agents(self.ability_index.prefix(prefix))
+    
+    def resolve_agents(self, ability):
+        """
+        Get the active agents with the most specific match for an ability.
+        
+        Agents advertising "weather" serve a request for "weather.forecast"
+        unless an active agent advertises "weather.forecast" itself.
+        
+        Args:
+            ability (str): The requested dotted ability
+            
+        Returns:
+            list: List of agents with the most specific matching ability
+        """
+        agent_ids = self.ability_index.resolve(
+            ability, lambda agent_id: self.agents[agent_id].is_active())
+        return [self.agents[agent_id] for agent_id in agent_ids]
+    
+    def _active_agents(self, agent_ids):
+        """
+        Map agent IDs to active agents.
+        
+        Args:
+            agent_ids (list): Agent IDs from the ability index
+            
+        Returns:
+            list: The active agents among the given IDs
+        """
+        agents = (self.agents[agent_id] for agent_id in agent_ids)
+        return [agent for agent in agents if agent.is_active()]
     
     def get_active_agents(self):
         """
@@ -166,6 +355,20 @@ class Registry:
         """
         return [agent for agent in self.agents.values() if agent.is_active()]
     
+    def export_columnar(self, path):
+        """
+        Export the agents as memory-mappable columnar arrays (requires NumPy).
+        
+        Args:
+            path (str): Directory to write
+            
+        Returns:
+            dict: The manifest of the export (see gpi.core.columnar)
+        """
+        from gpi.core.columnar import export_columnar
+        
+        return export_columnar(self, path)
+    
     def get_active_llms(self):
         """
         Get all active LLMs.
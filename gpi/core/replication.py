@@ -0,0 +1,629 @@
+"""
+Module for multi-node registry replication.
+
+Each node records the registry changes it originates in a change log. Nodes
+periodically pull the entries they have not seen from their peers, using a
+version vector (origin node -> last applied sequence number), and apply them
+to their own registry. With every node pulling from every peer, a change is
+visible everywhere within roughly one sync interval.
+
+Each pull also tells the serving node which changes the puller has applied,
+so entries that every node still pulling has applied are dropped from the
+log, except for a bounded tail of recent ones. A node that falls behind the
+dropped entries (or joins later) catches up from a snapshot of the registry
+instead.
+
+If two nodes register the same agent ID, the earlier registration wins
+everywhere (the lower node ID on a tie): a node holding the later one
+replaces it, and changes made to the losing registration are not applied.
+
+Agents replicate with their registration settings (see Agent.to_dict);
+handlers, execution modes and retry policies are node-local.
+
+The transport is pluggable; TcpTransport ships length-prefixed JSON frames
+over plain TCP and is intended for trusted networks only, since registration
+entries include agent endpoints and API keys.
+"""
+
+import socket
+import socketserver
+import threading
+import time
+
+from gpi.core import events
+from gpi.core.agent import Agent
+from gpi.utils.framing import recv_frame, send_frame
+
+def _parse_address(address):
+    """
+    Normalize a peer address.
+
+    Args:
+        address: A (host, port) tuple or a "host:port" string
+
+    Returns:
+        tuple: (host, port)
+    """
+    if isinstance(address, str):
+        host, _, port = address.rpartition(":")
+        return (host or "127.0.0.1", int(port))
+    host, port = address
+    return (host, int(port))
+
+
+class Transport:
+    """
+    Base class for replication transports.
+
+    A transport serves incoming requests with a handler and sends requests
+    to peers, returning their responses.
+    """
+
+    def __init__(self, peers=None):
+        """
+        Initialize the transport.
+
+        Args:
+            peers (list, optional): Addresses of the peers to replicate with
+        """
+        self.peers = list(peers or [])
+
+    def add_peer(self, peer):
+        """
+        Add a peer to replicate with.
+
+        Args:
+            peer: Address of the peer
+        """
+        if peer not in self.peers:
+            self.peers.append(peer)
+
+    def start(self, handler):
+        """
+        Start serving requests from peers.
+
+        Args:
+            handler: Callable taking a request dict and returning a response dict
+        """
+        raise NotImplementedError
+
+    def request(self, peer, message, timeout=5.0):
+        """
+        Send a request to a peer.
+
+        Args:
+            peer: Address of the peer
+            message (dict): The request
+            timeout (float, optional): Timeout in seconds
+
+        Returns:
+            dict: The peer's response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Stop serving requests.
+        """
+        pass
+
+
+class TcpTransport(Transport):
+    """
+    Replication transport using length-prefixed JSON frames over TCP.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, peers=None):
+        """
+        Initialize the TCP transport.
+
+        Args:
+            host (str, optional): Host address to bind to
+            port (int, optional): Port to listen on (0 picks a free port)
+            peers (list, optional): Peer addresses as (host, port) or "host:port"
+        """
+        super().__init__([_parse_address(peer) for peer in peers or []])
+        self.host = host
+        self.port = port
+        self._server = None
+        self._server_thread = None
+
+    @property
+    def address(self):
+        """
+        The address the transport is listening on.
+
+        Returns:
+            tuple: (host, port)
+        """
+        return (self.host, self.port)
+
+    def add_peer(self, peer):
+        """
+        Add a peer to replicate with.
+
+        Args:
+            peer: Address as (host, port) or "host:port"
+        """
+        super().add_peer(_parse_address(peer))
+
+    def start(self, handler):
+        """
+        Start the TCP server in a background thread.
+
+        Args:
+            handler: Callable taking a request dict and returning a response dict
+        """
+        class _RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    while True:
+                        send_frame(self.request, handler(recv_frame(self.rfile)))
+                except (ConnectionError, OSError):
+                    pass
+
+        class _Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = _Server((self.host, self.port), _RequestHandler)
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever)
+        self._server_thread.daemon = True
+        self._server_thread.start()
+
+    def request(self, peer, message, timeout=5.0):
+        """
+        Send a request to a peer over a new TCP connection.
+
+        Args:
+            peer: Address of the peer
+            message (dict): The request
+            timeout (float, optional): Timeout in seconds
+
+        Returns:
+            dict: The peer's response
+        """
+        with socket.create_connection(_parse_address(peer), timeout=timeout) as sock, \
+                sock.makefile("rb") as reader:
+            send_frame(sock, message)
+            return recv_frame(reader)
+
+    def close(self):
+        """
+        Stop the TCP server.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class RegistryReplicator:
+    """
+    Replicates registry changes between GPI nodes.
+    """
+
+    def __init__(self, registry, node_id, transport, interval=0.5, forget_after=300.0, retain=1000):
+        """
+        Initialize the replicator and start recording local changes.
+
+        Args:
+            registry: The local registry
+            node_id (str): Unique identifier of this node
+            transport (Transport): Transport used to reach the peers
+            interval (float, optional): Seconds between pulls from each peer
+            forget_after (float, optional): Seconds after which a node that stopped
+                pulling no longer holds back compaction of the change log
+            retain (int, optional): Recent entries per origin kept in the change log
+                even once every known node has applied them
+        """
+        self.registry = registry
+        self.node_id = node_id
+        self.transport = transport
+        self.interval = interval
+        self.forget_after = forget_after
+        self.retain = retain
+        self.log = {}      # origin node_id -> list of entries, in sequence order
+        self.base = {}     # origin node_id -> sequence number of the last compacted entry
+        self.vector = {}   # origin node_id -> last sequence number applied
+        self.acks = {}     # node_id of a puller -> (vector it pulled with, time of the pull)
+        self.stamps = {}   # ('agent' or 'llm', target) -> (origin, seq) of its last change
+        self.owners = {}   # agent_id -> (timestamp, origin) of the registration held here
+        self.errors = {}   # peer -> last error message
+        self.last_sync = {}  # peer -> time of the last successful pull
+        self._lock = threading.RLock()
+        self._applying = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+
+        with registry.locked():
+            # Seed the log with what is already registered, then follow changes
+            for agent in registry.agents.values():
+                self._record(events.AGENT_REGISTERED, agent.agent_id, agent.to_dict())
+            for name, llm_info in registry.llms.items():
+                self._record(events.LLM_REGISTERED, name, dict(llm_info))
+            registry.subscribe(self._on_event)
+
+    def _on_event(self, event):
+        """
+        Record a local registry change in the change log.
+
+        Args:
+            event (RegistryEvent): The registry event
+        """
+        if getattr(self._applying, "active", False):
+            return
+
+        self._record(event.kind, event.target, event.data, event.timestamp)
+
+    def _record(self, kind, target, data, timestamp=None):
+        """
+        Append a change originating on this node to the change log.
+
+        Args:
+            kind (str): Kind of change (see gpi.core.events)
+            target (str): ID of the agent or name of the LLM that changed
+            data (dict): Additional details about the change
+            timestamp (float, optional): Time of the change (defaults to now)
+        """
+        with self._lock:
+            seq = self.vector.get(self.node_id, 0) + 1
+            self.vector[self.node_id] = seq
+            entry = {
+                'origin': self.node_id,
+                'seq': seq,
+                'kind': kind,
+                'target': target,
+                'data': data,
+                'timestamp': timestamp if timestamp is not None else time.time()
+            }
+            if kind == events.AGENT_REGISTERED:
+                self.owners[target] = (entry['timestamp'], self.node_id)
+            elif not kind.startswith('llm_'):
+                entry['owner'] = self.owners.get(target)  # The registration the change was made to
+            self.log.setdefault(self.node_id, []).append(entry)
+            self._stamp(entry)
+
+    def _stamp(self, entry):
+        """
+        Remember the latest change to an entry's agent or LLM. Must be called with the lock held.
+
+        Args:
+            entry (dict): Change log entry
+        """
+        group = 'llm' if entry['kind'].startswith('llm_') else 'agent'
+        self.stamps[(group, entry['target'])] = (entry['origin'], entry['seq'])
+
+    def entries_since(self, vector):
+        """
+        Get the change log entries that are missing from a version vector.
+
+        Args:
+            vector (dict): Origin node_id -> last sequence number seen
+
+        Returns:
+            list or None: Missing entries, in sequence order per origin, or None if
+                some of them were compacted away and a snapshot is needed instead
+        """
+        with self._lock:
+            missing = []
+            for origin, entries in self.log.items():
+                seen = vector.get(origin, 0)
+                base = self.base.get(origin, 0)
+                if seen < base:
+                    return None
+                # Entries are contiguous and follow the compacted ones
+                missing.extend(entries[seen - base:])
+            return missing
+
+    def acknowledge(self, node_id, vector):
+        """
+        Record the version vector a node pulled with, i.e. the changes it has applied.
+
+        Args:
+            node_id (str): The node that pulled
+            vector (dict): Origin node_id -> last sequence number it applied
+        """
+        if node_id and node_id != self.node_id:
+            with self._lock:
+                self.acks[node_id] = (dict(vector), time.monotonic())
+
+    def compact(self):
+        """
+        Drop change log entries that every known node has applied.
+
+        Nodes are known while they keep pulling from this node; those that
+        have not pulled for `forget_after` seconds are forgotten. The last
+        `retain` entries per origin are always kept. A node that pulls after
+        entries it lacks were dropped receives a snapshot instead.
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self._lock:
+            now = time.monotonic()
+            for node_id, (_, pulled) in list(self.acks.items()):
+                if now - pulled > self.forget_after:
+                    del self.acks[node_id]
+            acked = [vector for vector, _ in self.acks.values()]
+
+            dropped = 0
+            for origin, entries in self.log.items():
+                base = self.base.get(origin, 0)
+                floor = min((vector.get(origin, 0) for vector in acked), default=base + len(entries))
+                count = max(0, min(floor - base, len(entries) - self.retain))
+                if count:
+                    del entries[:count]
+                    self.base[origin] = base + count
+                    dropped += count
+            return dropped
+
+    def snapshot(self):
+        """
+        Get the current registry state together with the version vector it reflects.
+
+        Returns:
+            dict: 'vector', plus 'agents' and 'llms' lists of {'data', 'stamp'}
+                items, where stamp is the (origin, seq) of the item's last change;
+                agents also carry the (timestamp, origin) 'owner' of their registration
+        """
+        with self.registry.locked(), self._lock:
+            return {
+                'vector': dict(self.vector),
+                'agents': [{'data': agent.to_dict(), 'stamp': self.stamps.get(('agent', agent_id)),
+                            'owner': self.owners.get(agent_id)}
+                           for agent_id, agent in self.registry.agents.items()],
+                'llms': [{'data': dict(llm_info), 'stamp': self.stamps.get(('llm', name))}
+                         for name, llm_info in self.registry.llms.items()]
+            }
+
+    def _handle(self, request):
+        """
+        Handle a request from a peer.
+
+        Args:
+            request (dict): The request
+
+        Returns:
+            dict: The response
+        """
+        if request.get('type') == 'pull':
+            vector = request.get('vector', {})
+            self.acknowledge(request.get('node_id'), vector)
+            self.compact()
+            entries = self.entries_since(vector)
+            if entries is None:
+                return {'node_id': self.node_id, 'snapshot': self.snapshot()}
+            return {'node_id': self.node_id, 'entries': entries}
+        return {'error': f"Unknown request type: {request.get('type')}"}
+
+    def apply(self, entries):
+        """
+        Apply change log entries from other nodes.
+
+        Entries that were already applied are skipped, so pulls from several
+        peers relaying the same origin are harmless.
+
+        Args:
+            entries (list): Change log entries
+
+        Returns:
+            int: Number of entries applied
+        """
+        applied = 0
+        # Take the registry lock first, matching the order used by _on_event
+        with self.registry.locked(), self._lock:
+            for entry in entries:
+                origin, seq = entry['origin'], entry['seq']
+                if seq != self.vector.get(origin, 0) + 1:
+                    continue
+
+                self._applying.active = True
+                try:
+                    self._apply_entry(entry)
+                finally:
+                    self._applying.active = False
+
+                self.vector[origin] = seq
+                self.log.setdefault(origin, []).append(entry)
+                self._stamp(entry)
+                applied += 1
+        return applied
+
+    def apply_snapshot(self, snapshot):
+        """
+        Catch up from a peer's snapshot.
+
+        Agents and LLMs whose last change in the snapshot has not been applied
+        here are registered or brought to the snapshot's state, unless a
+        conflicting registration held here wins over the snapshot's; the
+        others are left alone. Origins the snapshot is ahead on then continue
+        from its version vector, with no log entries kept for the changes skipped.
+
+        Args:
+            snapshot (dict): Snapshot produced by a peer's snapshot()
+
+        Returns:
+            int: Number of changes the snapshot covered
+        """
+        with self.registry.locked(), self._lock:
+            for group, restore, key in (('agent', self._restore_agent, 'agent_id'),
+                                        ('llm', self._restore_llm, 'name')):
+                for item in snapshot.get(group + 's', []):
+                    stamp = item.get('stamp')
+                    if stamp is not None and stamp[1] <= self.vector.get(stamp[0], 0):
+                        continue  # Already applied here
+
+                    self._applying.active = True
+                    try:
+                        restored = restore(item)
+                    finally:
+                        self._applying.active = False
+                    if restored and stamp is not None:
+                        self.stamps[(group, item['data'][key])] = tuple(stamp)
+
+            covered = 0
+            for origin, seq in snapshot.get('vector', {}).items():
+                current = self.vector.get(origin, 0)
+                if seq > current:
+                    covered += seq - current
+                    self.vector[origin] = seq
+                    self.log[origin] = []
+                    self.base[origin] = seq
+            return covered
+
+    def _restore_agent(self, item):
+        """
+        Register an agent from a snapshot, or bring the registered one to its state.
+
+        Args:
+            item (dict): The snapshot item, with the agent's to_dict() as 'data'
+
+        Returns:
+            bool: True if the agent now has the snapshot's state, False if the
+                registration held here wins over the snapshot's
+        """
+        data = item['data']
+        owner = tuple(item['owner']) if item.get('owner') else None
+        agent = self.registry.get_agent(data['agent_id'])
+        if agent is not None and owner != self.owners.get(data['agent_id']):
+            if not self._wins(owner, data['agent_id']):
+                return False
+            agent = None
+        if agent is None:
+            self.registry.register_agent(Agent.from_dict(data), replace=True)
+            self.owners[data['agent_id']] = owner
+            return True
+        agent.abilities = data['abilities']
+        if data.get('active', True):
+            agent.activate()
+        else:
+            agent.deactivate()
+        return True
+
+    def _restore_llm(self, item):
+        """
+        Register an LLM from a snapshot with the snapshot's state.
+
+        Args:
+            item (dict): The snapshot item, with the LLM info as 'data'
+
+        Returns:
+            bool: True
+        """
+        data = item['data']
+        registry = self.registry
+        registry.register_llm(data['name'], data.get('api_key'), data.get('model_path'), data.get('config'))
+        if not data.get('active', True):
+            registry.deactivate_llm(data['name'])
+        return True
+
+    def _wins(self, owner, agent_id):
+        """
+        Decide whether a registration wins over the one held here for the same agent ID.
+
+        The earlier registration wins, and the lower node ID on a tie, so every
+        node settles on the same one. Must be called with the lock held.
+
+        Args:
+            owner (tuple): (timestamp, origin) of the registration
+            agent_id (str): The agent ID
+
+        Returns:
+            bool: True if the registration should replace the one held here
+        """
+        current = self.owners.get(agent_id)
+        if current is None or owner is None:
+            return current is None
+        return owner < current
+
+    def _apply_entry(self, entry):
+        """
+        Apply a single change to the local registry.
+
+        Args:
+            entry (dict): Change log entry
+        """
+        kind, target, data = entry['kind'], entry['target'], entry['data']
+        registry = self.registry
+
+        if kind == events.AGENT_REGISTERED:
+            owner = (entry['timestamp'], entry['origin'])
+            if registry.get_agent(target) is None or self._wins(owner, target):
+                registry.register_agent(Agent.from_dict(dict(data, agent_id=target)), replace=True)
+                self.owners[target] = owner
+        elif 'owner' in entry and tuple(entry['owner'] or ()) != (self.owners.get(target) or ()):
+            return  # Made to a registration that lost, or that is not held here
+        elif kind == events.AGENT_ACTIVATED:
+            registry.activate_agent(target)
+        elif kind == events.AGENT_DEACTIVATED:
+            registry.deactivate_agent(target)
+        elif kind in (events.ABILITY_ADDED, events.ABILITY_REMOVED):
+            agent = registry.get_agent(target)
+            if agent:
+                if kind == events.ABILITY_ADDED:
+                    agent.add_ability(data['ability'])
+                else:
+                    agent.remove_ability(data['ability'])
+        elif kind == events.LLM_REGISTERED:
+            registry.register_llm(target, data.get('api_key'), data.get('model_path'), data.get('config'))
+            if not data.get('active', True):
+                registry.deactivate_llm(target)
+        elif kind == events.LLM_ACTIVATED:
+            registry.activate_llm(target)
+        elif kind == events.LLM_DEACTIVATED:
+            registry.deactivate_llm(target)
+
+    def sync_once(self):
+        """
+        Pull missing changes from every peer once.
+
+        Returns:
+            int: Number of entries applied (or covered by a snapshot)
+        """
+        applied = 0
+        for peer in list(self.transport.peers):
+            with self._lock:
+                vector = dict(self.vector)
+            try:
+                response = self.transport.request(peer, {'type': 'pull', 'node_id': self.node_id, 'vector': vector})
+            except (OSError, ValueError) as e:
+                self.errors[peer] = str(e)
+                continue
+
+            self.errors.pop(peer, None)
+            self.last_sync[peer] = time.time()
+            if 'snapshot' in response:
+                applied += self.apply_snapshot(response['snapshot'])
+            else:
+                applied += self.apply(response.get('entries', []))
+        self.compact()
+        return applied
+
+    def start(self):
+        """
+        Start serving peers and pulling from them in the background.
+        """
+        self.transport.start(self._handle)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """
+        Background loop pulling from peers every interval.
+        """
+        while not self._stop.wait(self.interval):
+            self.sync_once()
+
+    def stop(self):
+        """
+        Stop pulling from peers and close the transport.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.transport.close()
@@ -0,0 +1,263 @@
+"""
+Module for caching agent and LLM responses.
+
+Agents opt in by declaring a `cache_ttl` (and optionally a `stale_ttl`).
+Entries are fresh for `ttl` seconds; for a further `stale_ttl` seconds they
+may still be served while the owner refreshes them in the background
+(stale-while-revalidate). The cache is bounded by the estimated size of its
+entries in bytes and evicts by least-recent (LRU) or least-frequent (LFU) use.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping overhead in bytes, added to the payload size
+ENTRY_OVERHEAD = 64
+
+POLICIES = ("lru", "lfu")
+
+
+def estimate_size(key, value):
+    """
+    Estimate the memory taken by a cache entry.
+
+    Args:
+        key (tuple): The entry key
+        value: The cached value (JSON-serializable)
+
+    Returns:
+        int: Estimated size in bytes
+    """
+    payload = value if isinstance(value, str) else json.dumps(value, default=str)
+    return (len(payload.encode("utf-8")) + sum(len(str(part).encode("utf-8")) for part in key)
+            + ENTRY_OVERHEAD)
+
+
+class _Entry:
+    """
+    A cached value with its expiry times and use count.
+    """
+
+    __slots__ = ('key', 'value', 'size', 'expires', 'stale_until', 'uses')
+
+    def __init__(self, key, value, size, expires, stale_until):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.stale_until = stale_until
+        self.uses = 1
+
+
+class ResponseCache:
+    """
+    Thread-safe, size-bounded response cache with TTLs and stale-while-revalidate.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, policy="lru"):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int, optional): Upper bound on the estimated size of all entries
+            policy (str, optional): Eviction policy, "lru" or "lfu"
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}. Choose from: {', '.join(POLICIES)}")
+
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.bytes = 0
+        self._entries = {}  # key -> _Entry
+        self._recency = OrderedDict()  # LRU: key -> None, least recently used first
+        self._frequencies = {}  # LFU: use count -> OrderedDict of keys, oldest first
+        self._min_uses = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Args:
+            key (tuple): The entry key
+
+        Returns:
+            tuple or None: (value, fresh), or None if there is no usable entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now >= entry.stale_until:
+                self._remove(entry)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            fresh = now < entry.expires
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            self.bytes_saved += entry.size
+            self._touch(entry)
+            return entry.value, fresh
+
+    def put(self, key, value, ttl, stale_ttl=0):
+        """
+        Cache a value, evicting other entries as needed to stay within max_bytes.
+
+        Args:
+            key (tuple): The entry key
+            value: The value (JSON-serializable)
+            ttl (float): Seconds the value is fresh
+            stale_ttl (float, optional): Further seconds it may be served while being refreshed
+
+        Returns:
+            bool: True if the value was cached, False if it is larger than the whole cache
+        """
+        size = estimate_size(key, value)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._remove(previous)
+            if size > self.max_bytes:
+                return False
+
+            while self.bytes + size > self.max_bytes:
+                self._remove(self._victim())
+                self.evictions += 1
+
+            entry = _Entry(key, value, size, now + ttl, now + ttl + stale_ttl)
+            self._entries[key] = entry
+            self.bytes += size
+            if self.policy == "lru":
+                self._recency[key] = None
+            else:
+                self._frequencies.setdefault(1, OrderedDict())[key] = None
+                self._min_uses = 1
+            return True
+
+    def begin_refresh(self, key):
+        """
+        Claim the background refresh of a stale entry.
+
+        Args:
+            key (tuple): The entry key
+
+        Returns:
+            bool: True if the caller should refresh the entry, False if a refresh is already running
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        """
+        Release the refresh claimed with begin_refresh.
+
+        Args:
+            key (tuple): The entry key
+        """
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        """
+        Drop all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._recency.clear()
+            self._frequencies.clear()
+            self._min_uses = 0
+            self.bytes = 0
+
+    def _touch(self, entry):
+        """
+        Record a use of an entry for the eviction policy.
+
+        Args:
+            entry (_Entry): The entry that was used
+        """
+        if self.policy == "lru":
+            self._recency.move_to_end(entry.key)
+            return
+
+        keys = self._frequencies[entry.uses]
+        del keys[entry.key]
+        if not keys:
+            del self._frequencies[entry.uses]
+            if self._min_uses == entry.uses:
+                self._min_uses += 1
+        entry.uses += 1
+        self._frequencies.setdefault(entry.uses, OrderedDict())[entry.key] = None
+
+    def _victim(self):
+        """
+        Choose the entry to evict.
+
+        Returns:
+            _Entry: The least recently (LRU) or least frequently (LFU) used entry
+        """
+        if self.policy == "lru":
+            return self._entries[next(iter(self._recency))]
+        return self._entries[next(iter(self._frequencies[self._min_uses]))]
+
+    def _remove(self, entry):
+        """
+        Remove an entry and its eviction bookkeeping.
+
+        Args:
+            entry (_Entry): The entry to remove
+        """
+        del self._entries[entry.key]
+        self.bytes -= entry.size
+        if self.policy == "lru":
+            del self._recency[entry.key]
+            return
+
+        keys = self._frequencies[entry.uses]
+        del keys[entry.key]
+        if not keys:
+            del self._frequencies[entry.uses]
+            if self._min_uses == entry.uses:
+                self._min_uses = min(self._frequencies, default=0)
+
+    def stats(self):
+        """
+        Get cache metrics.
+
+        Returns:
+            dict: Entries, bytes, hits (fresh and stale), misses, hit ratio,
+                evictions and bytes saved
+        """
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'policy': self.policy,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes_saved': self.bytes_saved
+            }
@@ -0,0 +1,263 @@
+"""
+Module for retrying external agent calls.
+
+A RetryPolicy retries transient failures (failed connection attempts and
+selected HTTP statuses, plus read timeouts and lost connections for agents
+marked idempotent) with exponential backoff and full jitter. Retries
+are limited by a RetryBudget, so that a failing agent does not get
+flooded with retries, and by the request deadline: no attempt is started,
+and no backoff sleep runs, past the deadline. A call can also be given a
+cancel event, which stops it at the next attempt and cuts its backoff short.
+
+Deadlines are absolute time.monotonic() values. External agents receive the
+remaining budget in the DEADLINE_HEADER header, in milliseconds, so they can
+stop early.
+"""
+
+import random
+import threading
+import time
+
+import requests
+import urllib3
+
+# Header carrying the remaining time budget of a request, in milliseconds
+DEADLINE_HEADER = "X-GPI-Deadline-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request's deadline passes before it could complete.
+    """
+    pass
+
+
+class RequestCancelled(Exception):
+    """
+    Raised when a request is cancelled before or between its attempts.
+    """
+    pass
+
+
+def remaining(deadline):
+    """
+    Get the time left until a deadline.
+
+    Args:
+        deadline (float): Absolute time.monotonic() deadline, or None
+
+    Returns:
+        float or None: Seconds left (may be negative), None if there is no deadline
+    """
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class RetryBudget:
+    """
+    Thread-safe token bucket limiting retries to a fraction of requests.
+
+    Every request deposits `ratio` tokens and every retry spends one, so in
+    steady state retries stay below `ratio` times the request rate. The
+    bucket starts full, which allows a few retries when traffic is low.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        """
+        Initialize the budget.
+
+        Args:
+            ratio (float, optional): Retries allowed per request
+            max_tokens (float, optional): Maximum number of saved-up retries
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(max_tokens)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        """
+        Record a request.
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        Try to spend a token on a retry.
+
+        Returns:
+            bool: True if the retry may go ahead
+        """
+        with self._lock:
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def stats(self):
+        """
+        Get budget metrics.
+
+        Returns:
+            dict: Requests, retries, retries refused and tokens left
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'exhausted': self.exhausted,
+                'tokens': self._tokens
+            }
+
+
+class RequestNotSent(Exception):
+    """
+    Base for failures that happened before a request reached the agent, so
+    retrying cannot make the agent handle it twice.
+    """
+
+
+def _failed_to_connect(error):
+    """
+    Check whether a requests ConnectionError happened while connecting.
+
+    Args:
+        error (requests.exceptions.ConnectionError): The failure
+
+    Returns:
+        bool: True if no connection was made, so the request was never sent
+    """
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)  # urllib3 wraps the cause in MaxRetryError
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with exponential backoff, full jitter, a budget and a deadline.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.1, max_delay=2.0, multiplier=2.0,
+                 retry_statuses=(502, 503, 504), budget=None):
+        """
+        Initialize the policy.
+
+        Args:
+            max_attempts (int, optional): Maximum attempts per request, including the first
+            base_delay (float, optional): Backoff cap in seconds before the first retry
+            max_delay (float, optional): Largest backoff in seconds
+            multiplier (float, optional): Growth of the backoff cap per retry
+            retry_statuses (tuple, optional): HTTP statuses worth retrying
+            budget (RetryBudget, optional): Budget shared by the requests using this policy
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def is_retryable(self, error, idempotent=False):
+        """
+        Decide whether a failed attempt is worth retrying.
+
+        Failures before the request was sent (connection refused, connect
+        timeouts) and retry_statuses are always retried. Read timeouts and
+        connections lost mid-request are retried only for idempotent calls,
+        since the agent may already have handled the message.
+
+        Args:
+            error (Exception): The failure
+            idempotent (bool, optional): Whether handling the request twice is harmless
+
+        Returns:
+            bool: True if the attempt may be repeated
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code in self.retry_statuses
+        if isinstance(error, (requests.exceptions.ConnectTimeout, RequestNotSent)):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and _failed_to_connect(error):
+            return True
+        return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                                 ConnectionError, TimeoutError))
+
+    def backoff(self, retry, error=None):
+        """
+        Get the delay before a retry.
+
+        A numeric Retry-After header on an HTTP error is honored (up to
+        max_delay); otherwise the delay is drawn uniformly between zero and
+        the exponential cap ("full jitter").
+
+        Args:
+            retry (int): Number of the retry, starting at 1
+            error (Exception, optional): The failure being retried
+
+        Returns:
+            float: Delay in seconds
+        """
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                return min(self.max_delay, float(response.headers.get('Retry-After')))
+            except (TypeError, ValueError):
+                pass
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (retry - 1))
+        return random.uniform(0, cap)
+
+    def call(self, attempt, deadline=None, idempotent=False, cancel=None):
+        """
+        Run an attempt function until it succeeds or retrying stops.
+
+        Args:
+            attempt (callable): Called with the seconds left before the deadline
+                (None without a deadline); raises on failure
+            deadline (float, optional): Absolute time.monotonic() deadline
+            idempotent (bool, optional): Whether read timeouts and lost connections
+                may be retried too (see is_retryable)
+            cancel (threading.Event, optional): Once set, no further attempt is
+                started and a running backoff ends at once
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            DeadlineExceeded: If the deadline passed before an attempt could start
+            RequestCancelled: If the cancel event was set before an attempt could start
+            Exception: The last failure, once it is not retryable, the attempts or
+                the budget are used up, or the backoff would pass the deadline
+        """
+        self.budget.deposit()
+        number = 1
+        while True:
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("Request deadline exceeded")
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled("Request cancelled")
+
+            try:
+                return attempt(left)
+            except Exception as e:
+                if not self.is_retryable(e, idempotent) or number >= self.max_attempts:
+                    raise
+                delay = self.backoff(number, e)
+                left = remaining(deadline)
+                if (left is not None and delay >= left) or not self.budget.withdraw():
+                    raise
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+            number += 1
+
+
+# Policy used by agents that do not set their own; its budget is shared by those agents
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,107 @@
+"""
+Module for the broker's routing decision cache.
+
+Most messages in a session map to the same route, so the broker caches the
+candidate agents for a (context signature, registry version, keyword table
+version) key. Any change to the registry or the keyword table produces new
+keys, and the broker also clears the cache on registry events so stale
+entries do not linger.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class RouteCache:
+    """
+    Bounded, thread-safe LRU cache of routing decisions.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of cached routes (0 disables caching)
+        """
+        self.maxsize = maxsize
+        self._routes = OrderedDict()  # key -> tuple of candidate agents
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._routes)
+
+    def get(self, key):
+        """
+        Look up a cached route.
+
+        Args:
+            key (tuple): The route key
+
+        Returns:
+            list or None: The cached candidate agents, None on a miss
+        """
+        with self._lock:
+            candidates = self._routes.get(key)
+            if candidates is None:
+                self.misses += 1
+                return None
+
+            self._routes.move_to_end(key)
+            self.hits += 1
+            return list(candidates)
+
+    def put(self, key, candidates):
+        """
+        Cache a route, evicting the least recently used one if full.
+
+        Args:
+            key (tuple): The route key
+            candidates (list): Candidate agents for the route
+        """
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._routes[key] = tuple(candidates)
+            self._routes.move_to_end(key)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, event=None):
+        """
+        Drop all cached routes.
+
+        Can be subscribed to a registry directly.
+
+        Args:
+            event (RegistryEvent, optional): The change that triggered invalidation
+        """
+        with self._lock:
+            if self._routes:
+                self._routes.clear()
+                self.invalidations += 1
+
+    def stats(self):
+        """
+        Get cache metrics.
+
+        Returns:
+            dict: Size, hits, misses, hit ratio, evictions and invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._routes),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
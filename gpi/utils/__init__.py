@@ -2,8 +2,19 @@
 Utility components of the GPI SDK.
 """
 
-from gpi.utils.http import HttpClient
+from gpi.utils.http import HttpClient, SessionPool, get_session_pool, configure_session_pool
+from gpi.utils.channel import AgentChannel, ChannelServer, get_channel
+from gpi.utils.encoding import PayloadCodec, get_payload_codec, configure_payload_codec
 
 __all__ = [
-    'HttpClient'
+    'HttpClient',
+    'SessionPool',
+    'get_session_pool',
+    'configure_session_pool',
+    'AgentChannel',
+    'ChannelServer',
+    'get_channel',
+    'PayloadCodec',
+    'get_payload_codec',
+    'configure_payload_codec'
 ]
@@ -0,0 +1,375 @@
+"""
+Module for multiplexed channels to external agents.
+
+An agent whose endpoint is a `gpi+tcp://host:port` address is called over
+one long-lived TCP connection instead of an HTTP request per message. Both
+sides exchange length-prefixed JSON frames (a 4-byte big-endian length,
+then the UTF-8 body). Every request carries an `id` and its reply echoes
+it, so many calls share the connection at once and replies may come back
+in any order:
+
+    -> {"type": "hello", "window": 64}                      (agent, on connect)
+    <- {"type": "request", "id": 1, "agent_id": ..., "context": ..., "message": ...}
+    -> {"type": "response", "id": 1, "response": ...}       (or "error": ...)
+
+Flow control: the client never has more than `window` requests outstanding
+on a channel, the smaller of its own limit and the one the agent announced
+in its hello. A lost connection fails the calls in flight with
+ConnectionError and is re-established by the next call.
+"""
+
+import os
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import urlsplit
+
+from gpi.core.retry import RequestNotSent
+from gpi.utils.framing import recv_frame, send_frame
+from gpi.utils.http import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+CHANNEL_SCHEME = "gpi+tcp"
+DEFAULT_WINDOW = 64  # Requests outstanding per channel
+
+
+class ChannelUnavailable(RequestNotSent, ConnectionError):
+    """
+    Raised when a channel cannot be connected, before the request is sent.
+    """
+
+
+class ChannelBusy(RequestNotSent, TimeoutError):
+    """
+    Raised when no request slot in the window frees up in time, before the request is sent.
+    """
+
+
+def is_channel_endpoint(endpoint):
+    """
+    Check whether an agent endpoint is a channel address.
+
+    Args:
+        endpoint (str): The endpoint
+
+    Returns:
+        bool: True for gpi+tcp:// endpoints
+    """
+    return endpoint.startswith(CHANNEL_SCHEME + "://")
+
+
+class AgentChannel:
+    """
+    Thread-safe multiplexed connection to one channel endpoint.
+    """
+
+    def __init__(self, endpoint, window=DEFAULT_WINDOW, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+        """
+        Initialize the channel. The connection is opened by the first call.
+
+        Args:
+            endpoint (str): Address as gpi+tcp://host:port
+            window (int, optional): Maximum requests outstanding at once
+            connect_timeout (float, optional): Seconds to establish the connection
+        """
+        parts = urlsplit(endpoint)
+        if parts.scheme != CHANNEL_SCHEME or not parts.hostname or not parts.port:
+            raise ValueError(f"Invalid channel endpoint: {endpoint}")
+        self.endpoint = endpoint
+        self.address = (parts.hostname, parts.port)
+        self.window = window
+        self.connect_timeout = connect_timeout
+        self._sock = None
+        self._pending = {}  # request id -> Future
+        self._next_id = 0
+        self._outstanding = 0
+        self._slots = threading.Condition()
+        self._lock = threading.Lock()  # Guards the connection and pending calls
+        self._send_lock = threading.Lock()
+        self.connects = 0
+        self.requests = 0
+
+    def connect(self, timeout=None):
+        """
+        Open the connection if it is not open.
+
+        Args:
+            timeout (float, optional): Seconds to establish it (defaults to connect_timeout)
+
+        Raises:
+            ChannelUnavailable: If the connection cannot be established
+        """
+        with self._lock:
+            if self._sock is not None:
+                return
+            try:
+                sock = socket.create_connection(self.address, timeout=timeout or self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                reader = sock.makefile("rb")
+                hello = recv_frame(reader)
+            except (OSError, ValueError) as e:
+                raise ChannelUnavailable(f"Cannot connect to {self.endpoint}: {e}") from e
+            sock.settimeout(None)
+
+            # Shrink the window to what the agent accepts
+            announced = hello.get("window") if hello.get("type") == "hello" else None
+            if isinstance(announced, int) and 0 < announced < self.window:
+                with self._slots:
+                    self.window = announced
+
+            self._sock = sock
+            self.connects += 1
+            threading.Thread(target=self._read, args=(sock, reader), name="gpi-channel", daemon=True).start()
+
+    def call(self, request, timeout=DEFAULT_READ_TIMEOUT, connect_timeout=None):
+        """
+        Send a request and wait for its reply.
+
+        Args:
+            request (dict): The request body (its 'id' and 'type' are set here)
+            timeout (float, optional): Seconds to wait for a free window slot and for the reply
+            connect_timeout (float, optional): Seconds to (re)establish the connection
+
+        Returns:
+            dict: The reply
+
+        Raises:
+            ChannelUnavailable: If the connection could not be established
+            ChannelBusy: If no request slot freed up in time
+            ConnectionError: If the connection was lost after the request was sent
+            TimeoutError: If no reply arrived in time
+        """
+        with self._slots:
+            if not self._slots.wait_for(lambda: self._outstanding < self.window, timeout):
+                raise ChannelBusy(f"No free request slot on {self.endpoint} within {timeout} seconds")
+            self._outstanding += 1
+        try:
+            self.connect(connect_timeout)
+            future = Future()
+            with self._lock:
+                sock = self._sock
+                if sock is None:
+                    raise ChannelUnavailable(f"Channel to {self.endpoint} closed")
+                self._next_id += 1
+                request_id = self._next_id
+                self._pending[request_id] = future
+                self.requests += 1
+
+            frame = dict(request, type="request", id=request_id)
+            try:
+                with self._send_lock:
+                    send_frame(sock, frame)
+            except OSError as e:
+                self._disconnect(sock, e)
+                raise ConnectionError(f"Lost channel to {self.endpoint}: {e}") from e
+
+            try:
+                return future.result(timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"No reply from {self.endpoint} within {timeout} seconds") from None
+            finally:
+                with self._lock:
+                    self._pending.pop(request_id, None)
+        finally:
+            with self._slots:
+                self._outstanding -= 1
+                self._slots.notify()
+
+    def _read(self, sock, reader):
+        """
+        Reader thread: hand each reply to the call waiting for it.
+
+        Args:
+            sock: The connection being read
+            reader: Buffered reader over the connection
+        """
+        try:
+            while True:
+                frame = recv_frame(reader)
+                with self._lock:
+                    future = self._pending.get(frame.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except (OSError, ValueError) as e:
+            self._disconnect(sock, e)
+
+    def _disconnect(self, sock, error):
+        """
+        Drop a broken connection and fail the calls waiting on it.
+
+        Args:
+            sock: The broken connection
+            error (Exception): What broke it
+        """
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = None
+            pending = list(self._pending.values())
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future in pending:
+            if not future.done():
+                future.set_exception(ConnectionError(f"Lost channel to {self.endpoint}: {error}"))
+
+    def close(self):
+        """
+        Close the connection, failing any calls in flight.
+        """
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._disconnect(sock, ConnectionError("Channel closed"))
+
+    def stats(self):
+        """
+        Get channel metrics.
+
+        Returns:
+            dict: Whether connected, connections made, requests sent, calls in flight and the window
+        """
+        with self._lock:
+            return {
+                'connected': self._sock is not None,
+                'connects': self.connects,
+                'requests': self.requests,
+                'in_flight': len(self._pending),
+                'window': self.window
+            }
+
+
+# Channels shared by external agents, one per endpoint
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def get_channel(endpoint):
+    """
+    Get the shared channel to an endpoint, creating it on first use.
+
+    Args:
+        endpoint (str): Address as gpi+tcp://host:port
+
+    Returns:
+        AgentChannel: The shared channel
+    """
+    with _channels_lock:
+        channel = _channels.get(endpoint)
+        if channel is None:
+            channel = _channels[endpoint] = AgentChannel(endpoint)
+        return channel
+
+
+class ChannelServer:
+    """
+    Serves an agent over the channel protocol.
+
+    Requests from each connection are handled concurrently on a thread pool,
+    and replies are sent as they complete.
+    """
+
+    def __init__(self, handler, host="127.0.0.1", port=0, window=DEFAULT_WINDOW, workers=16):
+        """
+        Initialize the server.
+
+        Args:
+            handler (callable): Takes a request dict and returns the reply dict
+                (for example {'response': ...}); exceptions are sent back as errors
+            host (str, optional): Host address to bind to
+            port (int, optional): Port to listen on (0 picks a free port)
+            window (int, optional): Outstanding requests each client may send
+            workers (int, optional): Threads handling requests
+        """
+        self.handler = handler
+        self.window = window
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="gpi-channel-server")
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name != "nt":  # On Windows it would let another socket take the port
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen()
+        self.address = self._listener.getsockname()[:2]
+        self.endpoint = f"{CHANNEL_SCHEME}://{self.address[0]}:{self.address[1]}"
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        """
+        Start accepting connections in a background thread.
+
+        Returns:
+            ChannelServer: The server
+        """
+        self._running = True
+        threading.Thread(target=self._accept, name="gpi-channel-accept", daemon=True).start()
+        return self
+
+    def _accept(self):
+        """
+        Accept loop: serve each connection on its own thread.
+        """
+        while self._running:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._connections.add(sock)
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        """
+        Read the requests of one connection and dispatch them to the workers.
+
+        Args:
+            sock: The client connection
+        """
+        send_lock = threading.Lock()
+
+        def reply(frame):
+            try:
+                with send_lock:
+                    send_frame(sock, frame)
+            except OSError:
+                pass
+
+        def handle(request):
+            try:
+                result = dict(self.handler(request))
+            except Exception as e:
+                result = {'error': str(e)}
+            result.update(type="response", id=request.get("id"))
+            reply(result)
+
+        reader = sock.makefile("rb")
+        try:
+            reply({'type': "hello", 'window': self.window})
+            while True:
+                request = recv_frame(reader)
+                if request.get("type") == "request":
+                    self._executor.submit(handle, request)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._connections.discard(sock)
+            sock.close()
+
+    def close(self):
+        """
+        Stop the server and drop its connections.
+        """
+        self._running = False
+        with self._lock:
+            connections = [self._listener] + list(self._connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,376 @@
+"""
+Module for negotiated payload encoding.
+
+Agent calls and registration requests are JSON. Large bodies can be
+compressed, and can be sent in MessagePack (a compact binary encoding of
+the same data) when both sides support it. Nothing is assumed about the
+other side:
+
+- Requests advertise what the client reads: `Accept-Encoding: gzip, deflate`
+  and, with MessagePack enabled, `Accept: application/msgpack, application/json`.
+- A server that accepts compressed request bodies says so with an
+  `Accept-Encoding` header on its responses (RFC 7694). A server that
+  speaks MessagePack answers in it. The codec remembers both per endpoint origin.
+- Bodies of at least `compress_threshold` bytes are then compressed with the
+  first coding the endpoint accepts, and are sent in MessagePack once the
+  endpoint has answered in it.
+- A 415 Unsupported Media Type reply to an encoded body makes the codec forget
+  what it learned about the endpoint, and the request is sent again as plain JSON.
+
+MessagePack needs the optional msgpack package; compression uses the
+standard library.
+"""
+
+import gzip
+import io
+import json
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+GZIP = "gzip"
+DEFLATE = "deflate"
+CODINGS = (GZIP, DEFLATE)  # In order of preference
+DEFAULT_COMPRESS_THRESHOLD = 1024  # Smaller bodies are not worth compressing
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+def _msgpack():
+    """
+    Import msgpack.
+
+    Returns:
+        module: The msgpack module
+
+    Raises:
+        ImportError: If msgpack is not installed
+    """
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("MessagePack encoding requires msgpack. Install it with: pip install msgpack")
+    return msgpack
+
+
+def media_type(headers):
+    """
+    Get the media type of a message, without parameters.
+
+    Args:
+        headers: The message headers
+
+    Returns:
+        str: The lower-case media type, or an empty string
+    """
+    return str(headers.get('Content-Type') or '').split(';')[0].strip().lower()
+
+
+def accepted_codings(header):
+    """
+    Parse an Accept-Encoding header into the supported codings it accepts.
+
+    Args:
+        header (str): The header value
+
+    Returns:
+        frozenset: Codings from CODINGS that are not refused with q=0
+    """
+    codings = set()
+    for item in str(header or '').split(','):
+        name, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        name = name.strip().lower()
+        if name in CODINGS and quality > 0:
+            codings.add(name)
+    return frozenset(codings)
+
+
+def compress(body, coding, level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Compress a body with a content coding.
+
+    Args:
+        body (bytes): The body
+        coding (str): GZIP or DEFLATE
+        level (int, optional): Compression level, 1 (fastest) to 9 (smallest)
+
+    Returns:
+        bytes: The compressed body
+    """
+    if coding == GZIP:
+        # A fixed mtime keeps the output deterministic; gzip.compress only accepts one from 3.8
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level, mtime=0) as stream:
+            stream.write(body)
+        return buffer.getvalue()
+    return zlib.compress(body, level)
+
+
+def decompress(body, coding):
+    """
+    Undo a content coding.
+
+    Args:
+        body (bytes): The encoded body
+        coding (str): The Content-Encoding value
+
+    Returns:
+        bytes: The decoded body
+
+    Raises:
+        ValueError: If the coding is not supported or the body is corrupt
+    """
+    coding = (coding or "identity").strip().lower()
+    try:
+        if coding == "identity":
+            return body
+        if coding in (GZIP, "x-gzip"):
+            return gzip.decompress(body)
+        if coding == DEFLATE:
+            return zlib.decompress(body)
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValueError(f"Cannot decode {coding} body: {e}") from e
+    raise ValueError(f"Unsupported content coding: {coding}")
+
+
+def dumps(data, content_type):
+    """
+    Serialize data as JSON or MessagePack.
+
+    Args:
+        data: The data
+        content_type (str): JSON_TYPE or one of MSGPACK_TYPES
+
+    Returns:
+        bytes: The body
+    """
+    if content_type in MSGPACK_TYPES:
+        return _msgpack().packb(data)
+    return json.dumps(data).encode("utf-8")
+
+
+def loads(body, content_type):
+    """
+    Parse a JSON or MessagePack body.
+
+    Args:
+        body (bytes): The decompressed body
+        content_type (str): Its media type
+
+    Returns:
+        The parsed data
+    """
+    if content_type in MSGPACK_TYPES:
+        return _msgpack().unpackb(body)
+    return json.loads(body)
+
+
+class PayloadCodec:
+    """
+    Thread-safe encoder for request bodies that learns what each endpoint accepts.
+    """
+
+    def __init__(self, compress_threshold=DEFAULT_COMPRESS_THRESHOLD, compress_level=DEFAULT_COMPRESS_LEVEL,
+                 compression=True, binary=False):
+        """
+        Initialize the codec.
+
+        Args:
+            compress_threshold (int, optional): Smallest body, in bytes, that is compressed
+            compress_level (int, optional): Compression level, 1 (fastest) to 9 (smallest)
+            compression (bool, optional): Whether to compress bodies for endpoints that accept it
+            binary (bool, optional): Whether to offer and use MessagePack (requires msgpack)
+        """
+        if binary:
+            _msgpack()
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.compression = compression
+        self.binary = binary
+        self._peers = {}  # (scheme, host:port) -> (accepted codings, speaks MessagePack)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.compressed = 0
+        self.cpu_seconds = 0.0
+
+    def accept_headers(self, accept=JSON_TYPE):
+        """
+        Get the headers advertising the encodings this codec reads.
+
+        Args:
+            accept (str, optional): Accept value for JSON replies
+
+        Returns:
+            dict: Accept and Accept-Encoding headers
+        """
+        return {
+            'Accept': f"{MSGPACK_TYPE}, {accept}" if self.binary else accept,
+            'Accept-Encoding': ', '.join(CODINGS)
+        }
+
+    def encode(self, url, payload):
+        """
+        Encode a request body for an endpoint.
+
+        Args:
+            url (str): The endpoint
+            payload: The data to send
+
+        Returns:
+            tuple: (body bytes, Content-Type and Content-Encoding headers)
+        """
+        parts = urlsplit(url)
+        with self._lock:
+            codings, speaks_binary = self._peers.get((parts.scheme, parts.netloc), (frozenset(), False))
+
+        start = time.thread_time()
+        headers = {'Content-Type': MSGPACK_TYPE if self.binary and speaks_binary else JSON_TYPE}
+        body = dumps(payload, headers['Content-Type'])
+        raw = len(body)
+        coding = next((coding for coding in CODINGS if coding in codings), None)
+        if self.compression and coding and raw >= self.compress_threshold:
+            body = compress(body, coding, self.compress_level)
+            headers['Content-Encoding'] = coding
+        elapsed = time.thread_time() - start
+
+        with self._lock:
+            self.requests += 1
+            self.raw_bytes += raw
+            self.wire_bytes += len(body)
+            self.compressed += 'Content-Encoding' in headers
+            self.cpu_seconds += elapsed
+        return body, headers
+
+    def decode(self, url, response):
+        """
+        Parse a response and learn what its endpoint accepts.
+
+        Compressed responses are already decompressed by requests.
+
+        Args:
+            url (str): The endpoint
+            response (requests.Response): The response
+
+        Returns:
+            The parsed reply
+        """
+        self.learn(url, response)
+        content_type = media_type(response.headers)
+        if content_type in MSGPACK_TYPES:
+            return loads(response.content, content_type)
+        return response.json()
+
+    def learn(self, url, response):
+        """
+        Remember the request encodings a response shows its endpoint accepts.
+
+        Args:
+            url (str): The endpoint
+            response (requests.Response): A response from it
+        """
+        header = response.headers.get('Accept-Encoding')
+        speaks_binary = media_type(response.headers) in MSGPACK_TYPES
+        if header is None and not speaks_binary:
+            return
+
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.netloc)
+        with self._lock:
+            codings, known_binary = self._peers.get(origin, (frozenset(), False))
+            if header is not None:
+                codings = accepted_codings(header)
+            self._peers[origin] = (codings, known_binary or speaks_binary)
+
+    def rejected(self, url, response, headers):
+        """
+        Handle a reply that refused an encoded body.
+
+        Args:
+            url (str): The endpoint
+            response (requests.Response): The reply
+            headers (dict): The body headers that were sent
+
+        Returns:
+            bool: True if the body was encoded and refused with 415, so it
+                should be sent again as plain JSON
+        """
+        if response.status_code != 415 or headers == {'Content-Type': JSON_TYPE}:
+            return False
+        parts = urlsplit(url)
+        with self._lock:
+            self._peers.pop((parts.scheme, parts.netloc), None)
+        return True
+
+    def stats(self):
+        """
+        Get encoding metrics.
+
+        Returns:
+            dict: Bodies encoded, their size before and after encoding, how many
+                were compressed, the CPU time spent and the endpoints' negotiated encodings
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'raw_bytes': self.raw_bytes,
+                'wire_bytes': self.wire_bytes,
+                'compressed': self.compressed,
+                'cpu_seconds': self.cpu_seconds,
+                'endpoints': {
+                    f"{scheme}://{netloc}": {'codings': sorted(codings), 'binary': speaks_binary}
+                    for (scheme, netloc), (codings, speaks_binary) in self._peers.items()
+                }
+            }
+
+
+# Shared codec used by external agents and the HTTP client
+_payload_codec = None
+_payload_codec_lock = threading.Lock()
+
+
+def get_payload_codec():
+    """
+    Get the shared payload codec, creating it on first use.
+
+    Returns:
+        PayloadCodec: The shared codec
+    """
+    global _payload_codec
+    with _payload_codec_lock:
+        if _payload_codec is None:
+            _payload_codec = PayloadCodec()
+        return _payload_codec
+
+
+def configure_payload_codec(compress_threshold=DEFAULT_COMPRESS_THRESHOLD, compress_level=DEFAULT_COMPRESS_LEVEL,
+                            compression=True, binary=False):
+    """
+    Replace the shared payload codec.
+
+    Args:
+        compress_threshold (int, optional): Smallest body, in bytes, that is compressed
+        compress_level (int, optional): Compression level, 1 (fastest) to 9 (smallest)
+        compression (bool, optional): Whether to compress bodies for endpoints that accept it
+        binary (bool, optional): Whether to offer and use MessagePack (requires msgpack)
+
+    Returns:
+        PayloadCodec: The new shared codec
+    """
+    global _payload_codec
+    codec = PayloadCodec(compress_threshold, compress_level, compression, binary)
+    with _payload_codec_lock:
+        _payload_codec = codec
+    return codec
@@ -0,0 +1,55 @@
+"""
+Module for length-prefixed JSON framing over TCP.
+
+A frame is a 4-byte big-endian length followed by that many bytes of UTF-8
+JSON. Agent channels and registry replication both speak it. Frames longer
+than MAX_FRAME_SIZE are refused before their body is read, so a peer cannot
+make the reader allocate up to 4 GiB.
+"""
+
+import json
+import struct
+
+FRAME_HEADER = struct.Struct("!I")
+
+# Largest frame body accepted, in bytes
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def send_frame(sock, message):
+    """
+    Send a length-prefixed JSON frame.
+
+    Args:
+        sock: Connected socket
+        message (dict): The message to send
+    """
+    body = json.dumps(message).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(body)) + body)
+
+
+def recv_frame(reader, max_size=MAX_FRAME_SIZE):
+    """
+    Read a length-prefixed JSON frame.
+
+    Args:
+        reader: Buffered binary file wrapping the socket (socket.makefile("rb"))
+        max_size (int, optional): Largest frame body accepted, in bytes
+
+    Returns:
+        dict: The message
+
+    Raises:
+        ConnectionError: If the connection closes mid-frame or before one, or
+            the peer announces a frame larger than max_size
+    """
+    header = reader.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        raise ConnectionError("Connection closed")
+    size, = FRAME_HEADER.unpack(header)
+    if size > max_size:
+        raise ConnectionError(f"Frame of {size} bytes exceeds the limit of {max_size} bytes")
+    body = reader.read(size)
+    if len(body) < size:
+        raise ConnectionError("Connection closed while reading frame")
+    return json.loads(body)
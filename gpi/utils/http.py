@@ -2,21 +2,189 @@
 Module for HttpClient class implementation.
 
 The HttpClient is responsible for HTTP-based registration for
-agents and LLMs.
+agents and LLMs, one at a time or in bulk. The SessionPool keeps pooled
+keep-alive connections to agent and registration endpoints, so repeated
+calls skip the TCP (and TLS) handshake.
 """
 
-import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from gpi.utils.encoding import JSON_TYPE, get_payload_codec
+
+DEFAULT_POOL_SIZE = 10  # Connections kept alive per endpoint
+DEFAULT_CONNECT_TIMEOUT = 3.05  # Seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 30  # Seconds to wait for the response
+
+class SessionPool:
+    """
+    Thread-safe set of keep-alive HTTP sessions, one per endpoint origin.
+    """
+    
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        """
+        Initialize the pool.
+        
+        Args:
+            pool_size (int, optional): Maximum connections kept alive per endpoint
+            connect_timeout (float, optional): Default seconds to establish a connection
+            read_timeout (float, optional): Default seconds to wait for a response
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions = {}  # (scheme, host:port) -> requests.Session
+        self._lock = threading.Lock()
+    
+    @property
+    def timeout(self):
+        """
+        The default (connect, read) timeout.
+        
+        Returns:
+            tuple: Connect and read timeouts in seconds
+        """
+        return (self.connect_timeout, self.read_timeout)
+    
+    def session(self, url):
+        """
+        Get the session for a URL's origin, creating it on first use.
+        
+        Args:
+            url (str): Any URL on the endpoint
+            
+        Returns:
+            requests.Session: The shared session
+        """
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.netloc)
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[origin] = session
+            return session
+    
+    def post(self, url, timeout=None, **kwargs):
+        """
+        Send a POST request over a pooled connection.
+        
+        Args:
+            url (str): The URL
+            timeout (optional): Seconds, or a (connect, read) tuple (defaults to the pool's timeouts)
+            **kwargs: Further arguments for requests.Session.post
+            
+        Returns:
+            requests.Response: The response
+        """
+        return self.session(url).post(url, timeout=timeout or self.timeout, **kwargs)
+    
+    def get(self, url, timeout=None, **kwargs):
+        """
+        Send a GET request over a pooled connection.
+        
+        Args:
+            url (str): The URL
+            timeout (optional): Seconds, or a (connect, read) tuple (defaults to the pool's timeouts)
+            **kwargs: Further arguments for requests.Session.get
+            
+        Returns:
+            requests.Response: The response
+        """
+        return self.session(url).get(url, timeout=timeout or self.timeout, **kwargs)
+    
+    def close(self):
+        """
+        Close all sessions and their connections.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+    
+    def stats(self):
+        """
+        Get pool settings and the endpoints with open sessions.
+        
+        Returns:
+            dict: Pool size, timeouts and endpoint origins
+        """
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'connect_timeout': self.connect_timeout,
+                'read_timeout': self.read_timeout,
+                'endpoints': [f"{scheme}://{netloc}" for scheme, netloc in self._sessions]
+            }
+
+# Shared pool used by external agents
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+def get_session_pool():
+    """
+    Get the shared session pool, creating it on first use.
+    
+    Returns:
+        SessionPool: The shared pool
+    """
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SessionPool()
+        return _session_pool
+
+def configure_session_pool(pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                           read_timeout=DEFAULT_READ_TIMEOUT):
+    """
+    Replace the shared session pool, closing the connections of the previous one.
+    
+    Args:
+        pool_size (int, optional): Maximum connections kept alive per endpoint
+        connect_timeout (float, optional): Default seconds to establish a connection
+        read_timeout (float, optional): Default seconds to wait for a response
+        
+    Returns:
+        SessionPool: The new shared pool
+    """
+    global _session_pool
+    with _session_pool_lock:
+        previous = _session_pool
+        _session_pool = SessionPool(pool_size, connect_timeout, read_timeout)
+    if previous is not None:
+        previous.close()
+    return _session_pool
 
 class HttpClient:
     """
     HTTP client for agent and LLM registration over HTTP.
+    
+    Requests go over pooled keep-alive sessions, so repeated and bulk
+    registrations against the same server reuse their connections.
     """
     
-    def __init__(self):
+    def __init__(self, codec=None, pool=None):
         """
         Initialize the HTTP client.
+        
+        Args:
+            codec (PayloadCodec, optional): Encoder for request bodies (defaults to
+                the shared codec from gpi.utils.encoding)
+            pool (SessionPool, optional): Sessions to send requests over (defaults to
+                a pool of DEFAULT_POOL_SIZE connections per endpoint owned by this client)
         """
+        self.codec = codec
+        self.pool = pool or SessionPool()
         self.timeout = 30  # Default timeout in seconds
         self.headers = {
             'Content-Type': 'application/json',
@@ -34,20 +202,7 @@ class HttpClient:
         Returns:
             dict: Response from the HTTP request
         """
-        try:
-            response = requests.post(
-                endpoint,
-                data=json.dumps(payload),
-                headers=self.headers,
-                timeout=self.timeout
-            )
-            
-            response.raise_for_status()
-            return response.json()
-        
-        except requests.exceptions.RequestException as e:
-            error_message = f"Error registering agent via HTTP: {str(e)}"
-            return {'error': error_message, 'success': False}
+        return self._register(endpoint, payload, "agent")[1]
     
     def register_llm(self, endpoint, payload):
         """
@@ -60,20 +215,182 @@ class HttpClient:
         Returns:
             dict: Response from the HTTP request
         """
+        return self._register(endpoint, payload, "LLM")[1]
+    
+    def register_agents(self, endpoint, payloads, concurrency=None):
+        """
+        Register many agents via HTTP endpoint, several at a time.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): Agent information to send, one dict per agent
+            concurrency (int, optional): Registrations in flight at once (defaults
+                to the pool size, so every request has a kept-alive connection)
+            
+        Returns:
+            dict: Report with the number 'succeeded' and 'failed' and, under
+                'results', each registration's response or error, in payload order
+        """
+        return self._register_many(endpoint, payloads, "agent", concurrency)
+    
+    def register_llms(self, endpoint, payloads, concurrency=None):
+        """
+        Register many LLMs/AIs via HTTP endpoint, several at a time.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): LLM/AI information to send, one dict per LLM
+            concurrency (int, optional): Registrations in flight at once (defaults to the pool size)
+            
+        Returns:
+            dict: Report with the number 'succeeded' and 'failed' and, under
+                'results', each registration's response or error, in payload order
+        """
+        return self._register_many(endpoint, payloads, "LLM", concurrency)
+    
+    async def register_agents_async(self, endpoint, payloads, concurrency=None):
+        """
+        Register many agents via HTTP endpoint without blocking the event loop.
+        
+        Requests run on a private thread pool of `concurrency` threads; the
+        event loop only awaits them. If the caller is cancelled, registrations
+        that have not started are dropped.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): Agent information to send, one dict per agent
+            concurrency (int, optional): Registrations in flight at once (defaults to the pool size)
+            
+        Returns:
+            dict: Report with the number 'succeeded' and 'failed' and, under
+                'results', each registration's response or error, in payload order
+        """
+        return await self._register_many_async(endpoint, payloads, "agent", concurrency)
+    
+    async def register_llms_async(self, endpoint, payloads, concurrency=None):
+        """
+        Register many LLMs/AIs via HTTP endpoint without blocking the event loop.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): LLM/AI information to send, one dict per LLM
+            concurrency (int, optional): Registrations in flight at once (defaults to the pool size)
+            
+        Returns:
+            dict: Report with the number 'succeeded' and 'failed' and, under
+                'results', each registration's response or error, in payload order
+        """
+        return await self._register_many_async(endpoint, payloads, "LLM", concurrency)
+    
+    async def _register_many_async(self, endpoint, payloads, kind, concurrency=None):
+        """
+        Send registrations on a private thread pool, awaiting them from the event loop.
+        
+        The pool is shut down without waiting, so a cancelled caller does not
+        block the loop on registrations still queued or in flight.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): Information to send
+            kind (str): What is registered, for error messages
+            concurrency (int, optional): Registrations in flight at once (defaults to the pool size)
+            
+        Returns:
+            dict: The report (see register_agents)
+        """
+        executor = ThreadPoolExecutor(concurrency or self.pool.pool_size, thread_name_prefix="gpi-register")
+        futures = [executor.submit(self._register, endpoint, payload, kind) for payload in payloads]
         try:
-            response = requests.post(
+            outcomes = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        except BaseException:
+            # Drop the registrations that have not started
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=False)
+        return self._report(outcomes)
+    
+    def _register_many(self, endpoint, payloads, kind, concurrency=None):
+        """
+        Send registrations on a bounded thread pool.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payloads (list): Information to send
+            kind (str): What is registered, for error messages
+            concurrency (int, optional): Registrations in flight at once (defaults to the pool size)
+            
+        Returns:
+            dict: The report (see register_agents)
+        """
+        with ThreadPoolExecutor(concurrency or self.pool.pool_size, thread_name_prefix="gpi-register") as executor:
+            outcomes = list(executor.map(lambda payload: self._register(endpoint, payload, kind), payloads))
+        return self._report(outcomes)
+    
+    @staticmethod
+    def _report(outcomes):
+        """
+        Summarize the outcomes of bulk registrations.
+        
+        Args:
+            outcomes (list): (succeeded, result) pairs, in payload order
+            
+        Returns:
+            dict: The report (see register_agents)
+        """
+        succeeded = sum(1 for ok, _ in outcomes if ok)
+        return {
+            'succeeded': succeeded,
+            'failed': len(outcomes) - succeeded,
+            'results': [result for _, result in outcomes]
+        }
+    
+    def _register(self, endpoint, payload, kind):
+        """
+        Send one registration, turning failures into error replies.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payload (dict): Information to send
+            kind (str): What is registered, for error messages
+            
+        Returns:
+            tuple: (True, response) on success, or (False, error reply)
+        """
+        try:
+            return True, self._post(endpoint, payload)
+        
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error_message = f"Error registering {kind} via HTTP: {str(e)}"
+            return False, {'error': error_message, 'success': False}
+    
+    def _post(self, endpoint, payload):
+        """
+        Send a registration payload, encoded as negotiated with the endpoint.
+        
+        Args:
+            endpoint (str): URL of the registration endpoint
+            payload (dict): Information to send
+            
+        Returns:
+            dict: The parsed reply
+        """
+        codec = self.codec or get_payload_codec()
+        headers = dict(self.headers, **codec.accept_headers(self.headers.get('Accept', JSON_TYPE)))
+        while True:
+            data, body_headers = codec.encode(endpoint, payload)
+            response = self.pool.post(
                 endpoint,
-                data=json.dumps(payload),
-                headers=self.headers,
+                data=data,
+                headers=dict(headers, **body_headers),
                 timeout=self.timeout
             )
-            
-            response.raise_for_status()
-            return response.json()
+            if not codec.rejected(endpoint, response, body_headers):
+                break
         
-        except requests.exceptions.RequestException as e:
-            error_message = f"Error registering LLM via HTTP: {str(e)}"
-            return {'error': error_message, 'success': False}
+        response.raise_for_status()
+        return codec.decode(endpoint, response)
     
     def set_timeout(self, timeout):
         """
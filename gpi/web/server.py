@@ -2,35 +2,116 @@
 Web server implementation for the GPI SDK.
 """
 
+import io
 import os
 import json
+import queue
 import threading
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from concurrent.futures import Future
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, stream_with_context
 
 import gpi
+from gpi.core.admission import AdmissionController, Overloaded
+from gpi.core.agent import AgentCallError
+from gpi.core.handlers import handler_pool_stats
+from gpi.utils import encoding
+
+class RequestBodyDecoder:
+    """
+    WSGI middleware that turns compressed and MessagePack request bodies into plain JSON.
+    
+    Bodies the server cannot read are refused with 415 Unsupported Media Type
+    and an Accept-Encoding header listing the codings it does read.
+    """
+    
+    def __init__(self, app):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: The WSGI application to wrap
+        """
+        self.app = app
+    
+    def __call__(self, environ, start_response):
+        coding = (environ.get('HTTP_CONTENT_ENCODING') or 'identity').strip().lower()
+        content_type = encoding.media_type({'Content-Type': environ.get('CONTENT_TYPE')})
+        if coding == 'identity' and content_type not in encoding.MSGPACK_TYPES:
+            return self.app(environ, start_response)
+        
+        body = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+        try:
+            data = json.dumps(encoding.loads(encoding.decompress(body, coding), content_type)).encode('utf-8')
+        except (ValueError, ImportError) as e:
+            unsupported = coding not in ('identity', 'x-gzip') + encoding.CODINGS or isinstance(e, ImportError)
+            status = '415 Unsupported Media Type' if unsupported else '400 Bad Request'
+            error = json.dumps({'error': str(e)}).encode('utf-8')
+            start_response(status, [('Content-Type', encoding.JSON_TYPE),
+                                    ('Content-Length', str(len(error))),
+                                    ('Accept-Encoding', ', '.join(encoding.CODINGS))])
+            return [error]
+        
+        environ = dict(environ, CONTENT_TYPE=encoding.JSON_TYPE, CONTENT_LENGTH=str(len(data)))
+        environ['wsgi.input'] = io.BytesIO(data)
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        return self.app(environ, start_response)
 
 class bapi:
     """
     Web server for the GPI SDK providing a browser-based interface.
     """
     
-    def __init__(self, host='127.0.0.1', port=5000):
+    def __init__(self, host='127.0.0.1', port=5000, admission=None):
         """
         Initialize the web server.
         
         Args:
             host (str): Host address to bind to
             port (int): Port to listen on
+            admission (AdmissionController, optional): Queue and worker pool that
+                /api/bapi requests run on (defaults to AdmissionController())
         """
         self.host = host
         self.port = port
+        self.admission = admission or AdmissionController()
         self.app = Flask(__name__,
                         template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
                         static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+        self.app.wsgi_app = RequestBodyDecoder(self.app.wsgi_app)
+        self.app.after_request(self.encode_response)
         self.register_routes()
         self.server_thread = None
         self.running = False
         
+    def encode_response(self, response):
+        """
+        Advertise the request codings the server reads, and encode large JSON
+        replies as the client prefers (MessagePack if it lists it, then gzip or deflate).
+        
+        Args:
+            response: The Flask response
+            
+        Returns:
+            The response, possibly re-encoded
+        """
+        response.headers['Accept-Encoding'] = ', '.join(encoding.CODINGS)
+        if response.is_streamed or response.direct_passthrough or response.mimetype != encoding.JSON_TYPE:
+            return response
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        
+        if encoding.MSGPACK_TYPE in request.accept_mimetypes.values():
+            try:
+                response.set_data(encoding.dumps(response.get_json(), encoding.MSGPACK_TYPE))
+                response.mimetype = encoding.MSGPACK_TYPE
+            except ImportError:
+                pass
+        
+        coding = next((coding for coding in encoding.CODINGS if request.accept_encodings[coding]), None)
+        if coding and response.content_length >= encoding.DEFAULT_COMPRESS_THRESHOLD:
+            response.set_data(encoding.compress(response.get_data(), coding))
+            response.headers['Content-Encoding'] = coding
+        return response
+    
     def register_routes(self):
         """Register the Flask routes."""
         
@@ -91,10 +172,13 @@ class bapi:
             if agent_type == 'external' and not external_endpoint:
                 return jsonify({'error': 'External agents require an external_endpoint'}), 400
             
-            if agent_type == 'external':
-                agent = gpi.create.external_agent(name, agent_id, abilities, external_endpoint, api_key)
-            else:
-                agent = gpi.create.agent(name, agent_id, abilities)
+            try:
+                if agent_type == 'external':
+                    agent = gpi.create.external_agent(name, agent_id, abilities, external_endpoint, api_key)
+                else:
+                    agent = gpi.create.agent(name, agent_id, abilities)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
                 
             return jsonify({
                 'name': agent.name,
@@ -155,10 +239,30 @@ class bapi:
             message = data.get('message')
             user_id = data.get('user_id', 'default')
             use_llm = data.get('use_llm', False)
+            priority = data.get('priority') or request.headers.get('X-Priority', 'normal')
             
             if not message:
                 return jsonify({'error': 'Message is required'}), 400
             
+            # Run on the admission controller's workers, shedding load early when overloaded
+            try:
+                future = self.admission.submit(process_bapi, context, message, user_id, use_llm,
+                                               user_id=user_id, priority=priority)
+                payload, status = future.result()
+                return jsonify(payload), status
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Overloaded as e:
+                return rejected(e)
+        
+        def rejected(error):
+            """Turn an admission rejection into a response with its status and Retry-After."""
+            response = jsonify({'error': str(error)})
+            response.headers['Retry-After'] = str(error.retry_after)
+            return response, error.status
+        
+        def process_bapi(context, message, user_id, use_llm):
+            """Process a BAPI request on an admission worker, returning the payload and status."""
             try:
                 # Debug info
                 print(f"\n=== BAPI Request ===")
@@ -184,16 +288,166 @@ class bapi:
                 print(f"Response: {response}")
                 print(f"=== End of Request ===\n")
                 
-                return jsonify({
+                return {
                     'response': response,
                     'context': current_context,
                     'auto_extracted': context is None and current_context is not None
-                })
+                }, 200
             except Exception as e:
                 import traceback
                 error_msg = f"Error in BAPI processing: {str(e)}\n{traceback.format_exc()}"
                 print(error_msg)
+                return {'error': str(e)}, 500
+        
+        @self.app.route('/api/bapi/batch', methods=['POST'])
+        def bapi_batch_endpoint():
+            """API endpoint for batch BAPI operations."""
+            data = request.json or {}
+            messages = data.get('messages')
+            use_llm = data.get('use_llm', False)
+            user_id = data.get('user_id', 'default')
+            priority = data.get('priority') or request.headers.get('X-Priority', 'normal')
+            
+            if not isinstance(messages, list):
+                return jsonify({'error': 'messages must be a list'}), 400
+            
+            # Every message is charged to its own user, the batch's user_id by default
+            by_user = {}  # user_id -> [(index, item)]
+            for index, item in enumerate(messages):
+                if isinstance(item, str):
+                    item = {'message': item}
+                if isinstance(item, dict):
+                    item = dict(item, user_id=item.get('user_id', user_id))
+                    by_user.setdefault(item['user_id'], []).append((index, item))
+                else:
+                    by_user.setdefault(user_id, []).append((index, item))
+            
+            # Each user's messages are admitted in chunks of at most their share of the
+            # queue, one chunk per user at a time, so a long batch fits on an idle server
+            size = max(1, self.admission.max_per_user)
+            chunks = {owner: [entries[i:i + size] for i in range(0, len(entries), size)]
+                      for owner, entries in by_user.items()}
+            results = [None] * len(messages)
+            rejections = []
+            admitted = False
+            try:
+                for round_ in range(max(map(len, chunks.values()), default=0)):
+                    futures = [(owned[round_], submit_batch(owner, owned[round_], use_llm, priority))
+                               for owner, owned in chunks.items() if round_ < len(owned)]
+                    for chunk, future in futures:
+                        error = future.exception()
+                        if isinstance(error, Overloaded):
+                            rejections.append(error)
+                            chunk_results = [{'response': None, 'agent_id': None, 'context': None,
+                                              'error': str(error)}] * len(chunk)
+                        elif error is not None:
+                            raise error
+                        else:
+                            admitted = True
+                            chunk_results = future.result()
+                        for (index, _), result in zip(chunk, chunk_results):
+                            results[index] = result
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                import traceback
+                error_msg = f"Error in batch BAPI processing: {str(e)}\n{traceback.format_exc()}"
+                print(error_msg)
                 return jsonify({'error': str(e)}), 500
+            
+            # Rejected as a whole only when none of its messages was admitted
+            if rejections and not admitted:
+                return rejected(rejections[0])
+            return jsonify({'results': results})
+        
+        def submit_batch(user_id, chunk, use_llm, priority):
+            """Admit one user's chunk of a batch, returning a future that fails with Overloaded if rejected."""
+            try:
+                return self.admission.submit(gpi.bapi_batch, [item for _, item in chunk], use_llm,
+                                             user_id=user_id, priority=priority, cost=len(chunk))
+            except Overloaded as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+        
+        @self.app.route('/api/bapi/stream', methods=['GET', 'POST'])
+        def bapi_stream_endpoint():
+            """API endpoint streaming a BAPI response as Server-Sent Events."""
+            # EventSource can only send GET, so parameters may also come in the query string
+            data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+            context = data.get('context')
+            message = data.get('message')
+            user_id = data.get('user_id', 'default')
+            use_llm = data.get('use_llm', False) in (True, 'true', '1')
+            priority = data.get('priority') or request.headers.get('X-Priority', 'normal')
+            
+            if not message:
+                return jsonify({'error': 'Message is required'}), 400
+            
+            # The stream runs on an admission worker for its whole length, passing
+            # pieces to this thread; the worker's result marks the end
+            pieces = queue.Queue()
+            closed = threading.Event()
+            try:
+                future = self.admission.submit(stream_bapi, context, message, user_id, use_llm, pieces, closed,
+                                               user_id=user_id, priority=priority)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Overloaded as e:
+                return rejected(e)
+            future.add_done_callback(lambda future: pieces.put(('end', future)))
+            
+            kind, value = pieces.get()
+            if kind == 'invalid':
+                return jsonify({'error': value}), 400
+            if kind == 'end':
+                # Shed after waiting too long in the queue
+                error = value.exception()
+                if isinstance(error, Overloaded):
+                    return rejected(error)
+                return jsonify({'error': str(error)}), 500
+            
+            def events():
+                try:
+                    while True:
+                        kind, value = pieces.get()
+                        if kind == 'delta':
+                            yield f"data: {json.dumps({'delta': value})}\n\n"
+                        elif kind == 'error':
+                            yield f"event: error\ndata: {json.dumps({'error': value})}\n\n"
+                            return
+                        elif kind == 'done':
+                            yield f"event: done\ndata: {json.dumps({'context': gpi.get_context(user_id)})}\n\n"
+                            return
+                        elif kind == 'end':
+                            error = value.exception()
+                            yield f"event: error\ndata: {json.dumps({'error': str(error)})}\n\n"
+                            return
+                finally:
+                    closed.set()  # Stops the worker if the client went away
+            
+            return Response(stream_with_context(events()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+        def stream_bapi(context, message, user_id, use_llm, pieces, closed):
+            """Stream a BAPI response on an admission worker, passing (kind, value) items to `pieces`."""
+            try:
+                stream = gpi.bapi_stream(context, message, user_id, use_llm, raise_errors=True)
+            except ValueError as e:
+                pieces.put(('invalid', str(e)))
+                return
+            pieces.put(('ready', None))
+            
+            try:
+                for piece in stream:
+                    if closed.is_set():
+                        stream.close()
+                        return
+                    pieces.put(('delta', piece))
+            except AgentCallError as e:
+                pieces.put(('error', str(e)))
+                return
+            pieces.put(('done', None))
         
         @self.app.route('/api/car', methods=['POST'])
         def car_endpoint():
@@ -392,7 +646,15 @@ class bapi:
                 'agents': agents_info,
                 'llms': llms_info,
                 'active_agents': active_agents,
-                'weather_agents': weather_agents
+                'weather_agents': weather_agents,
+                'agent_latency': gpi._broker.latency.snapshot(),
+                'route_cache': gpi._broker.route_cache.stats(),
+                'coalescing': gpi._broker.singleflight.stats() if gpi._broker.singleflight else None,
+                'response_cache': gpi._broker.response_cache.stats(),
+                'circuits': gpi._broker.circuits.snapshot() if gpi._broker.circuits else None,
+                'bulkheads': gpi._broker.bulkheads.snapshot() if gpi._broker.bulkheads else None,
+                'handler_pools': handler_pool_stats(),
+                'admission': self.admission.stats()
             })
     
     def start(self, debug=False, use_reloader=False):
@@ -10,5 +10,9 @@ setup(
         "requests",
         "flask",
     ],
+    extras_require={
+        "columnar": ["numpy"],
+        "compact": ["msgpack"],
+    },
     python_requires=">=3.7",
 ) 
\ No newline at end of file
@@ -5,17 +5,134 @@ Unit tests for the GPI SDK.
 
 import sys
 import os
+import asyncio
+import importlib.util
+import io
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import threading
+import time
+import json
+import operator
 import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 
 # Add the parent directory to the path so we can import the gpi package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import gpi
-from gpi.core.agent import Agent
+from gpi.core.agent import Agent, AgentCallError
 from gpi.core.registry import Registry
 from gpi.core.broker import Broker
 from gpi.core.context import ContextManager
+from gpi.core.balancing import InFlightTracker, get_strategy
+from gpi.core.bulkhead import Bulkheads, BulkheadFull
+from gpi.core.circuit import CircuitBreakers, CLOSED, OPEN, HALF_OPEN
+from gpi.core.columnar import load_columnar
+from gpi.core.handlers import HandlerPool, get_handler_pool
+from gpi.core.latency import LatencyTracker
+from gpi.core.matcher import AbilityMatcher
+from gpi.core.options import CallOptions
+from gpi.context import ContextInfo
+from gpi.core.replication import RegistryReplicator, TcpTransport
+from gpi.core.routing import RouteCache
+from gpi.utils.channel import AgentChannel, ChannelServer
+from gpi.utils.framing import FRAME_HEADER, recv_frame
+from gpi.utils import encoding
+from gpi.utils.http import HttpClient, SessionPool
+from gpi.core.admission import AdmissionController, Overloaded
+from gpi.core.retry import DEADLINE_HEADER, RetryBudget, RetryPolicy
+from gpi.core.response_cache import ResponseCache, estimate_size
+from gpi.core.aggregation import merge_vote, AgentResult
+
+class StubAgentServer:
+    """
+    Local HTTP server standing in for an external agent.
+    
+    Each POST is answered after `delay` seconds by `respond(payload)`, which
+    returns a (status, body) pair; the default echoes the message. A list
+    body is streamed as newline-delimited JSON, one item every `chunk_delay`
+    seconds. GET is a health check answered with `status`. Compressed and
+    MessagePack bodies are decoded; with `accept_encoding` set, responses
+    advertise it, and with `binary` set, clients that accept MessagePack get it.
+    """
+    
+    def __init__(self, name="Stub", delay=0.0, status=200, respond=None):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.respond = respond or self.echo
+        self.chunk_delay = 0.0
+        self.accept_encoding = None
+        self.binary = False
+        self.wire_sizes = []  # Body size of each request as sent
+        self.requests = []
+        self.ports = []  # Client port of each request, to observe connection reuse
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Send headers and body without delayed-ACK stalls
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.wire_sizes.append(len(body))
+                body = encoding.decompress(body, self.headers.get("Content-Encoding"))
+                payload = encoding.loads(body, encoding.media_type(self.headers)) if body else {}
+                stub.requests.append((dict(self.headers), payload))
+                stub.ports.append(self.client_address[1])
+                time.sleep(stub.delay)
+                status, reply = stub.respond(payload)
+                if isinstance(reply, list):
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for item in reply:
+                        line = (json.dumps(item) + "\n").encode("utf-8")
+                        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                        self.wfile.flush()
+                        time.sleep(stub.chunk_delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                content_type = encoding.JSON_TYPE
+                if stub.binary and encoding.MSGPACK_TYPE in self.headers.get("Accept", ""):
+                    content_type = encoding.MSGPACK_TYPE
+                data = encoding.dumps(reply, content_type)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                if stub.accept_encoding:
+                    self.send_header("Accept-Encoding", stub.accept_encoding)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                self.send_response(stub.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/agent"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def echo(self, payload):
+        if self.status >= 400:
+            return self.status, {"error": "stub failure"}
+        return self.status, {"response": f"{self.name}: {payload.get('message')}"}
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
 
 class TestAgent(unittest.TestCase):
     """Tests for the Agent class."""
@@ -71,6 +188,35 @@ class TestAgent(unittest.TestCase):
         agent.activate()
         self.assertTrue(agent.is_active())
     
+    def test_abilities_are_shared_and_slotted(self):
+        """Test that agents with the same abilities share one ability set."""
+        agent1 = Agent("Agent1", "a001", ["talk", "think"])
+        agent2 = Agent("Agent2", "a002", ["talk", "think"])
+        
+        self.assertIs(agent1._abilities, agent2._abilities)
+        self.assertFalse(hasattr(agent1, "__dict__"))
+        
+        # Editing one agent must not affect the other
+        agent1.add_ability("learn")
+        self.assertEqual(agent1.abilities, ["talk", "think", "learn"])
+        self.assertEqual(agent2.abilities, ["talk", "think"])
+    
+    def test_call_options_are_shared_and_immutable(self):
+        """Test that agents share default call options and changes derive new ones."""
+        agent1 = Agent("Agent1", "a001", ["talk"])
+        agent2 = Agent("Agent2", "a002", ["talk"])
+        self.assertIs(agent1.options, agent2.options)
+        with self.assertRaises(AttributeError):
+            agent1.options.idempotent = True
+        
+        agent1.options = agent1.options.replace(idempotent=True, timeout=(1.0, 5.0))
+        self.assertTrue(agent1.options.idempotent)
+        self.assertFalse(agent2.options.idempotent)
+        
+        copy = Agent.from_dict(json.loads(json.dumps(agent1.to_dict())))
+        self.assertEqual((copy.options.idempotent, copy.options.timeout), (True, (1.0, 5.0)))
+        self.assertIs(Agent.from_dict(agent2.to_dict()).options, agent2.options)
+    
     def test_process_message(self):
         """Test agent's ability to process a message."""
         agent = Agent("TestAgent", "test001", ["talk", "think"])
@@ -135,6 +281,313 @@ class TestRegistry(unittest.TestCase):
         self.assertEqual(len(talk_agents), 1)
         self.assertIn(agent1, talk_agents)
 
+class TestHierarchicalAbilities(unittest.TestCase):
+    """Tests for dotted abilities in the registry."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.registry = Registry()
+        self.general = Agent("General", "w001", ["weather"])
+        self.forecast = Agent("Forecast", "w002", ["weather.forecast"])
+        self.alerts = Agent("Alerts", "w003", ["weather.alerts.severe", "news"])
+        for agent in (self.general, self.forecast, self.alerts):
+            self.registry.register_agent(agent)
+    
+    def test_wildcard_and_prefix(self):
+        """Test wildcard and prefix queries."""
+        self.assertEqual(self.registry.find_agents("weather.*"), [self.forecast, self.alerts])
+        self.assertEqual(self.registry.find_agents("*.forecast"), [self.forecast])
+        self.assertEqual(self.registry.get_agents_by_prefix("weather"),
+                         [self.general, self.forecast, self.alerts])
+        self.assertEqual(self.registry.get_agents_by_ability("weather"), [self.general])
+    
+    def test_most_specific_match(self):
+        """Test resolving a request to the most specific ability."""
+        self.assertEqual(self.registry.resolve_agents("weather.forecast.hourly"), [self.forecast])
+        self.assertEqual(self.registry.resolve_agents("weather.tides"), [self.general])
+        
+        # Inactive agents fall back to the next most specific match
+        self.forecast.deactivate()
+        self.assertEqual(self.registry.resolve_agents("weather.forecast"), [self.general])
+        self.assertEqual(self.registry.resolve_agents("sports"), [])
+    
+    def test_ability_edits_update_index(self):
+        """Test that ability edits on registered agents update the index."""
+        self.general.add_ability("weather.alerts")
+        self.assertEqual(self.registry.resolve_agents("weather.alerts.flood"), [self.general])
+        
+        self.general.remove_ability("weather.alerts")
+        self.alerts.remove_ability("weather.alerts.severe")
+        self.assertEqual(self.registry.find_agents("weather.alerts.*"), [])
+    
+    def test_malformed_abilities_rejected(self):
+        """Test that abilities with empty segments are rejected at registration and match nothing."""
+        for ability in ("weather.", "weather..alerts", ".weather", ""):
+            with self.assertRaises(ValueError):
+                Agent("Bad", "bad001", [ability])
+            self.assertEqual(self.registry.get_agents_by_ability(ability), [])
+            self.assertEqual(self.registry.get_agents_by_prefix(ability), [])
+            self.assertEqual(self.registry.find_agents(ability), [])
+            self.assertEqual(self.registry.resolve_agents(ability), [])
+        
+        with self.assertRaises(ValueError):
+            self.general.add_ability("weather..x")
+        self.assertEqual(self.general.abilities, ["weather"])
+        self.assertEqual(self.registry.get_agents_by_prefix("weather"), [self.general, self.forecast, self.alerts])
+
+class TestColumnarExport(unittest.TestCase):
+    """Tests for the columnar registry export."""
+    
+    def setUp(self):
+        """Set up a temporary export directory."""
+        self.path = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Remove the temporary export directory."""
+        shutil.rmtree(self.path)
+    
+    def test_export_and_reload(self):
+        """Test that exported columns round-trip through a memory map."""
+        registry = Registry()
+        registry.register_agent(Agent("Agent1", "a001", ["talk", "think"]))
+        registry.register_agent(Agent("Wetter", "ä002", [], "http://example.com", agent_type="external"))
+        registry.register_agent(Agent("Agent3", "a003", ["think", "weather"]))
+        registry.deactivate_agent("a003")
+        
+        manifest = registry.export_columnar(self.path)
+        self.assertEqual(manifest["count"], 3)
+        self.assertEqual(manifest["registry_version"], registry.version)
+        
+        columns = load_columnar(self.path)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.agent_id(1), "ä002")
+        self.assertEqual(columns.name(2), "Agent3")
+        self.assertEqual(columns.agent_type(1), "external")
+        self.assertEqual(columns.active.tolist(), [True, True, False])
+        self.assertEqual(columns.abilities_of(1), [])
+        self.assertEqual(columns.abilities_of(2), ["think", "weather"])
+        self.assertEqual(columns.ability_mask("think").tolist(), [True, False, True])
+        self.assertEqual(columns.ability_mask("learn").tolist(), [False, False, False])
+    
+    def test_too_many_agent_types(self):
+        """Test that more agent types than a uint8 can encode are rejected."""
+        registry = Registry()
+        for i in range(256):
+            registry.register_agent(Agent(f"Agent{i}", f"a{i:03d}", ["talk"], agent_type=f"type{i}"))
+        registry.export_columnar(self.path)
+        self.assertEqual(load_columnar(self.path).agent_type(255), "type255")
+        
+        registry.register_agent(Agent("Agent256", "a256", ["talk"], agent_type="type256"))
+        with self.assertRaises(ValueError):
+            registry.export_columnar(self.path)
+
+class TestRegistryEvents(unittest.TestCase):
+    """Tests for registry change events."""
+    
+    def test_events_are_ordered_with_versions(self):
+        """Test that every change is delivered in order with the registry version."""
+        registry = Registry()
+        received = []
+        registry.subscribe(received.append)
+        
+        agent = Agent("Agent1", "a001", ["talk"])
+        registry.register_agent(agent)
+        agent.add_ability("think")
+        registry.deactivate_agent("a001")
+        registry.deactivate_agent("a001")  # No change, no event
+        registry.register_llm("TestLLM", "key")
+        registry.deactivate_llm("TestLLM")
+        registry.activate_llm("TestLLM")
+        
+        self.assertEqual([e.kind for e in received], [
+            "agent_registered", "ability_added", "agent_deactivated",
+            "llm_registered", "llm_deactivated", "llm_activated"
+        ])
+        self.assertEqual([e.version for e in received], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(registry.version, 6)
+        self.assertEqual(received[1].data, {"ability": "think"})
+    
+    def test_unsubscribe(self):
+        """Test that unsubscribed callbacks stop receiving events."""
+        registry = Registry()
+        received = []
+        callback = registry.subscribe(received.append)
+        
+        self.assertTrue(registry.unsubscribe(callback))
+        self.assertFalse(registry.unsubscribe(callback))
+        registry.register_agent(Agent("Agent1", "a001", ["talk"]))
+        self.assertEqual(received, [])
+    
+    def test_async_subscription_is_bounded(self):
+        """Test that the async queue keeps the newest events when full."""
+        async def run():
+            registry = Registry()
+            subscription = registry.subscribe_async(maxsize=2)
+            for i in range(3):
+                registry.register_agent(Agent(f"Agent{i}", f"a00{i}", ["talk"]))
+            await asyncio.sleep(0)
+            versions = [(await subscription.get()).version for _ in range(2)]
+            subscription.close()
+            return versions, subscription.dropped
+        
+        versions, dropped = asyncio.run(run())
+        self.assertEqual(versions, [2, 3])
+        self.assertEqual(dropped, 1)
+
+class TestReplication(unittest.TestCase):
+    """Tests for multi-node registry replication."""
+    
+    def wait_for(self, condition, timeout=5.0):
+        """Poll until a condition holds or the timeout expires."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return condition()
+    
+    def test_changes_converge_through_relay(self):
+        """Test that changes reach nodes that only see them via another peer."""
+        registries = [Registry() for _ in range(3)]
+        registries[0].register_agent(Agent("Existing", "e001", ["talk"]))
+        replicators = [RegistryReplicator(registry, f"node{i}", TcpTransport())
+                       for i, registry in enumerate(registries)]
+        for replicator in replicators:
+            replicator.transport.start(replicator._handle)
+        
+        # node0 <- node1 <- node2: node2 only learns about node0 through node1
+        replicators[1].transport.add_peer(replicators[0].transport.address)
+        replicators[2].transport.add_peer(replicators[1].transport.address)
+        
+        agent = Agent("Weather", "w001", ["weather"])
+        registries[0].register_agent(agent)
+        agent.add_ability("weather.alerts")
+        registries[0].deactivate_agent("e001")
+        
+        replicators[1].sync_once()
+        replicators[2].sync_once()
+        replicators[2].sync_once()  # Already applied entries are skipped
+        
+        replica = registries[2].get_agent("w001")
+        self.assertEqual(replica.abilities, ["weather", "weather.alerts"])
+        self.assertFalse(registries[2].get_agent("e001").is_active())
+        self.assertEqual(replicators[2].vector, {"node0": 4})
+        
+        for replicator in replicators:
+            replicator.stop()
+    
+    def test_log_compaction_and_snapshot(self):
+        """Test that applied entries are compacted and late nodes catch up from a snapshot."""
+        registries = [Registry() for _ in range(3)]
+        replicators = [RegistryReplicator(registry, f"node{i}", TcpTransport(), retain=1)
+                       for i, registry in enumerate(registries)]
+        for replicator in replicators:
+            replicator.transport.start(replicator._handle)
+            self.addCleanup(replicator.stop)
+        replicators[1].transport.add_peer(replicators[0].transport.address)
+        
+        agent = Agent("Pricing", "p001", ["pricing"], "http://127.0.0.1:1/agent", agent_type="external",
+                      options=CallOptions(timeout=(1.0, 5.0), max_concurrency=4, batch_window=0.01,
+                                          idempotent=True))
+        registries[0].register_agent(agent)
+        agent.add_ability("pricing.quotes")
+        self.assertEqual(replicators[1].sync_once(), 2)
+        replicators[1].sync_once()  # Tells node0 that both entries were applied
+        self.assertEqual(([e['seq'] for e in replicators[0].log["node0"]], replicators[0].base["node0"]), ([2], 1))
+        
+        registries[0].deactivate_agent("p001")
+        replicators[2].transport.add_peer(replicators[0].transport.address)
+        self.assertEqual(replicators[2].sync_once(), 3)
+        
+        replica = registries[2].get_agent("p001")
+        self.assertEqual(replica.abilities, ["pricing", "pricing.quotes"])
+        self.assertFalse(replica.is_active())
+        options = replica.options
+        self.assertEqual((options.timeout, options.max_concurrency, options.batch_window, options.idempotent),
+                         ((1.0, 5.0), 4, 0.01, True))
+        self.assertEqual(replicators[2].vector, {"node0": 3})
+        
+        registries[0].activate_agent("p001")
+        self.assertEqual(replicators[2].sync_once(), 1)
+        self.assertTrue(replica.is_active())
+    
+    def test_compaction_keeps_a_tail(self):
+        """Test that a node nobody pulls from keeps the most recent entries."""
+        registry = Registry()
+        for i in range(3):
+            registry.register_agent(Agent(f"Agent{i}", f"t00{i}", ["talk"]))
+        replicator = RegistryReplicator(registry, "solo", TcpTransport(), retain=2)
+        
+        self.assertEqual(replicator.compact(), 1)
+        self.assertEqual(([e['seq'] for e in replicator.log["solo"]], replicator.base["solo"]), ([2, 3], 1))
+        self.assertEqual(replicator.entries_since({"solo": 1}), replicator.log["solo"])
+    
+    def test_conflicting_registrations_converge(self):
+        """Test that the earlier of two registrations of one agent ID wins on every node."""
+        registries = [Registry() for _ in range(2)]
+        replicators = [RegistryReplicator(registry, f"node{i}", TcpTransport())
+                       for i, registry in enumerate(registries)]
+        for replicator in replicators:
+            replicator.transport.start(replicator._handle)
+            self.addCleanup(replicator.stop)
+        replicators[0].transport.add_peer(replicators[1].transport.address)
+        replicators[1].transport.add_peer(replicators[0].transport.address)
+        
+        registries[0].register_agent(Agent("First", "dup", ["talk"]))
+        time.sleep(0.01)
+        registries[1].register_agent(Agent("Second", "dup", ["think"]))
+        registries[1].get_agent("dup").add_ability("think.deep")  # Made to the losing registration
+        
+        for _ in range(2):
+            replicators[0].sync_once()
+            replicators[1].sync_once()
+        for registry in registries:
+            self.assertEqual((registry.get_agent("dup").name, registry.get_agent("dup").abilities),
+                             ("First", ["talk"]))
+            self.assertEqual(registry.get_agents_by_ability("think"), [])
+        
+        registries[1].get_agent("dup").add_ability("talk.small")
+        replicators[0].sync_once()
+        self.assertEqual(registries[0].get_agent("dup").abilities, ["talk", "talk.small"])
+    
+    def test_oversized_frames_refused(self):
+        """Test that a frame announcing more than the limit is refused before its body is read."""
+        reader = io.BytesIO(FRAME_HEADER.pack(2 ** 32 - 1) + b"{}")
+        with self.assertRaises(ConnectionError):
+            recv_frame(reader)
+        self.assertEqual(reader.tell(), FRAME_HEADER.size)
+        self.assertEqual(recv_frame(io.BytesIO(FRAME_HEADER.pack(2) + b"{}"), max_size=2), {})
+    
+    def test_replication_between_processes(self):
+        """Test that two processes converge in both directions."""
+        registry = Registry()
+        replicator = RegistryReplicator(registry, "local", TcpTransport(), interval=0.05)
+        replicator.start()
+        
+        script = textwrap.dedent(f"""
+            import sys, time
+            sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})
+            import gpi
+            replicator = gpi.replicate("remote", peers=["127.0.0.1:{replicator.transport.port}"], interval=0.05)
+            print(replicator.transport.port, flush=True)
+            gpi.create.agent("Remote", "remote001", ["talk"])
+            deadline = time.time() + 10
+            while gpi._registry.get_agent("local001") is None and time.time() < deadline:
+                time.sleep(0.05)
+            print("seen" if gpi._registry.get_agent("local001") else "missing", flush=True)
+        """)
+        process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True)
+        try:
+            replicator.transport.add_peer(("127.0.0.1", int(process.stdout.readline())))
+            registry.register_agent(Agent("Local", "local001", ["think"]))
+            
+            self.assertTrue(self.wait_for(lambda: registry.get_agent("remote001") is not None))
+            self.assertEqual(process.stdout.readline().strip(), "seen")
+        finally:
+            process.wait(timeout=10)
+            replicator.stop()
+
 class TestContextManager(unittest.TestCase):
     """Tests for the ContextManager class."""
     
@@ -211,6 +664,1359 @@ class TestBroker(unittest.TestCase):
         response = self.broker.generate_response("Hello")
         self.assertIn("Context-Aware Response", response)
 
+class TestAbilityMatcher(unittest.TestCase):
+    """Tests for table-driven ability extraction."""
+    
+    def test_default_table(self):
+        """Test the default keyword mappings, including inflected forms."""
+        matcher = AbilityMatcher()
+        
+        self.assertEqual(matcher.match("Let's chat, then analyzed it"), ["talk", "think"])
+        self.assertEqual(matcher.match("Studying the weather forecast"), ["learn", "weather"])
+        self.assertEqual(matcher.match("nothing relevant"), [])
+    
+    def test_custom_phrases(self):
+        """Test custom keywords and multi-word phrases."""
+        matcher = AbilityMatcher({"pricing": ["price quote", "how much"]})
+        matcher.add("cost", "pricing")
+        
+        self.assertEqual(matcher.match("How much is it?"), ["pricing"])
+        self.assertEqual(matcher.match("a price for a quote"), [])
+        self.assertTrue(matcher.remove("how much"))
+        self.assertEqual(matcher.match("How much does it cost"), ["pricing"])
+    
+    def test_malformed_ability_rejected(self):
+        """Test that keywords for malformed abilities fail when they are added, not when matched."""
+        matcher = AbilityMatcher({})
+        with self.assertRaises(ValueError):
+            matcher.add("weather", "x.")
+        with self.assertRaises(ValueError):
+            gpi.register.ability_keywords("weather..alerts", ["storm"])
+        self.assertEqual(matcher.match("weather"), [])
+        self.assertEqual((len(matcher), matcher.version), (0, 0))
+    
+    def test_match_context_info(self):
+        """Test matching structured context without re-parsing the string."""
+        matcher = AbilityMatcher()
+        context_info = ContextInfo(topic="weather", entities=[], keywords={"talk"},
+                                   intent="question", confidence=0.5,
+                                   original_query="Will it rain?")
+        
+        self.assertEqual(matcher.match_context_info(context_info), ["weather", "talk"])
+    
+    def test_broker_routes_by_context(self):
+        """Test that the broker routes to agents found through the table."""
+        registry = Registry()
+        broker = Broker(registry, {"weather": ["rain", "weather"]})
+        registry.register_agent(Agent("General", "g001", ["talk"]))
+        registry.register_agent(Agent("Weather", "w001", ["weather"]))
+        
+        broker.context_manager.set_context("matcher-user", "Is rain expected?")
+        response = broker.process_message("Hello", "matcher-user")
+        broker.context_manager.clear_context("matcher-user")
+        self.assertIn("Agent Weather received", response)
+
+class TestLoadBalancing(unittest.TestCase):
+    """Tests for broker load-balancing strategies."""
+    
+    def setUp(self):
+        """Set up equivalent agents."""
+        self.agents = [Agent(f"Agent{i}", f"a00{i}", ["talk"]) for i in range(3)]
+        self.in_flight = InFlightTracker()
+    
+    def test_round_robin(self):
+        """Test that round-robin cycles through the candidates."""
+        strategy = get_strategy("round_robin")
+        selected = [strategy.select(self.agents, self.in_flight) for _ in range(6)]
+        self.assertEqual(selected, self.agents * 2)
+        
+        # Positions are kept for the most recently used candidate sets only
+        strategy.max_sets = 2
+        for size in (1, 2, 3, 2):
+            strategy.select(self.agents[:size], self.in_flight)
+        self.assertEqual(list(strategy._positions), [("a000", "a001", "a002"), ("a000", "a001")])
+        self.assertIs(strategy.select(self.agents[:2], self.in_flight), self.agents[0])
+    
+    def test_load_aware_strategies_avoid_busy_agents(self):
+        """Test that load-aware strategies prefer agents with fewer outstanding requests."""
+        self.in_flight.acquire("a000")
+        self.in_flight.acquire("a001")
+        
+        strategy = get_strategy("least_outstanding")
+        self.assertIs(strategy.select(self.agents, self.in_flight), self.agents[2])
+        
+        # Power of two never picks the busiest of the two it samples
+        strategy = get_strategy("power_of_two")
+        self.in_flight.acquire("a000")
+        for _ in range(20):
+            self.assertIsNot(strategy.select(self.agents, self.in_flight), self.agents[0])
+    
+    def test_weighted(self):
+        """Test that zero-weight agents receive no traffic."""
+        self.agents[0].weight = 0
+        strategy = get_strategy("weighted")
+        for _ in range(20):
+            self.assertIsNot(strategy.select(self.agents, self.in_flight), self.agents[0])
+    
+    def test_in_flight_tracking_is_thread_safe(self):
+        """Test that concurrent acquire/release calls balance out."""
+        def work():
+            for _ in range(1000):
+                self.in_flight.acquire("a000")
+                self.in_flight.release("a000")
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.in_flight.snapshot(), {})
+    
+    def test_broker_spreads_traffic(self):
+        """Test that the broker no longer sends everything to the first agent."""
+        registry = Registry()
+        broker = Broker(registry)
+        for agent in self.agents:
+            registry.register_agent(agent)
+        
+        responses = [broker.process_message("Hi", "balancing-user") for _ in range(3)]
+        self.assertEqual([r.split()[1] for r in responses], ["Agent0", "Agent1", "Agent2"])
+        
+        with self.assertRaises(ValueError):
+            broker.set_strategy("fastest")
+
+class TestRouteCache(unittest.TestCase):
+    """Tests for the broker's routing decision cache."""
+    
+    def test_lru_eviction_and_stats(self):
+        """Test LRU eviction and hit/miss accounting."""
+        cache = RouteCache(maxsize=2)
+        cache.put("a", [1])
+        cache.put("b", [2])
+        self.assertEqual(cache.get("a"), [1])
+        cache.put("c", [3])
+        
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), [3])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+    
+    def test_broker_reuses_and_invalidates_routes(self):
+        """Test that repeated contexts hit the cache and registry changes invalidate it."""
+        registry = Registry()
+        broker = Broker(registry)
+        registry.register_agent(Agent("General", "g001", ["talk"]))
+        weather = Agent("Weather", "w001", ["weather"])
+        registry.register_agent(weather)
+        
+        for _ in range(3):
+            self.assertEqual(broker._find_candidates("Weather today?"), [weather])
+        self.assertEqual(broker.route_cache.hits, 2)
+        
+        # Deactivating the agent changes the registry version and clears the cache
+        weather.deactivate()
+        self.assertEqual(len(broker.route_cache), 0)
+        self.assertEqual([agent.name for agent in broker._find_candidates("Weather today?")], ["General"])
+        
+        # Keyword table edits produce new keys
+        broker.ability_matcher.add("sunny", "weather")
+        weather.activate()
+        broker._find_candidates("Sunny?")
+        broker.ability_matcher.remove("sunny")
+        self.assertEqual([agent.name for agent in broker._find_candidates("Sunny?")], ["General", "Weather"])
+
+class TestAsyncBroker(unittest.TestCase):
+    """Tests for concurrent fan-out and hedged requests."""
+    
+    def setUp(self):
+        """Set up a broker that tries agents in registration order."""
+        self.registry = Registry()
+        self.broker = Broker(self.registry, strategy="first")
+        self.stubs = []
+    
+    def tearDown(self):
+        """Stop the stub agents."""
+        for stub in self.stubs:
+            stub.close()
+    
+    def add_stub(self, name, **kwargs):
+        stub = StubAgentServer(name, **kwargs)
+        self.stubs.append(stub)
+        self.registry.register_agent(Agent(name, name.lower(), ["talk"], stub.url, agent_type="external"))
+        return stub
+    
+    def process(self, **kwargs):
+        return asyncio.run(self.broker.process_message_async("ping", "async-user", **kwargs))
+    
+    def test_hedge_beats_slow_agent(self):
+        """Test that a backup request to a second agent cuts the wait on a slow one."""
+        self.add_stub("Slow", delay=0.5)
+        self.add_stub("Fast")
+        
+        start = time.perf_counter()
+        self.assertEqual(self.process(hedge_delay=0.05), "Fast: ping")
+        self.assertLess(time.perf_counter() - start, 0.4)
+    
+    def test_no_hedge_when_primary_is_fast(self):
+        """Test that backup requests are only sent after the hedge delay."""
+        self.add_stub("Fast")
+        slow = self.add_stub("Slow", delay=0.5)
+        
+        self.assertEqual(self.process(hedge_delay=0.3), "Fast: ping")
+        self.assertEqual(slow.requests, [])
+    
+    def test_fanout_skips_failures(self):
+        """Test first-success-wins across concurrent requests, including failures."""
+        self.add_stub("Failing", status=500)
+        self.add_stub("Fast", delay=0.05)
+        self.assertEqual(self.process(fanout=2, hedge=False), "Fast: ping")
+        
+        self.registry.get_agent("fast").deactivate()
+        self.assertIn("Error communicating with external agent Failing", self.process())
+    
+    def test_timeout(self):
+        """Test the overall deadline."""
+        self.add_stub("Slow", delay=0.5)
+        self.assertIn("No agent responded within 0.1 seconds", self.process(timeout=0.1))
+    
+    def test_losers_release_slots(self):
+        """Test that a losing request stops retrying and releases its slots once the winner returns."""
+        unavailable = self.add_stub("Unavailable", status=503)
+        self.add_stub("Fast")
+        policy = RetryPolicy(max_attempts=5, budget=RetryBudget(max_tokens=100))
+        policy.backoff = lambda retry, error=None: 1.0
+        agent = self.registry.get_agent("unavailable")
+        agent.options = agent.options.replace(retry_policy=policy)
+        
+        self.assertEqual(self.process(hedge_delay=0.05), "Fast: ping")
+        
+        released = time.monotonic() + 0.5
+        while time.monotonic() < released and (self.broker.in_flight.get("unavailable")
+                                               or self.broker.bulkheads.get("unavailable")['in_flight']):
+            time.sleep(0.01)
+        self.assertEqual(self.broker.in_flight.get("unavailable"), 0)
+        self.assertEqual(self.broker.bulkheads.get("unavailable")['in_flight'], 0)
+        self.assertEqual(len(unavailable.requests), 1)
+
+class TestScatterGather(unittest.TestCase):
+    """Tests for scatter-gather aggregation."""
+    
+    def setUp(self):
+        """Set up pricing agents with different answers and confidences."""
+        self.registry = Registry()
+        self.broker = Broker(self.registry, max_workers=4)
+        self.stubs = []
+        for name, answer, confidence, delay in (("A", "$10", 0.4, 0.0), ("B", "$12", 0.9, 0.0),
+                                                ("C", "$10", None, 0.0), ("Slow", "$99", 1.0, 0.5)):
+            reply = {"response": answer}
+            if confidence is not None:
+                reply["confidence"] = confidence
+            stub = StubAgentServer(name, delay=delay, respond=lambda payload, reply=reply: (200, reply))
+            self.stubs.append(stub)
+            self.registry.register_agent(Agent(name, name.lower(), ["pricing"], stub.url, agent_type="external"))
+        self.registry.register_agent(Agent("Chat", "chat", ["talk"]))
+    
+    def tearDown(self):
+        """Stop the stub agents."""
+        for stub in self.stubs:
+            stub.close()
+    
+    def test_partial_results_and_merges(self):
+        """Test per-agent status and timing, deadlines and the built-in merge functions."""
+        result = self.broker.scatter_gather("Price?", "gather-user", ability="pricing", deadline=0.3)
+        
+        statuses = {r['name']: r['status'] for r in result['results']}
+        self.assertEqual(statuses, {"A": "ok", "B": "ok", "C": "ok", "Slow": "timeout"})
+        self.assertFalse(result['complete'])
+        self.assertEqual(result['response'], "A: $10\nB: $12\nC: $10")
+        self.assertTrue(all(r['elapsed'] is not None for r in result['results']))
+        
+        result = self.broker.scatter_gather("Price?", "gather-user", ability="pricing", merge="vote", deadline=0.3)
+        self.assertEqual(result['response'], "$10")
+        result = self.broker.scatter_gather("Price?", "gather-user", ability="pricing",
+                                            merge="best_confidence", deadline=1.0)
+        self.assertEqual(result['response'], "$99")
+        self.assertTrue(result['complete'])
+    
+    def test_errors_and_custom_merge(self):
+        """Test that failed agents are reported and custom merges receive only successes."""
+        self.stubs[0].respond = lambda payload: (500, {})
+        merged = self.broker.scatter_gather("Price?", ability="pricing", deadline=1.0,
+                                            merge=lambda results: ",".join(r.name for r in results))
+        
+        self.assertEqual(merged['response'], "B,C,Slow")
+        self.assertEqual(merged['results'][0]['status'], "error")
+        self.assertIn("Error communicating with external agent A", merged['results'][0]['error'])
+        
+        ties = [AgentResult("x", "X", "ok", "yes"), AgentResult("y", "Y", "ok", " No")]
+        self.assertEqual(merge_vote(ties), "yes")
+        mixed = [AgentResult("x", "X", "ok", 10), AgentResult("y", "Y", "ok", "$12"),
+                 AgentResult("z", "Z", "ok", " 10 "), AgentResult("w", "W", "ok", None)]
+        self.assertEqual(merge_vote(mixed), 10)
+        with self.assertRaises(ValueError):
+            self.broker.scatter_gather("Price?", merge="average")
+
+class TestBatchProcessing(unittest.TestCase):
+    """Tests for batch message processing."""
+    
+    def test_results_in_order_with_errors(self):
+        """Test ordering, concurrency and per-item errors."""
+        slow = StubAgentServer("Weather", delay=0.2)
+        failing = StubAgentServer("News", status=500)
+        try:
+            registry = Registry()
+            broker = Broker(registry)
+            registry.register_agent(Agent("Chat", "chat", ["talk"]))
+            registry.register_agent(Agent("Weather", "weather", ["weather"], slow.url, agent_type="external"))
+            registry.register_agent(Agent("News", "news", ["news"], failing.url, agent_type="external"))
+            
+            batch = [{"message": "Weather in Paris?", "user_id": "batch-1"},
+                     "Hello there",
+                     {"message": "Latest news?", "context": "news headlines", "user_id": "batch-2"},
+                     {"user_id": "batch-3"}] + ["Weather in Rome?"] * 4
+            
+            def extract(message, use_llm=False, llm=None):
+                topic = "weather" if "Weather" in message else ""
+                return ContextInfo(topic=topic, entities=[], keywords=set(), intent="question",
+                                   confidence=0.5, original_query=message)
+            
+            with patch('gpi.context.extract_context', side_effect=extract) as extract:
+                start = time.perf_counter()
+                results = broker.process_messages(batch)
+                elapsed = time.perf_counter() - start
+            
+            self.assertEqual(extract.call_count, 3)  # Once per distinct message without a context
+            self.assertLess(elapsed, 0.6)  # Five weather calls of 0.2s ran concurrently
+            self.assertEqual([r['agent_id'] for r in results],
+                             ["weather", "chat", "news", None] + ["weather"] * 4)
+            self.assertEqual(results[0]['response'], "Weather: Weather in Paris?")
+            self.assertIn("Agent Chat received: Hello there", results[1]['response'])
+            self.assertIn("Error communicating with external agent News", results[2]['error'])
+            self.assertIsNone(results[2]['response'])
+            self.assertEqual(results[3]['error'], "Message is required")
+            self.assertEqual(broker.context_manager.get_context("batch-2"), "Intent: manual. Query: news headlines")
+        finally:
+            slow.close()
+            failing.close()
+    
+    def test_failures_are_isolated_per_item(self):
+        """Test that an item failing in extraction, routing or its handler leaves the others intact."""
+        registry = Registry()
+        broker = Broker(registry)
+        registry.register_agent(Agent("Chat", "chat", ["talk"]))
+        
+        def fail(context, message):
+            raise RuntimeError("handler failed")
+        
+        registry.register_agent(Agent("Broken", "broken", ["broken"], handler=fail))
+        
+        def extract(message, use_llm=False, llm=None):
+            if message == "Unreadable":
+                raise LookupError("Resource punkt not found")
+            return ContextInfo(topic="", entities=[], keywords=set(), intent="question",
+                               confidence=0.5, original_query=message)
+        
+        find_candidates = broker._find_candidates
+        
+        def find(context, context_info):
+            if context_info.original_query == "Route me":
+                raise ValueError("Invalid ability")
+            return find_candidates(context, context_info)
+        
+        batch = ["Hello", "Unreadable", {"message": "Fix it", "context": "broken"}, "Route me", "Bye"]
+        with patch('gpi.context.extract_context', side_effect=extract), \
+                patch.object(broker, '_find_candidates', side_effect=find):
+            results = broker.process_messages(batch)
+        
+        self.assertEqual([r['error'] is None for r in results], [True, False, False, False, True])
+        self.assertEqual(results[1]['error'], "Resource punkt not found")
+        self.assertEqual(results[2]['agent_id'], "broken")
+        self.assertIn("handler failed", results[2]['error'])
+        self.assertEqual(results[3]['error'], "Invalid ability")
+        self.assertIn("Agent Chat received: Bye", results[4]['response'])
+    
+    def test_batch_endpoint(self):
+        """Test the /api/bapi/batch endpoint."""
+        from gpi.web.server import bapi as WebServer
+        
+        agent = gpi.create.agent("BatchAgent", "batch001", ["talk"])
+        self.addCleanup(agent.deactivate)
+        client = WebServer().app.test_client()
+        
+        response = client.post('/api/bapi/batch', json={"messages": [{"message": "Hi", "context": "greeting"},
+                                                                   {"message": "Bye", "context": "farewell"}]})
+        results = response.get_json()['results']
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(result['error'] is None for result in results))
+        self.assertEqual(client.post('/api/bapi/batch', json={"messages": "Hi"}).status_code, 400)
+
+class TestCoalescing(unittest.TestCase):
+    """Tests for coalescing identical concurrent broker calls."""
+    
+    def send_concurrently(self, broker, count=8):
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(broker.process_message("Same?", "coalesce-user")))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+    
+    def test_identical_calls_share_one_request(self):
+        """Test that concurrent identical calls reach the agent once, and only when enabled."""
+        stub = StubAgentServer("Shared", delay=0.2)
+        try:
+            registry = Registry()
+            broker = Broker(registry, coalesce=True)
+            registry.register_agent(Agent("Shared", "shared", ["talk"], stub.url, agent_type="external"))
+            
+            self.assertEqual(self.send_concurrently(broker), ["Shared: Same?"] * 8)
+            self.assertEqual(len(stub.requests), 1)
+            stats = broker.singleflight.stats()
+            self.assertEqual((stats['calls'], stats['executions'], stats['in_flight']), (8, 1, 0))
+            self.assertAlmostEqual(stats['coalescing_ratio'], 7 / 8)
+            
+            broker.set_coalescing(False)
+            self.send_concurrently(broker, 3)
+            self.assertEqual(len(stub.requests), 4)
+        finally:
+            stub.close()
+    
+    def test_errors_are_shared(self):
+        """Test that every waiter receives the shared failure."""
+        stub = StubAgentServer("Down", delay=0.2, status=500)
+        try:
+            registry = Registry()
+            broker = Broker(registry, coalesce=True)
+            registry.register_agent(Agent("Down", "down", ["talk"], stub.url, agent_type="external"))
+            
+            responses = self.send_concurrently(broker, 4)
+            self.assertEqual(len(stub.requests), 1)
+            self.assertTrue(all("Error communicating with external agent Down" in r for r in responses))
+        finally:
+            stub.close()
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for the TTL response cache."""
+    
+    def fill(self, policy):
+        size = estimate_size(("k0",), "x" * 100)
+        cache = ResponseCache(max_bytes=size * 3, policy=policy)
+        for i in range(3):
+            cache.put((f"k{i}",), "x" * 100, ttl=60)
+        return cache
+    
+    def test_eviction_policies(self):
+        """Test that the byte bound is kept with LRU and LFU eviction."""
+        cache = self.fill("lru")
+        cache.get(("k0",))
+        cache.put(("k3",), "x" * 100, ttl=60)
+        self.assertIsNone(cache.get(("k1",)))
+        self.assertIsNotNone(cache.get(("k0",)))
+        
+        cache = self.fill("lfu")
+        for _ in range(2):
+            cache.get(("k0",))
+            cache.get(("k2",))
+        cache.get(("k1",))
+        cache.put(("k3",), "x" * 100, ttl=60)  # Evicts k1 (used twice) over k0/k2 (three times)
+        cache.put(("k4",), "x" * 100, ttl=60)  # Evicts k3 (used once)
+        self.assertEqual(sorted(key for (key,) in cache._entries), ["k0", "k2", "k4"])
+        self.assertLessEqual(cache.bytes, cache.max_bytes)
+        self.assertEqual(cache.evictions, 2)
+        
+        with self.assertRaises(ValueError):
+            ResponseCache(policy="fifo")
+    
+    def test_broker_serves_stale_while_revalidating(self):
+        """Test TTL hits, stale responses with a background refresh, and metrics."""
+        calls = []
+        
+        def respond(payload):
+            calls.append(payload)
+            return 200, {"response": f"answer {len(calls)}"}
+        
+        stub = StubAgentServer("Cached", respond=respond)
+        try:
+            registry = Registry()
+            broker = Broker(registry)
+            registry.register_agent(Agent("Cached", "cached", ["talk"], stub.url, agent_type="external",
+                                          options=CallOptions(cache_ttl=0.2, stale_ttl=5)))
+            
+            self.assertEqual(broker.process_message("Q", "cache-user"), "answer 1")
+            self.assertEqual(broker.process_message("Q", "cache-user"), "answer 1")
+            self.assertEqual(len(calls), 1)
+            
+            time.sleep(0.25)
+            self.assertEqual(broker.process_message("Q", "cache-user"), "answer 1")  # Stale, refresh started
+            for _ in range(50):
+                if not broker.response_cache._refreshing:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(broker.process_message("Q", "cache-user"), "answer 2")
+            self.assertEqual(len(calls), 2)
+            
+            stats = broker.response_cache.stats()
+            self.assertEqual((stats['misses'], stats['stale_hits']), (1, 1))
+            self.assertGreater(stats['bytes_saved'], 0)
+            self.assertGreater(stats['hit_ratio'], 0.5)
+        finally:
+            stub.close()
+    
+    def test_uncacheable_replies_and_llms(self):
+        """Test that opted-out replies are recomputed and LLM configs enable caching."""
+        stub = StubAgentServer("NoStore", respond=lambda payload: (200, {"response": "fresh", "cacheable": False}))
+        try:
+            registry = Registry()
+            broker = Broker(registry)
+            registry.register_agent(Agent("NoStore", "nostore", ["talk"], stub.url, agent_type="external",
+                                          options=CallOptions(cache_ttl=60)))
+            broker.process_message("Q", "cache-user")
+            broker.process_message("Q", "cache-user")
+            self.assertEqual(len(stub.requests), 2)
+            
+            registry.get_agent("nostore").deactivate()
+            registry.register_llm("CachedLLM", "key", config={"cache_ttl": 60})
+            with patch.object(broker, '_simulate_llm_response', return_value="llm answer") as llm:
+                self.assertEqual(broker.process_message("Q", "cache-user"), "llm answer")
+                self.assertEqual(broker.process_message("Q", "cache-user"), "llm answer")
+            self.assertEqual(llm.call_count, 1)
+        finally:
+            stub.close()
+
+class TestAdmissionControl(unittest.TestCase):
+    """Tests for the admission-controlled work queue."""
+    
+    def setUp(self):
+        """Set up a single-worker controller blocked on a gate."""
+        self.controller = AdmissionController(workers=1, max_queue=6, max_per_user=3, queue_budget=5.0)
+        self.gate = threading.Event()
+        self.order = []
+        self.blocker = self.controller.submit(self.gate.wait)
+        time.sleep(0.05)  # Let the worker pick up the blocker
+    
+    def tearDown(self):
+        """Stop the workers."""
+        self.gate.set()
+        self.controller.stop()
+    
+    def test_priority_and_fairness(self):
+        """Test that higher classes go first and users take turns within a class."""
+        futures = [self.controller.submit(self.order.append, f"{user}{i}", user_id=user, priority="low")
+                   for user, i in (("a", 1), ("a", 2), ("a", 3), ("b", 1))]
+        futures.append(self.controller.submit(self.order.append, "urgent", user_id="c", priority="high"))
+        
+        with self.assertRaises(Overloaded) as raised:
+            self.controller.submit(self.order.append, "a4", user_id="a")
+        self.assertEqual(raised.exception.status, 429)
+        with self.assertRaises(ValueError):
+            self.controller.submit(self.order.append, "x", priority="urgent")
+        
+        self.gate.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.order, ["urgent", "a1", "b1", "a2", "a3"])
+        self.assertEqual(self.controller.stats()['rejected_user'], 1)
+    
+    def test_sheds_load_over_budget(self):
+        """Test rejection on a full queue, on estimated wait, and for requests that waited too long."""
+        for i in range(6):
+            self.controller.submit(self.order.append, i, user_id=f"user{i}")
+        with self.assertRaises(Overloaded) as raised:
+            self.controller.submit(self.order.append, "late", user_id="other")
+        self.assertEqual(raised.exception.status, 503)
+        
+        self.controller.queue_budget = 0.05
+        time.sleep(0.1)
+        self.gate.set()
+        self.blocker.result(timeout=5)
+        time.sleep(0.1)
+        self.assertEqual(self.order, [])
+        self.assertEqual(self.controller.stats()['shed'], 6)
+        
+        # With a known service time and a busy worker, the estimated wait is checked up front
+        self.gate.clear()
+        self.controller.queue_budget = 1.5
+        self.controller._service_time = 1.0
+        self.controller.submit(self.gate.wait)
+        time.sleep(0.05)
+        self.controller.submit(self.order.append, "queued")
+        with self.assertRaises(Overloaded) as raised:
+            self.controller.submit(self.order.append, "rejected")
+        self.assertEqual(raised.exception.retry_after, 2)
+    
+    def test_bapi_endpoint_returns_429(self):
+        """Test that the web layer maps rejections to HTTP status codes."""
+        from gpi.web.server import bapi as WebServer
+        
+        client = WebServer(admission=self.controller).app.test_client()
+        queued = [self.controller.submit(self.gate.wait, user_id="web-user") for _ in range(3)]
+        
+        response = client.post('/api/bapi', json={"message": "Hi", "context": "c", "user_id": "web-user"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], "1")
+        
+        self.gate.set()
+        for future in queued:
+            future.result(timeout=5)
+        agent = gpi.create.agent("AdmittedAgent", "admitted001", ["talk"])
+        self.addCleanup(agent.deactivate)
+        response = client.post('/api/bapi', json={"message": "Hi", "context": "c", "user_id": "web-user",
+                                                  "priority": "high"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("response", response.get_json())
+
+    def test_batch_and_stream_endpoints_shed_load(self):
+        """Test that batches count as one request per message and streams go through admission."""
+        from gpi.web.server import bapi as WebServer
+        
+        client = WebServer(admission=self.controller).app.test_client()
+        queued = [self.controller.submit(self.gate.wait, user_id=f"user{i}") for i in range(4)]
+        batch = {"messages": [{"message": "Hi", "context": "c"}] * 3, "user_id": "batch-user"}
+        
+        response = client.post('/api/bapi/batch', json=batch)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.controller.stats()['rejected_full'], 3)
+        
+        queued += [self.controller.submit(self.gate.wait, user_id=f"user{i}") for i in range(4, 6)]
+        response = client.post('/api/bapi/stream', json={"message": "Hi", "context": "c"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], "1")
+        
+        self.gate.set()
+        for future in queued:
+            future.result(timeout=5)
+        response = client.post('/api/bapi/batch', json=dict(batch, messages=batch['messages'][:2]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['results']), 2)
+        self.assertEqual(self.controller.stats()['completed'], 9)  # Blocker, six queued, two messages
+        
+        body = client.post('/api/bapi/stream', json={"message": "Hi", "context": "c"}).get_data(as_text=True)
+        self.assertIn("event: done", body)
+    
+    def test_batch_larger_than_user_share(self):
+        """Test that a batch longer than a user's share runs in chunks, charged to each item's user."""
+        from gpi.web.server import bapi as WebServer
+        
+        self.gate.set()
+        self.blocker.result(timeout=5)
+        agent = gpi.create.agent("ChunkedAgent", "chunked001", ["talk"])
+        self.addCleanup(agent.deactivate)
+        client = WebServer(admission=self.controller).app.test_client()
+        messages = [{"message": f"Hi {i}", "context": "c"} for i in range(8)]
+        messages.append({"message": "Hi", "context": "c", "user_id": "other-user"})
+        
+        response = client.post('/api/bapi/batch', json={"messages": messages, "user_id": "batch-user"})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual(len(results), 9)
+        self.assertTrue(all(result['error'] is None for result in results))
+        stats = self.controller.stats()
+        self.assertEqual((stats['completed'], stats['rejected_user'], stats['rejected_full']), (10, 0, 0))
+
+class TestConnectionPooling(unittest.TestCase):
+    """Tests for pooled keep-alive connections to external agents."""
+    
+    def test_agent_reuses_connection(self):
+        """Test that repeated calls to an endpoint share one keep-alive connection."""
+        stub = StubAgentServer("KeepAlive")
+        try:
+            agent = Agent("KeepAlive", "k001", ["talk"], stub.url, agent_type="external")
+            for _ in range(5):
+                self.assertEqual(agent.invoke("ctx", "Hi")['response'], "KeepAlive: Hi")
+            self.assertEqual(len(set(stub.ports)), 1)
+        finally:
+            stub.close()
+    
+    def test_pool_per_endpoint_and_timeouts(self):
+        """Test per-origin sessions, the pool size and separate read timeouts."""
+        slow = StubAgentServer("Slow", delay=0.3)
+        try:
+            pool = SessionPool(pool_size=4, connect_timeout=1.0, read_timeout=0.1)
+            self.assertIs(pool.session(slow.url), pool.session(slow.url + "?x=1"))
+            self.assertIsNot(pool.session(slow.url), pool.session("http://127.0.0.1:1/agent"))
+            self.assertEqual(pool.session(slow.url).get_adapter(slow.url)._pool_maxsize, 4)
+            
+            start = time.perf_counter()
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                pool.post(slow.url, json={"message": "Hi"})
+            self.assertLess(time.perf_counter() - start, 0.25)
+            pool.close()
+            
+            agent = Agent("Slow", "s001", ["talk"], slow.url, agent_type="external",
+                          options=CallOptions(timeout=(1.0, 0.1)))
+            with self.assertRaises(AgentCallError):
+                agent.invoke("ctx", "Hi")
+        finally:
+            slow.close()
+
+class TestRetries(unittest.TestCase):
+    """Tests for retries, retry budgets and deadlines on external agent calls."""
+    
+    def flaky_stub(self, failures, status=503):
+        """Start a stub that fails `failures` times with `status`, then echoes."""
+        stub = StubAgentServer("Flaky")
+        stub.respond = lambda payload: ((status, {"error": "busy"}) if len(stub.requests) <= failures
+                                        else stub.echo(payload))
+        self.addCleanup(stub.close)
+        return stub
+    
+    def test_retries_transient_failures(self):
+        """Test that 503s are retried with backoff and other errors are not."""
+        stub = self.flaky_stub(2)
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+        agent = Agent("Flaky", "f001", ["talk"], stub.url, agent_type="external",
+                      options=CallOptions(retry_policy=policy))
+        self.assertEqual(agent.invoke("ctx", "Hi")['response'], "Flaky: Hi")
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(policy.budget.stats()['retries'], 2)
+        
+        bad = self.flaky_stub(5, status=400)
+        agent = Agent("Bad", "b001", ["talk"], bad.url, agent_type="external",
+                      options=CallOptions(retry_policy=policy))
+        with self.assertRaises(AgentCallError):
+            agent.invoke("ctx", "Hi")
+        self.assertEqual(len(bad.requests), 1)
+    
+    def test_read_timeouts_retried_only_when_idempotent(self):
+        """Test that a read timeout is not retried by default, but connect failures are."""
+        stub = StubAgentServer("Slow", delay=0.3)
+        self.addCleanup(stub.close)
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+        agent = Agent("Slow", "s001", ["talk"], stub.url, agent_type="external",
+                      options=CallOptions(timeout=(1.0, 0.1), retry_policy=policy))
+        with self.assertRaises(AgentCallError):
+            agent.invoke("ctx", "Hi")
+        self.assertEqual(len(stub.requests), 1)
+        
+        agent.options = agent.options.replace(idempotent=True)
+        with self.assertRaises(AgentCallError):
+            agent.invoke("ctx", "Hi")
+        self.assertEqual(len(stub.requests), 4)
+        
+        # Nothing listening: the request was never sent, so it is retried
+        closed = Agent("Gone", "g001", ["talk"], "http://127.0.0.1:1/agent", agent_type="external",
+                       options=CallOptions(retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01)))
+        with self.assertRaises(AgentCallError):
+            closed.invoke("ctx", "Hi")
+        self.assertEqual(closed.options.retry_policy.budget.stats()['retries'], 1)
+    
+    def test_budget_limits_retries(self):
+        """Test that an exhausted budget stops retries."""
+        stub = self.flaky_stub(100)
+        policy = RetryPolicy(max_attempts=5, base_delay=0.001, budget=RetryBudget(ratio=0.1, max_tokens=2))
+        agent = Agent("Flaky", "f001", ["talk"], stub.url, agent_type="external",
+                      options=CallOptions(retry_policy=policy))
+        for _ in range(4):
+            with self.assertRaises(AgentCallError):
+                agent.invoke("ctx", "Hi")
+        
+        stats = policy.budget.stats()
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(len(stub.requests), 6)
+        self.assertGreater(stats['exhausted'], 0)
+    
+    def test_deadline_propagation(self):
+        """Test that the remaining budget is sent to the agent and bounds the call."""
+        stub = StubAgentServer("Slow", delay=1.0)
+        self.addCleanup(stub.close)
+        registry = Registry()
+        broker = Broker(registry, request_timeout=0.2)
+        registry.register_agent(Agent("Slow", "s001", ["talk"], stub.url, agent_type="external",
+                                      options=CallOptions(retry_policy=RetryPolicy(base_delay=0.01))))
+        
+        start = time.perf_counter()
+        response = broker.process_message("Hi", "deadline-user")
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertIn("Error communicating with external agent Slow", response)
+        
+        headers = stub.requests[0][0]
+        self.assertLessEqual(int(headers[DEADLINE_HEADER]), 200)
+        self.assertGreater(int(headers[DEADLINE_HEADER]), 100)
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for per-agent circuit breakers and health probes."""
+    
+    def setUp(self):
+        self.down = StubAgentServer("Down", status=500)
+        self.up = StubAgentServer("Up")
+        self.addCleanup(self.down.close)
+        self.addCleanup(self.up.close)
+    
+    def make_broker(self, **kwargs):
+        registry = Registry()
+        broker = Broker(registry, strategy="first", circuit_breaker=CircuitBreakers(failure_threshold=2, **kwargs))
+        for stub in (self.down, self.up):
+            registry.register_agent(Agent(stub.name, stub.name.lower(), ["talk"], stub.url, agent_type="external"))
+        return broker
+    
+    def test_open_circuit_is_skipped(self):
+        """Test that consecutive failures open the circuit and routing skips the agent."""
+        broker = self.make_broker(recovery_timeout=60, probe_interval=0)
+        responses = [broker.process_message("Hi", "circuit-user") for _ in range(5)]
+        
+        self.assertEqual(len(self.down.requests), 2)
+        self.assertEqual(responses[2:], ["Up: Hi"] * 3)
+        self.assertEqual(broker.circuits.state("down"), OPEN)
+        
+        # Calls that still target the agent fail without reaching it
+        result = broker.scatter_gather("Hi", "circuit-user", ability="talk")
+        errors = [r['error'] for r in result['results'] if r['status'] == "error"]
+        self.assertEqual(errors, ["Circuit open for agent Down"])
+        self.assertEqual(len(self.down.requests), 2)
+        self.assertEqual(broker.circuits.snapshot()["down"]["rejected"], 1)
+    
+    def test_half_open_trial(self):
+        """Test that a failed trial re-opens the circuit and a successful one closes it."""
+        broker = self.make_broker(recovery_timeout=0.05, probe_interval=0)
+        for _ in range(2):
+            broker.process_message("Hi", "circuit-user")
+        
+        time.sleep(0.1)
+        self.assertTrue(broker.circuits.available("down"))
+        self.assertIn("Error communicating", broker.process_message("Hi", "circuit-user"))
+        self.assertEqual(broker.circuits.state("down"), OPEN)
+        
+        time.sleep(0.1)
+        self.down.status = 200
+        self.assertTrue(broker.circuits.acquire("down"))
+        self.assertEqual(broker.circuits.state("down"), HALF_OPEN)
+        self.assertFalse(broker.circuits.available("down"))
+        broker.circuits.record(broker.registry.get_agent("down"))
+        self.assertEqual(broker.circuits.state("down"), CLOSED)
+    
+    def test_health_probe_closes_circuit(self):
+        """Test that background probes close the circuit once the agent recovers."""
+        broker = self.make_broker(recovery_timeout=60, probe_interval=0.05)
+        for _ in range(2):
+            broker.process_message("Hi", "circuit-user")
+        self.assertEqual(broker.circuits.state("down"), OPEN)
+        
+        time.sleep(0.15)
+        self.assertEqual(broker.circuits.state("down"), OPEN)
+        self.down.status = 200
+        for _ in range(50):
+            if broker.circuits.state("down") == CLOSED:
+                break
+            time.sleep(0.02)
+        self.assertEqual(broker.circuits.state("down"), CLOSED)
+        self.assertEqual(broker.process_message("Hi", "circuit-user"), "Down: Hi")
+
+class TestBulkheads(unittest.TestCase):
+    """Tests for per-agent concurrency limits."""
+    
+    def test_limit_and_queue_wait(self):
+        """Test that calls over the limit wait for a slot, then are rejected."""
+        bulkheads = Bulkheads(max_concurrent=2, queue_timeout=0.05)
+        agent = Agent("Slow", "s001", ["talk"], "http://127.0.0.1:1/agent", agent_type="external",
+                      options=CallOptions(max_concurrency=1))
+        bulkheads.acquire(agent)
+        start = time.perf_counter()
+        with self.assertRaises(BulkheadFull):
+            bulkheads.acquire(agent)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.04)
+        
+        # A slot freed while waiting is handed over
+        threading.Timer(0.02, bulkheads.release, args=("s001",)).start()
+        bulkheads.acquire(agent)
+        self.assertEqual(bulkheads.get("s001"), {'limit': 1, 'in_flight': 1, 'waiting': 0,
+                                                 'admitted': 2, 'rejected': 1})
+    
+    def test_falls_back_to_next_candidate(self):
+        """Test that a full agent is skipped in favour of the next candidate."""
+        slow = StubAgentServer("Slow", delay=0.3)
+        fast = StubAgentServer("Fast")
+        self.addCleanup(slow.close)
+        self.addCleanup(fast.close)
+        registry = Registry()
+        broker = Broker(registry, strategy="first", bulkhead=Bulkheads(queue_timeout=0.01))
+        registry.register_agent(Agent("Slow", "slow", ["talk"], slow.url, agent_type="external",
+                                      options=CallOptions(max_concurrency=1)))
+        registry.register_agent(Agent("Fast", "fast", ["talk"], fast.url, agent_type="external"))
+        
+        responses = [None] * 3
+        def send(i):
+            responses[i] = broker.process_message(f"m{i}", "bulkhead-user")
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(responses, ["Slow: m0", "Fast: m1", "Fast: m2"])
+        self.assertEqual(broker.bulkheads.get("slow")['rejected'], 2)
+        self.assertEqual(broker.bulkheads.get("slow")['in_flight'], 0)
+
+class TestBatchProtocol(unittest.TestCase):
+    """Tests for batching calls to external agents."""
+    
+    def setUp(self):
+        self.stub = StubAgentServer("Batch", respond=self.respond_batch)
+        self.addCleanup(self.stub.close)
+    
+    def respond_batch(self, payload):
+        replies = []
+        for item in payload["batch"]:
+            if item["message"] == "bad":
+                replies.append({"id": item["id"], "error": "cannot answer"})
+            elif item["message"] != "lost":
+                replies.append({"id": item["id"], "response": f"Batch: {item['message']}"})
+        return 200, {"responses": replies}
+    
+    def invoke_concurrently(self, agent, messages):
+        results = [None] * len(messages)
+        def call(i):
+            try:
+                results[i] = agent.invoke("ctx", messages[i])['response']
+            except AgentCallError as e:
+                results[i] = e
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(messages))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def test_concurrent_calls_share_requests(self):
+        """Test that concurrent calls are sent in batches and demultiplexed."""
+        agent = Agent("Batch", "b001", ["talk"], self.stub.url, agent_type="external",
+                      options=CallOptions(batch_size=4, batch_window=0.2))
+        results = self.invoke_concurrently(agent, [f"m{i}" for i in range(8)])
+        
+        self.assertEqual(results, [f"Batch: m{i}" for i in range(8)])
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertTrue(all(len(payload["batch"]) == 4 for _, payload in self.stub.requests))
+        self.assertEqual(agent._batcher.stats()['average_size'], 4.0)
+        
+        # A lone call is sent once the window closes
+        self.assertEqual(agent.invoke("ctx", "solo")['response'], "Batch: solo")
+    
+    def test_item_and_batch_errors(self):
+        """Test that failed items only fail their caller and failed requests fail everyone."""
+        agent = Agent("Batch", "b001", ["talk"], self.stub.url, agent_type="external",
+                      options=CallOptions(batch_size=3, batch_window=0.2))
+        ok, bad, lost = self.invoke_concurrently(agent, ["ok", "bad", "lost"])
+        self.assertEqual(ok, "Batch: ok")
+        self.assertIn("cannot answer", str(bad))
+        self.assertIn("no reply for batch item", str(lost))
+        
+        self.stub.respond = lambda payload: (500, {})
+        results = self.invoke_concurrently(agent, ["a", "b"])
+        self.assertTrue(all(isinstance(result, AgentCallError) for result in results))
+
+class TestStreaming(unittest.TestCase):
+    """Tests for streamed agent responses."""
+    
+    def setUp(self):
+        self.stub = StubAgentServer("Stream", respond=lambda payload: (200, [
+            {"delta": "Hello"}, {"delta": ", "}, {"delta": "world"}]))
+        self.stub.chunk_delay = 0.1
+        self.addCleanup(self.stub.close)
+        self.agent = Agent("Stream", "st001", ["talk"], self.stub.url, agent_type="external")
+    
+    def test_agent_streams_ndjson(self):
+        """Test that pieces arrive as the agent sends them."""
+        start = time.perf_counter()
+        pieces = self.agent.stream("ctx", "Hi")
+        self.assertEqual(next(pieces), "Hello")
+        first = time.perf_counter() - start
+        self.assertEqual(list(pieces), [", ", "world"])
+        self.assertLess(first, 0.1)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertIs(self.stub.requests[0][1]["stream"], True)
+        
+        # Agents that do not stream are yielded whole
+        self.stub.respond = self.stub.echo
+        self.assertEqual(list(self.agent.stream("ctx", "Hi")), ["Stream: Hi"])
+        self.assertEqual(list(Agent("Local", "l001", ["talk"]).stream("ctx", "Hi"))[0][:29],
+                         "Agent Local received: Hi (Con")
+    
+    def test_error_mid_stream(self):
+        """Test that an error line ends the stream with AgentCallError."""
+        self.stub.respond = lambda payload: (200, [{"delta": "Par"}, {"error": "model crashed"}])
+        pieces = self.agent.stream("ctx", "Hi")
+        self.assertEqual(next(pieces), "Par")
+        with self.assertRaises(AgentCallError) as raised:
+            next(pieces)
+        self.assertIn("model crashed", str(raised.exception))
+    
+    def test_broker_sync_and_async(self):
+        """Test the broker's generator and async generator APIs."""
+        registry = Registry()
+        broker = Broker(registry)
+        registry.register_agent(self.agent)
+        self.assertEqual("".join(broker.stream_message("Hi", "stream-user")), "Hello, world")
+        self.assertEqual(broker.in_flight.get("st001"), 0)
+        
+        async def collect():
+            return [piece async for piece in broker.stream_message_async("Hi", "stream-user")]
+        self.assertEqual(asyncio.run(collect()), ["Hello", ", ", "world"])
+        self.assertEqual(broker.latency.get("st001")["errors"], 0)
+    
+    def test_sse_endpoint(self):
+        """Test that the web layer relays pieces and errors as Server-Sent Events."""
+        from gpi.web.server import bapi as WebServer
+        
+        def fake_stream(context, message, user_id, use_llm, raise_errors):
+            yield "Hel"
+            yield "lo"
+            if message == "fail":
+                raise AgentCallError("agent went away")
+        
+        client = WebServer().app.test_client()
+        with patch('gpi.bapi_stream', fake_stream):
+            response = client.post('/api/bapi/stream', json={"message": "Hi", "context": "chat"})
+            self.assertEqual(response.mimetype, "text/event-stream")
+            body = response.get_data(as_text=True)
+            self.assertIn('data: {"delta": "Hel"}\n\ndata: {"delta": "lo"}\n\nevent: done', body)
+            
+            body = client.get('/api/bapi/stream?message=fail').get_data(as_text=True)
+            self.assertIn('event: error\ndata: {"error": "agent went away"}', body)
+        self.assertEqual(client.post('/api/bapi/stream', json={}).status_code, 400)
+
+class TestChannel(unittest.TestCase):
+    """Tests for multiplexed channels to external agents."""
+    
+    def setUp(self):
+        self.requests = []
+        self.server = ChannelServer(self.handle, window=8).start()
+        self.addCleanup(self.server.close)
+    
+    def handle(self, request):
+        self.requests.append(request)
+        time.sleep(request.get("delay", 0))
+        if request["message"] == "bad":
+            raise ValueError("cannot answer")
+        return {"response": f"Channel: {request['message']}"}
+    
+    def test_agent_calls_share_one_connection(self):
+        """Test that concurrent calls are multiplexed and replies matched out of order."""
+        agent = Agent("Chan", "ch001", ["talk"], self.server.endpoint, api_key="k", agent_type="external")
+        channel = AgentChannel(self.server.endpoint)
+        self.addCleanup(channel.close)
+        
+        results = {}
+        def call(i):
+            # Earlier calls take longer, so replies arrive in reverse order
+            results[i] = channel.call({"message": f"m{i}", "delay": 0.05 * (4 - i)})["response"]
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: f"Channel: m{i}" for i in range(4)})
+        self.assertEqual(channel.stats()["connects"], 1)
+        self.assertEqual(channel.stats()["window"], 8)
+        
+        self.assertEqual(agent.invoke("ctx", "Hi", time.monotonic() + 5)['response'], "Channel: Hi")
+        self.assertEqual(self.requests[-1]["authorization"], "Bearer k")
+        self.assertIn("deadline_ms", self.requests[-1])
+        self.assertTrue(agent.check_health())
+        with self.assertRaises(AgentCallError) as raised:
+            agent.invoke("ctx", "bad")
+        self.assertIn("cannot answer", str(raised.exception))
+    
+    def test_window_and_timeout(self):
+        """Test that calls beyond the window wait and that slow replies time out."""
+        channel = AgentChannel(self.server.endpoint, window=1)
+        self.addCleanup(channel.close)
+        threading.Thread(target=channel.call, args=({"message": "slow", "delay": 0.3},)).start()
+        time.sleep(0.05)
+        with self.assertRaises(TimeoutError):
+            channel.call({"message": "queued"}, timeout=0.1)
+        self.assertEqual(len(self.requests), 1)
+        time.sleep(0.3)
+        with self.assertRaises(TimeoutError):
+            channel.call({"message": "slow", "delay": 0.3}, timeout=0.1)
+        self.assertEqual(channel.stats()["in_flight"], 0)
+    
+    def test_reconnects_after_restart(self):
+        """Test that a lost connection fails the call in flight and the next call reconnects."""
+        channel = AgentChannel(self.server.endpoint)
+        self.addCleanup(channel.close)
+        self.assertEqual(channel.call({"message": "one"})["response"], "Channel: one")
+        
+        host, port = self.server.address
+        errors = []
+        def call():
+            try:
+                channel.call({"message": "lost", "delay": 0.5})
+            except ConnectionError as e:
+                errors.append(e)
+        thread = threading.Thread(target=call)
+        thread.start()
+        time.sleep(0.1)
+        self.server.close()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        
+        self.server = ChannelServer(self.handle, host, port).start()
+        self.addCleanup(self.server.close)
+        self.assertEqual(channel.call({"message": "two"})["response"], "Channel: two")
+        self.assertEqual(channel.stats()["connects"], 2)
+        
+        agent = Agent("Chan", "ch001", ["talk"], "gpi+tcp://127.0.0.1:1", agent_type="external",
+                      options=CallOptions(retry_policy=RetryPolicy(max_attempts=1)))
+        self.assertFalse(agent.check_health())
+        with self.assertRaises(AgentCallError):
+            agent.invoke("ctx", "Hi")
+
+class TestPayloadEncoding(unittest.TestCase):
+    """Tests for negotiated compression and MessagePack bodies."""
+    
+    def setUp(self):
+        self.stub = StubAgentServer("Enc")
+        self.addCleanup(self.stub.close)
+        self.message = "long message " * 200
+    
+    def test_agent_compresses_once_endpoint_accepts(self):
+        """Test that bodies are compressed only after the endpoint advertises a coding."""
+        codec = encoding.configure_payload_codec()
+        self.addCleanup(encoding.configure_payload_codec)
+        agent = Agent("Enc", "e001", ["talk"], self.stub.url, agent_type="external")
+        
+        # Nothing advertised: plain JSON, even for a large body
+        self.assertEqual(agent.invoke("ctx", self.message)['response'], f"Enc: {self.message}")
+        self.assertNotIn("Content-Encoding", self.stub.requests[-1][0])
+        self.assertEqual(self.stub.requests[-1][0]["Accept-Encoding"], "gzip, deflate")
+        
+        self.stub.accept_encoding = "br, gzip;q=0, deflate"
+        agent.invoke("ctx", "short")
+        agent.invoke("ctx", self.message)
+        self.assertEqual(self.stub.requests[-1][0]["Content-Encoding"], "deflate")
+        self.assertLess(self.stub.wire_sizes[-1], self.stub.wire_sizes[0] / 10)
+        self.assertEqual(self.stub.requests[-1][1]["message"], self.message)
+        
+        # Small bodies stay uncompressed
+        agent.invoke("ctx", "short")
+        self.assertNotIn("Content-Encoding", self.stub.requests[-1][0])
+        stats = codec.stats()
+        self.assertEqual((stats['requests'], stats['compressed']), (4, 1))
+        self.assertLess(stats['wire_bytes'], stats['raw_bytes'])
+        self.assertEqual(stats['endpoints'][self.stub.url.rsplit("/", 1)[0]]['codings'], ["deflate"])
+    
+    @unittest.skipUnless(importlib.util.find_spec("msgpack"), "msgpack is not installed")
+    def test_binary_and_fallback(self):
+        """Test MessagePack negotiation and the plain JSON retry after a 415."""
+        codec = encoding.configure_payload_codec(binary=True)
+        self.addCleanup(encoding.configure_payload_codec)
+        self.stub.binary = True
+        self.stub.accept_encoding = "gzip"
+        client = HttpClient()
+        
+        self.assertEqual(client.register_agent(self.stub.url, {"message": "hi"}), {"response": "Enc: hi"})
+        self.assertEqual(client.register_agent(self.stub.url, {"message": self.message}),
+                         {"response": f"Enc: {self.message}"})
+        headers = self.stub.requests[-1][0]
+        self.assertEqual((headers["Content-Type"], headers["Content-Encoding"]), (encoding.MSGPACK_TYPE, "gzip"))
+        
+        # An endpoint that stops accepting encoded bodies gets plain JSON again
+        self.stub.respond = lambda payload: (415, {}) if "Content-Encoding" in self.stub.requests[-1][0] \
+            else self.stub.echo(payload)
+        self.stub.binary = False
+        self.stub.accept_encoding = None
+        self.assertEqual(client.register_agent(self.stub.url, {"message": self.message}),
+                         {"response": f"Enc: {self.message}"})
+        self.assertEqual(self.stub.requests[-1][0]["Content-Type"], encoding.JSON_TYPE)
+        self.assertEqual(codec.stats()['endpoints'], {})
+    
+    def test_web_server_decodes_and_encodes(self):
+        """Test that the web server reads compressed bodies and compresses large replies."""
+        from gpi.web.server import bapi as WebServer
+        
+        client = WebServer().app.test_client()
+        payload = {"name": "Zipped", "id": "zip001", "abilities": [f"skill{i}" for i in range(100)]}
+        response = client.post('/api/agents', data=encoding.compress(json.dumps(payload).encode("utf-8"), "gzip"),
+                               headers={"Content-Type": "application/json", "Content-Encoding": "gzip",
+                                        "Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Accept-Encoding"], "gzip, deflate")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(encoding.decompress(response.get_data(), "gzip"))["id"], "zip001")
+        client.delete("/api/agents/zip001")
+        
+        response = client.post('/api/agents', data=b"...", headers={"Content-Type": "application/json",
+                                                                    "Content-Encoding": "br"})
+        self.assertEqual(response.status_code, 415)
+
+class TestAgentHandlers(unittest.TestCase):
+    """Tests for custom handlers on internal agents."""
+    
+    def test_inline_and_thread_handlers(self):
+        """Test that handler replies are used and failures become AgentCallError."""
+        agent = Agent("Scorer", "h001", ["score"], handler=lambda context, message: f"{context}/{message}")
+        self.assertEqual(agent.invoke("ctx", "Hi"), {'response': "ctx/Hi"})
+        
+        agent.set_handler(lambda context, message: {'response': message.upper(), 'score': 3}, "thread")
+        self.assertEqual(agent.invoke("ctx", "hi"), {'response': "HI", 'score': 3})
+        self.assertEqual(agent.process_message("ctx", "hi"), "HI")
+        
+        def failing(context, message):
+            raise KeyError("index missing")
+        agent.set_handler(failing, "thread")
+        with self.assertRaises(AgentCallError) as raised:
+            agent.invoke("ctx", "hi")
+        self.assertIn("index missing", str(raised.exception))
+        
+        agent.set_handler(None)
+        self.assertIn("received: hi", agent.invoke("ctx", "hi")['response'])
+        with self.assertRaises(ValueError):
+            agent.set_handler(len, "gpu")
+        with self.assertRaises(ValueError):
+            agent.set_handler(lambda context, message: message, "process")
+    
+    def test_deadline_and_metrics(self):
+        """Test that pooled handlers respect deadlines and report queue metrics."""
+        pool = HandlerPool("thread", max_workers=1)
+        self.addCleanup(pool.shutdown)
+        slow = lambda context, message: time.sleep(0.2) or message
+        first = threading.Thread(target=pool.call, args=(slow, "ctx", "first"))
+        first.start()
+        time.sleep(0.05)
+        self.assertEqual(pool.call(operator.concat, "a", "b"), "ab")
+        first.join()
+        
+        stats = pool.stats()
+        self.assertEqual((stats['submitted'], stats['completed'], stats['pending']), (2, 2, 0))
+        self.assertGreaterEqual(stats['max_queue_ms'], 100)
+        
+        agent = Agent("Slow", "h002", ["score"], handler=slow, options=CallOptions(execution="thread"))
+        with self.assertRaises(AgentCallError):
+            agent.invoke("ctx", "hi", time.monotonic() + 0.05)
+        self.assertGreaterEqual(get_handler_pool("thread").stats()['timed_out'], 1)
+    
+    def test_process_handler(self):
+        """Test that module-level handlers run in the process pool."""
+        agent = Agent("Joiner", "h003", ["join"], handler=operator.concat,
+                      options=CallOptions(execution="process"))
+        self.assertEqual(agent.invoke("ctx:", "hi")['response'], "ctx:hi")
+        stats = get_handler_pool("process").stats()
+        self.assertGreaterEqual(stats['completed'], 1)
+        self.assertEqual(stats['mode'], "process")
+
+class TestBulkRegistration(unittest.TestCase):
+    """Tests for concurrent bulk registration over HTTP."""
+    
+    def setUp(self):
+        self.stub = StubAgentServer("Registry", delay=0.05, respond=self.register)
+        self.addCleanup(self.stub.close)
+        self.client = HttpClient(pool=SessionPool(pool_size=4))
+        self.addCleanup(self.client.pool.close)
+        self.payloads = [{"name": f"Agent{i}", "id": f"bulk{i:03d}"} for i in range(12)]
+        self.payloads[5]["name"] = "bad"
+    
+    def register(self, payload):
+        if payload["name"] == "bad":
+            return 500, {"error": "rejected"}
+        return 200, {"status": "success", "id": payload["id"]}
+    
+    def check_report(self, report):
+        self.assertEqual((report["succeeded"], report["failed"]), (11, 1))
+        self.assertEqual([result.get("id") for result in report["results"]],
+                         [payload["id"] if i != 5 else None for i, payload in enumerate(self.payloads)])
+        self.assertIn("Error registering agent via HTTP", report["results"][5]["error"])
+    
+    def test_bounded_concurrency_over_pooled_connections(self):
+        """Test that registrations run in parallel on at most `concurrency` kept-alive connections."""
+        start = time.perf_counter()
+        report = self.client.register_agents(self.stub.url, self.payloads, concurrency=4)
+        self.assertLess(time.perf_counter() - start, 0.05 * 12 / 2)
+        self.check_report(report)
+        self.assertLessEqual(len(set(self.stub.ports)), 4)
+    
+    def test_async_variant(self):
+        """Test that the asyncio variant produces the same report."""
+        report = asyncio.run(self.client.register_agents_async(self.stub.url, self.payloads, concurrency=4))
+        self.check_report(report)
+        self.assertLessEqual(len(set(self.stub.ports)), 4)
+        
+        report = asyncio.run(self.client.register_llms_async(self.stub.url, self.payloads, concurrency=4))
+        self.assertEqual((report["succeeded"], report["failed"]), (11, 1))
+        self.assertIn("Error registering LLM via HTTP", report["results"][5]["error"])
+    
+    def test_async_cancellation_does_not_block(self):
+        """Test that cancelling an async bulk registration returns at once and drops queued requests."""
+        self.stub.delay = 0.5
+        start = time.perf_counter()
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(self.client.register_agents_async(self.stub.url, self.payloads,
+                                                                           concurrency=1), 0.1))
+        self.assertLess(time.perf_counter() - start, 0.4)
+        time.sleep(0.6)
+        self.assertEqual(len(self.stub.requests), 1)
+
+class TestLatencyAwareRouting(unittest.TestCase):
+    """Tests for latency statistics and latency-aware routing."""
+    
+    def test_tracker_ewma_and_percentile(self):
+        """Test EWMA updates, error penalty and histogram percentiles."""
+        tracker = LatencyTracker(alpha=0.5, error_penalty=1.0)
+        tracker.record("a001", 0.010)
+        tracker.record("a001", 0.030)
+        self.assertAlmostEqual(tracker.expected_latency("a001"), 0.020)
+        
+        tracker.record("a001", 0.020, error=True)
+        self.assertAlmostEqual(tracker.expected_latency("a001"), 0.020 + 0.5)
+        self.assertEqual(tracker.percentile("a001", 0.95), 0.05)
+        self.assertIsNone(tracker.expected_latency("unknown"))
+    
+    def test_percentile_follows_latency_shift(self):
+        """Test that p95 moves to the new latency once an agent speeds up or slows down."""
+        tracker = LatencyTracker(histogram_alpha=0.05)
+        for _ in range(100):
+            tracker.record("a001", 0.4)
+        self.assertEqual(tracker.percentile("a001", 0.95), 0.5)
+        for _ in range(100):
+            tracker.record("a001", 0.02)
+        self.assertEqual(tracker.percentile("a001", 0.95), 0.025)
+        for _ in range(100):
+            tracker.record("a001", 2.0)
+        self.assertEqual(tracker.percentile("a001", 0.95), 2.5)
+    
+    def test_samples_decay(self):
+        """Test that idle agents lose their sample count over time."""
+        tracker = LatencyTracker(half_life=0.05)
+        for _ in range(4):
+            tracker.record("a001", 0.01)
+        time.sleep(0.1)
+        self.assertLess(tracker.samples("a001"), 1.5)
+    
+    def test_routes_to_fastest_stub_agent(self):
+        """Test routing against local stub agents with injected delays."""
+        fast = StubAgentServer("Fast")
+        slow = StubAgentServer("Slow", delay=0.05)
+        failing = StubAgentServer("Failing", status=500)
+        try:
+            registry = Registry()
+            broker = Broker(registry, strategy="latency")
+            broker.strategy.exploration = 0.0
+            for i, stub in enumerate((slow, failing, fast)):
+                registry.register_agent(Agent(stub.name, f"s00{i}", ["talk"], stub.url, agent_type="external"))
+            
+            responses = [broker.process_message("ping", "latency-user") for _ in range(15)]
+            
+            # Every agent is measured during warm-up, then the fast one wins
+            self.assertEqual(len(slow.requests), 3)
+            self.assertEqual(len(failing.requests), 3)
+            self.assertEqual(responses[-1], "Fast: ping")
+            self.assertIn("Error communicating with external agent Failing", " ".join(responses))
+            self.assertEqual(broker.latency.get("s001")["errors"], 3)
+        finally:
+            for stub in (fast, slow, failing):
+                stub.close()
+    
+    def test_invoke_raises_on_failure(self):
+        """Test that invoke raises while process_message returns the error text."""
+        stub = StubAgentServer(status=500)
+        try:
+            agent = Agent("Down", "d001", ["talk"], stub.url, agent_type="external")
+            with self.assertRaises(AgentCallError):
+                agent.invoke("ctx", "Hello")
+            self.assertIn("Error communicating with external agent Down", agent.process_message("ctx", "Hello"))
+        finally:
+            stub.close()
+
 class TestGPIInterface(unittest.TestCase):
     """Tests for the GPI interface functions."""
     
@@ -237,7 +2043,7 @@ class TestGPIInterface(unittest.TestCase):
         self.assertEqual(llm["name"], "InterfaceLLM")
         self.assertEqual(llm["api_key"], "interface_key")
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_register_agent_http(self, mock_post):
         """Test registering an agent via HTTP."""
         # Set up the mock
@@ -263,6 +2069,32 @@ class TestGPIInterface(unittest.TestCase):
         # Test bapi
         bapi_response = gpi.bapi("bapi_context", "Hello from BAPI")
         self.assertIn("CarAgent", bapi_response)
+    
+    def test_async_context_extraction_runs_off_the_loop(self):
+        """Test that the async entry points extract context on a worker thread."""
+        agent = gpi.create.agent("AsyncAgent", "async001", ["talk"])
+        self.addCleanup(agent.deactivate)
+        threads = []
+        
+        def extract(message, user_id, use_llm, llm):
+            threads.append(threading.current_thread())
+            return "extracted"
+        
+        async def run():
+            loop_thread = threading.current_thread()
+            response = await gpi.bapi_async(message="Hello async", user_id="async-user")
+            pieces = [piece async for piece in gpi.bapi_stream_async(message="Hello stream", user_id="async-user")]
+            return loop_thread, response, pieces
+        
+        with patch.object(gpi._context_manager, 'extract_and_update_context', side_effect=extract):
+            loop_thread, response, pieces = asyncio.run(run())
+        
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+        self.assertIsInstance(response, str)
+        self.assertTrue(pieces)
+        with self.assertRaises(ValueError):
+            asyncio.run(gpi.bapi_async(message=None))
 
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file